@@ -42,3 +42,42 @@ VE['as'] = 5
 VE['se'] = 6
 VE['br'] = 7
 VE['kr'] = 8
+
+# covalent radii in Angstrom (Cordero et al., Dalton Trans. 2008, 2832; low spin values for Mn, Fe and Co)
+RCOV = {}
+RCOV['h'] = 0.31
+RCOV['he'] = 0.28
+RCOV['li'] = 1.28
+RCOV['be'] = 0.96
+RCOV['b'] = 0.84
+RCOV['c'] = 0.76
+RCOV['n'] = 0.71
+RCOV['o'] = 0.66
+RCOV['f'] = 0.57
+RCOV['ne'] = 0.58
+RCOV['na'] = 1.66
+RCOV['mg'] = 1.41
+RCOV['al'] = 1.21
+RCOV['si'] = 1.11
+RCOV['p'] = 1.07
+RCOV['s'] = 1.05
+RCOV['cl'] = 1.02
+RCOV['ar'] = 1.06
+RCOV['k'] = 2.03
+RCOV['ca'] = 1.76
+RCOV['sc'] = 1.70
+RCOV['ti'] = 1.60
+RCOV['v'] = 1.53
+RCOV['cr'] = 1.39
+RCOV['mn'] = 1.39
+RCOV['fe'] = 1.32
+RCOV['co'] = 1.26
+RCOV['ni'] = 1.24
+RCOV['cu'] = 1.32
+RCOV['zn'] = 1.22
+RCOV['ga'] = 1.22
+RCOV['ge'] = 1.20
+RCOV['as'] = 1.19
+RCOV['se'] = 1.20
+RCOV['br'] = 1.20
+RCOV['kr'] = 1.16
@@ -17,8 +17,11 @@
 
 
 import os
+import getpass
 from shutil import copyfile
 import subprocess as sp
+from tools import findExecutable
+import metrics as mt
 
 
 # prevent stand-alone execution
@@ -34,28 +37,34 @@ class QueueSysError(Exception):
 
 # class definition
 class QueueSys:
-	def __init__(self, job_script):
+	def __init__(self, job_script, resources=None):
 		if not os.path.isfile(job_script):
 			raise QueueSysError('The job script file "' + str(job_script) + '" does not exist!')
 		
 		self.job_script_ = os.path.abspath(job_script)
+		self.resources_ = resources		# adapts the job script to each job, e.g. a resourceplanner (see resources.py)
 		
 		self.stat_cmd_ = 'qstat'		# local:	['locque.sh', '-l']
 		self.sub_cmd_ = 'qsub'			#		['locque.sh']
+		self.del_cmd_ = 'qdel'
 		
-		try:
-			output = sp.check_output(self.stat_cmd_,shell=True,stderr=sp.STDOUT,universal_newlines=True)
-		except sp.CalledProcessError:
-			raise QueueSysError('No queuing system found!')
+		# only look for the commands here (the queuing system is asked not before the first status request)
+		for cmd in [self.stat_cmd_,self.sub_cmd_,self.del_cmd_]:
+			if not findExecutable(cmd.split()[0]):
+				raise QueueSysError('No queuing system found!')
 		
-		self.user_ = sp.check_output('whoami',shell=True,stderr=sp.STDOUT,universal_newlines=True).strip()
+		self.user_ = getpass.getuser()
 	
 	
 	def get_schedule(self):
 		# fetch the status table from the queuing system as continuous string
-		raw_stat = sp.check_output(self.stat_cmd_,shell=True,stderr=sp.STDOUT,universal_newlines=True)
+		mt.inc('subprocesses_spawned',command=self.stat_cmd_.split()[0])
+		with mt.timer('stage_duration_seconds',stage='qstat'):
+			raw_stat = sp.check_output(self.stat_cmd_,shell=True,stderr=sp.STDOUT,universal_newlines=True)
 		
 		if raw_stat.strip() == '':
+			for status in 'QRECH':
+				mt.setGauge('queue_jobs',0,status=status)
 			return []
 		
 		# split the string in lines and the lines in words, discard first two lines (table head)
@@ -81,6 +90,10 @@ class QueueSys:
 			
 			sched.append(line)
 		
+		# queue depth per status
+		for status in 'QRECH':
+			mt.setGauge('queue_jobs',len([line for line in sched if line[4] == status]),status=status)
+		
 		return sched
 	
 	
@@ -121,14 +134,21 @@ class QueueSys:
 		return ids
 	
 	
-	def schedule(self, job_path):
+	def schedule(self, job_path, script=None):
+		job_path = os.path.abspath(job_path)
 		if not os.path.isdir(job_path):
 			raise QueueSysError('Unable to submit job from "' + str(job_path) + '". Path does not exist.')
 		
-		# copy the given pbs script file to the directory of the new job
-		script_name = os.path.basename(self.job_script_)
+		# another job script than the pbs script may be given, e.g. for a follow-up run of a job
+		job_script = os.path.abspath(script) if script else self.job_script_
+		if not os.path.isfile(job_script):
+			raise QueueSysError('The job script file "' + str(job_script) + '" does not exist!')
+		
+		# copy the job script file to the directory of the new job (unless it is already there)
+		script_name = os.path.basename(job_script)
 		new_script_path = os.path.join(job_path, script_name)
-		copyfile(self.job_script_, new_script_path)
+		if job_script != new_script_path:
+			copyfile(job_script, new_script_path)
 		
 		# adopt the top most directory name as job name
 		job_name = os.path.basename(os.path.normpath(job_path))
@@ -145,21 +165,32 @@ class QueueSys:
 				if '#!' in line:
 					script_cont.append('#PBS -N ' + str(job_name) + '\n')
 		
+		# request the resources of this particular job
+		if self.resources_:
+			script_cont = self.resources_.apply(job_path, script_cont)
+		
 		with open(new_script_path, "w") as fh:
 			for line in script_cont:
 				fh.write(line)
 		
-		# submit the job to the queuing system
-		cwd = os.getcwd()
-		os.chdir(job_path)
+		# submit the job to the queuing system (from within the job directory)
+		mt.inc('subprocesses_spawned',command=self.sub_cmd_.split()[0])
 		try:
-			job_id = sp.check_output(self.sub_cmd_ + " " + script_name,shell=True,stderr=sp.STDOUT,universal_newlines=True)
+			with mt.timer('stage_duration_seconds',stage='submit'):
+				job_id = sp.check_output(self.sub_cmd_ + " " + script_name,shell=True,cwd=job_path,stderr=sp.STDOUT,universal_newlines=True)
 		except sp.CalledProcessError:
 			raise QueueSysError('Unable to submit job "' + str(new_script_path) + '". The command ' + str(self.sub_cmd_) + ' failed.')
-		os.chdir(cwd)
 		
 		job_id = int(job_id.split('.')[0])
 		
 		return job_id
 	
-
+	
+	def cancel(self, job_id):
+		mt.inc('subprocesses_spawned',command=self.del_cmd_.split()[0])
+		try:
+			sp.check_output(self.del_cmd_ + " " + str(int(job_id)),shell=True,stderr=sp.STDOUT,universal_newlines=True)
+		except sp.CalledProcessError as callerror:
+			raise QueueSysError('Unable to cancel job ' + str(job_id) + ':\n' + str(callerror.output).strip())
+		
+		return True
@@ -0,0 +1,65 @@
+#! /usr/bin/python3
+
+###############################
+# start-up time benchmark     #
+#                             #
+# by Fabian                   #
+# 19.10.26                    #
+###############################
+
+
+# load some helpful modules
+import argparse
+import os
+import sys
+import time
+import subprocess as sp
+
+
+# modules that must not be imported before they are needed (see tools.lazyModule)
+HEAVY = ['numpy','scipy','concurrent.futures']
+
+LOWSPIN = os.path.join(os.path.dirname(os.path.abspath(__file__)),'lowspin.py')
+
+
+def timeRuns(cmd,runs):
+	# wall times in ms of the given command
+	times = []
+	for i in range(runs):
+		start = time.perf_counter()
+		sp.check_call(cmd,stdout=sp.DEVNULL,stderr=sp.DEVNULL)
+		times.append(1000.0 * (time.perf_counter() - start))
+	
+	return sorted(times)
+
+def heavyImports():
+	# heavy modules loaded by the import of lowspin.py alone
+	probe = 'import sys; import lowspin; print(" ".join(m for m in {} if m in sys.modules))'.format(HEAVY)
+	return sp.check_output([sys.executable,'-c',probe],cwd=os.path.dirname(LOWSPIN),universal_newlines=True).split()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Measure the start-up time of lowSpin')
+	parser.add_argument('--runs','-n',type=int,default=20,help='number of runs (default: 20)')
+	parser.add_argument('--max-ms',type=float,default=None,help='fail, if the median start-up time exceeds this limit')
+	args = parser.parse_args()
+	
+	# python itself is the baseline
+	base = timeRuns([sys.executable,'-c','pass'],args.runs)
+	times = timeRuns([sys.executable,LOWSPIN,'--help'],args.runs)
+	median = times[len(times)//2]
+	
+	print(" python start-up:         median {:7.1f} ms   min {:7.1f} ms".format(base[len(base)//2],base[0]))
+	print(" lowspin.py --help:       median {:7.1f} ms   min {:7.1f} ms".format(median,times[0]))
+	
+	failed = False
+	heavy = heavyImports()
+	if heavy:
+		print(" heavy modules imported at start-up: " + ", ".join(heavy))
+		failed = True
+	
+	if args.max_ms and median > args.max_ms:
+		print(" start-up takes longer than {:.1f} ms!".format(args.max_ms))
+		failed = True
+	
+	exit(1 if failed else 0)
@@ -0,0 +1,211 @@
+#! /usr/bin/python3
+
+####################################
+# configsource class definition    #
+#                                  #
+# by Fabian                        #
+# 19.10.26                         #
+####################################
+
+
+# load some helpful modules
+import random
+from itertools import combinations, groupby, islice
+from tools import binomial, rankCombination, unrankCombination, lazyModule
+np = lazyModule('numpy')		# imported on first use
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class ConfigSourceError(Exception):
+	pass
+
+
+# provides the low spin configurations to be created, i.e. pairs of flipped centers and beta occupations (given as
+# index of spinflipper.beta_occupations_); the configurations are numbered (ranked) in the order of the flip sets
+# as produced by itertools.combinations and the beta occupations within each flip set, e.g. for 4 centers, 2 flipped
+# centers and 2 beta occupations:
+# rank 0: ('1fe','2fe'), 0   rank 1: ('1fe','2fe'), 1   rank 2: ('1fe','3fe'), 0   ...
+class configsource:
+	strategies_ = ['random','energy','ms']
+	
+	def __init__(self,metal_centers,num_flip,hs_lmos,beta_occupations,pairs=None,verbose=0):
+		if num_flip < 1 or num_flip > len(metal_centers):
+			raise ConfigSourceError('unable to flip {:d} of {:d} metal centers!'.format(num_flip,len(metal_centers)))
+		
+		self.centers_ = list(metal_centers)
+		self.num_flip_ = num_flip
+		self.num_lmos_ = {center:len(hs_lmos.metal_alpha_idxs_[center]) for center in self.centers_}
+		self.beta_occs_ = beta_occupations
+		self.pairs_ = pairs if pairs is not None else list(combinations(self.centers_,2))	# coupled centers of the model
+		self.vrbs_lvl_ = verbose
+	
+	def count(self):
+		# size of the full configuration space
+		return binomial(len(self.centers_),self.num_flip_) * len(self.beta_occs_)
+	
+	def spins(self,flip,beta_occ):
+		# number of unpaired electrons at each center (negative for flipped centers), e.g. {'1fe':-5,'2fe':4}
+		return {center:beta_occ[center] - n if center in flip else n - beta_occ[center] for center,n in self.num_lmos_.items()}
+	
+	def spinArray(self,ranks):
+		# spins (see spins) of the configurations with the given ranks as array of shape (#ranks,#centers)
+		flip_ranks,nrs = np.divmod(np.asarray(ranks,dtype=np.int64),len(self.beta_occs_))
+		free = np.array([self.num_lmos_[center] for center in self.centers_])
+		
+		occ_nrs,occ_pos = np.unique(nrs,return_inverse=True)
+		unpaired = free - np.array([[self.beta_occs_[int(nr)][center] for center in self.centers_] for nr in occ_nrs]).reshape(-1,len(self.centers_))
+		
+		flip_sets,flip_pos = np.unique(flip_ranks,return_inverse=True)
+		signs = np.ones((len(flip_sets),len(self.centers_)))
+		for i,flip_rank in enumerate(flip_sets):
+			signs[i,list(unrankCombination(int(flip_rank),len(self.centers_),self.num_flip_))] = -1.0
+		
+		return signs[flip_pos] * unpaired[occ_pos]
+	
+	def MS(self,flip,beta_occ):
+		return abs(sum(self.spins(flip,beta_occ).values())) / 2.0
+	
+	def modelEnergy(self,flip,beta_occ):
+		# energy of an Ising model with the same antiferromagnetic coupling between all coupled centers (in units of
+		# the coupling constant); it is meant to rank the configurations only
+		s = self.spins(flip,beta_occ)
+		return sum(s[a] * s[b] for a,b in self.pairs_)
+	
+	def __scan(self,chunk=65536):
+		# walks through all configurations in the order of their ranks without storing them; yields blocks of
+		# ranks and the corresponding spins (see spins) as arrays of shape (#configurations) and (#configurations,#centers)
+		num_occ = len(self.beta_occs_)
+		occ_block = min(num_occ,chunk)
+		flip_block = max(1,chunk // occ_block)
+		free = np.array([self.num_lmos_[center] for center in self.centers_])
+		
+		for occ_start in range(0,num_occ,occ_block):
+			occ_nrs = np.arange(occ_start,min(num_occ,occ_start+occ_block))
+			unpaired = free - np.array([[beta_occ[center] for center in self.centers_] for beta_occ in (self.beta_occs_[nr] for nr in occ_nrs)])
+			
+			flip_sets = combinations(range(len(self.centers_)),self.num_flip_)
+			flip_start = 0
+			while True:
+				flips = np.array(list(islice(flip_sets,flip_block)),dtype=int).reshape(-1,self.num_flip_)
+				if len(flips) == 0:
+					break
+				
+				signs = np.ones((len(flips),len(self.centers_)))
+				signs[np.repeat(np.arange(len(flips)),self.num_flip_),flips.ravel()] = -1.0
+				ranks = (flip_start + np.arange(len(flips)))[:,None] * num_occ + occ_nrs[None,:]
+				yield (ranks.ravel(),(signs[:,None,:] * unpaired[None,:,:]).reshape(-1,len(self.centers_)))
+				flip_start += len(flips)
+	
+	def rank(self,flip,nr):
+		# position of the configuration (flipped centers, index of the beta occupation) in the full configuration space
+		if not 0 <= nr < len(self.beta_occs_):
+			raise ConfigSourceError('there is no beta occupation #{:d}!'.format(nr))
+		
+		if len(set(flip)) != self.num_flip_ or len(flip) != self.num_flip_:
+			raise ConfigSourceError('exactly {:d} different centers have to be flipped!'.format(self.num_flip_))
+		
+		try:
+			flip_rank = rankCombination(sorted(self.centers_.index(center) for center in flip),len(self.centers_))
+		except ValueError:
+			raise ConfigSourceError('unknown metal center in {}!'.format(flip))
+		
+		return flip_rank * len(self.beta_occs_) + nr
+	
+	def unrank(self,rank):
+		# inverse of rank, i.e. returns the flipped centers and the index of the beta occupation
+		if not 0 <= rank < self.count():
+			raise ConfigSourceError('there is no configuration #{:d}!'.format(rank))
+		
+		flip_rank,nr = divmod(rank,len(self.beta_occs_))
+		return (tuple(self.centers_[i] for i in unrankCombination(flip_rank,len(self.centers_),self.num_flip_)),nr)
+	
+	def __lowestEnergies(self,budget):
+		# the budget configurations with the lowest model energies (ties are resolved by rank)
+		pairs = np.array([(self.centers_.index(a),self.centers_.index(b)) for a,b in self.pairs_],dtype=int).reshape(-1,2)
+		best_ranks = np.zeros(0,dtype=int)
+		best_energies = np.zeros(0)
+		for ranks,spins in self.__scan():
+			energies = (spins[:,pairs[:,0]] * spins[:,pairs[:,1]]).sum(axis=1)
+			ranks = np.concatenate((best_ranks,ranks))
+			energies = np.concatenate((best_energies,energies))
+			order = np.lexsort((ranks,energies))[:budget]
+			best_ranks,best_energies = ranks[order],energies[order]
+		
+		return best_ranks.tolist()
+	
+	def __sampleByMS(self,budget,seed):
+		# a random sample of at most budget configurations for each MS value (the configurations with the
+		# smallest random keys) ...
+		rng = np.random.default_rng(seed)
+		samples = {}
+		seen = {}
+		for ranks,spins in self.__scan():
+			ms = np.abs(spins.sum(axis=1)) / 2.0
+			keys = rng.random(len(ranks))
+			for value in np.unique(ms):
+				sel = ms == value
+				seen[value] = seen.get(value,0) + int(sel.sum())
+				old_keys,old_ranks = samples.get(value,(np.zeros(0),np.zeros(0,dtype=int)))
+				tmp_keys = np.concatenate((old_keys,keys[sel]))
+				tmp_ranks = np.concatenate((old_ranks,ranks[sel]))
+				order = np.argsort(tmp_keys)[:budget]
+				samples[value] = (tmp_keys[order],tmp_ranks[order])
+		
+		# ... of which the budget is shared evenly among all MS values
+		ranks = []
+		pos = 0
+		while len(ranks) < budget:
+			for value in sorted(samples):
+				if pos < len(samples[value][1]) and len(ranks) < budget:
+					ranks.append(int(samples[value][1][pos]))
+			pos += 1
+		
+		if self.vrbs_lvl_ > 0:
+			print("  configurations per MS: " + ", ".join("{:.1f}: {:d}".format(ms,seen[ms]) for ms in sorted(seen)))
+		
+		return ranks
+	
+	# returns (as generator) the selected configurations grouped by flip sets, e.g. (('1fe','2fe'),[0,1]), (('1fe','3fe'),[1]) ...;
+	# with budget, only that many configurations are selected according to the strategy:
+	# 'random': a random sample
+	# 'energy': those with the lowest energy of the Ising model (see modelEnergy)
+	# 'ms':     a random sample for each MS value, all MS values get the same share of the budget (as far as possible)
+	# with shard=(i,N), only the i-th of N disjoint slices of the selection is returned (1 <= i <= N), so that independent
+	# processes can share the work; random selections have to be seeded for this, all processes have to use the same seed
+	def select(self,budget=None,strategy='random',seed=None,shard=None):
+		if not strategy in self.strategies_:
+			raise ConfigSourceError('unknown selection strategy "{}"!'.format(strategy))
+		
+		if shard:
+			if not 1 <= shard[0] <= shard[1]:
+				raise ConfigSourceError('there is no shard {:d} of {:d}!'.format(*shard))
+			if budget and strategy != 'energy' and seed is None and budget < self.count():
+				raise ConfigSourceError('a random selection can only be sharded with a given seed!')
+		
+		total = self.count()
+		if budget is None or budget >= total:
+			ranks = range(total)
+		elif budget < 1:
+			raise ConfigSourceError('the budget has to allow for at least one configuration!')
+		elif strategy == 'random':
+			ranks = sorted(random.Random(seed).sample(range(total),budget))
+		elif strategy == 'energy':
+			ranks = sorted(self.__lowestEnergies(budget))
+		else:
+			ranks = sorted(self.__sampleByMS(budget,seed))
+		
+		# the shards are contiguous slices of the selection, so that the beta occupations of a flip set stay together
+		if shard:
+			ranks = ranks[len(ranks)*(shard[0]-1)//shard[1]:len(ranks)*shard[0]//shard[1]]
+		
+		# the ranks are sorted, so that the configurations of a flip set follow each other
+		num_occ = len(self.beta_occs_)
+		for flip_rank,group in groupby(ranks,key=lambda rank:rank // num_occ):
+			flip = tuple(self.centers_[i] for i in unrankCombination(flip_rank,len(self.centers_),self.num_flip_))
+			yield (flip,[rank % num_occ for rank in group])
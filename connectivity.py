@@ -0,0 +1,145 @@
+#! /usr/bin/python3
+
+##################################
+# connectivity class definition  #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import re
+from itertools import product
+import tmjob as jm
+import PSE
+from tools import lazyModule
+np = lazyModule('numpy')		# imported on first use
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class ConnectivityError(Exception):
+	pass
+
+
+BOHR = 0.529177210903		# bohr in Angstrom
+
+
+# finds the bonds of a molecule (two atoms are bonded if their distance is less than bond_tol times the sum of their
+# covalent radii) and derives which metal centers are bridged by common ligand atoms
+class connectivity:
+	def __init__(self,job,bond_tol=1.2,verbose=0):
+		if not isinstance(job,jm.tmjob):
+			raise ConnectivityError('given argument is not an instance of tmjob!')
+		
+		self.bond_tol_ = bond_tol
+		self.vrbs_lvl_ = verbose
+		
+		labels,xyz = job.getCoordinates()
+		self.labels_ = labels					# e.g. ['1fe','2fe','3o']
+		self.index_ = {label:i for i,label in enumerate(labels)}
+		self.xyz_ = xyz * BOHR
+		
+		try:
+			self.radii_ = np.array([PSE.RCOV[re.findall('[a-z]+',label.lower())[0]] for label in labels])
+		except KeyError as err:
+			raise ConnectivityError('no covalent radius known for element {}!'.format(err))
+		
+		self.bonds_ = self.__findBonds()			# set of bonded atom indices for each atom
+	
+	def __findBonds(self):
+		# sort all atoms into cubic cells, which are at least as large as the longest possible bond;
+		# then bonded atoms are found in the same or in adjacent cells only, so that the effort grows linearly
+		# with the number of atoms instead of quadratically
+		bonds = [set() for i in self.labels_]
+		if len(self.labels_) < 2:
+			return bonds
+		
+		cell_size = 2.0 * self.bond_tol_ * self.radii_.max()
+		cell_idxs = np.floor((self.xyz_ - self.xyz_.min(axis=0)) / cell_size).astype(int)
+		
+		cells = {}
+		for i,idx in enumerate(map(tuple,cell_idxs)):
+			cells.setdefault(idx,[]).append(i)
+		
+		for idx,atoms in cells.items():
+			# collect the atoms of this and all adjacent cells
+			candidates = []
+			for shift in product((-1,0,1),repeat=3):
+				candidates += cells.get((idx[0]+shift[0],idx[1]+shift[1],idx[2]+shift[2]),[])
+			
+			atoms = np.array(atoms)
+			candidates = np.array(candidates)
+			dist = np.linalg.norm(self.xyz_[atoms,None,:] - self.xyz_[None,candidates,:],axis=2)
+			limit = self.bond_tol_ * (self.radii_[atoms,None] + self.radii_[None,candidates])
+			
+			for a,c in zip(*np.nonzero(dist < limit)):
+				if atoms[a] != candidates[c]:
+					bonds[atoms[a]].add(int(candidates[c]))
+		
+		return bonds
+	
+	def neighbors(self,label):
+		# labels of all atoms bonded to the given one
+		try:
+			return [self.labels_[j] for j in sorted(self.bonds_[self.index_[label]])]
+		except KeyError:
+			raise ConnectivityError('atom {} is not part of the molecule!'.format(label))
+	
+	# returns a dict assigning to each metal center a dict of the bridged metal centers, each with the list of bridging
+	# atoms (empty for a direct metal-metal bond), e.g. {'1fe':{'2fe':['5o'],'4fe':['8o']}, ...}
+	def metalGraph(self,metal_centers):
+		graph = {center:{} for center in metal_centers}
+		for center in metal_centers:
+			for nb in self.neighbors(center):
+				if nb in graph:
+					graph[center].setdefault(nb,[])
+					continue
+				
+				# nb is a ligand atom, every other metal center bonded to it is bridged
+				for other in self.neighbors(nb):
+					if other in graph and other != center:
+						graph[center].setdefault(other,[]).append(nb)
+		
+		return graph
+	
+	def pairs(self,metal_centers):
+		# list of all pairs of bridged metal centers, e.g. [('1fe','2fe'),('1fe','4fe'), ...]
+		graph = self.metalGraph(metal_centers)
+		order = {center:i for i,center in enumerate(metal_centers)}
+		return [(a,b) for a in metal_centers for b in sorted(graph[a],key=order.get) if order[a] < order[b]]
+	
+	# splits the metal centers into domains, i.e. connected groups of bridged metal centers of the same element,
+	# e.g. [['1fe','2fe'],['5fe'],['3co','4co']]
+	def domains(self,metal_centers):
+		graph = self.metalGraph(metal_centers)
+		element = {center:re.findall('[a-z]+',center.lower())[0] for center in metal_centers}
+		order = {center:i for i,center in enumerate(metal_centers)}
+		
+		domains = []
+		assigned = set()
+		for center in metal_centers:
+			if center in assigned:
+				continue
+			
+			# collect all centers reachable from here
+			domain = []
+			stack = [center]
+			assigned.add(center)
+			while stack:
+				current = stack.pop()
+				domain.append(current)
+				for nb in graph[current]:
+					if not nb in assigned and element[nb] == element[center]:
+						assigned.add(nb)
+						stack.append(nb)
+			
+			domains.append(sorted(domain,key=order.get))
+		
+		return domains
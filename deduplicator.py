@@ -0,0 +1,165 @@
+#! /usr/bin/python3
+
+##################################
+# deduplicator class definition  #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import os
+import time
+import tmjob as jm
+import QueueSys as qs
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class DeduplicatorError(Exception):
+	pass
+
+
+# spin signature of an occupation pattern like {'1fe':(5,0),'2fe':(1,5)} (see spinflipper)
+def signature(pattern):
+	return {center:float(a - b) for center,(a,b) in pattern.items()}
+
+
+# watches low spin jobs as they finish and gets rid of jobs that lead to already known states
+class deduplicator:
+	def __init__(self,queuesys,spin_tol=0.5,energy_tol=1e-4,cancel=True,verbose=0):
+		if not isinstance(queuesys,qs.QueueSys):
+			raise DeduplicatorError('given argument is not an instance of QueueSys!')
+		
+		self.queue_ = queuesys
+		self.spin_tol_ = spin_tol		# spin densities of the same state differ by at most this much per center
+		self.energy_tol_ = energy_tol		# finished jobs in the same state with equal energy are duplicates
+		self.cancel_ = cancel			# cancel redundant queued jobs (otherwise they are only marked)
+		self.vrbs_lvl_ = verbose
+		
+		self.jobs_ = {}		# job path -> {'job', 'id', 'target'}
+		self.states_ = []	# converged states: (group, centers, spin densities, energy, job)
+		self.known_ = {}	# target -> first converged job which reached it (whatever its own target was)
+		self.redundant_ = {}	# job path -> path of the equivalent job
+	
+	def __key(self,signature,group):
+		# a target and its spin inverted partner (only possible for MS = 0) share a key
+		centers = sorted(signature)
+		key = tuple(int(round(signature[c])) for c in centers)
+		if sum(key) == 0:
+			key = max(key,tuple(-k for k in key))
+		return (group,tuple(centers),key)
+	
+	def __variants(self,spins):
+		# the spin densities and, for MS = 0, those of the spin inverted partner
+		if abs(sum(spins)) <= self.spin_tol_:
+			return [spins,tuple(-x for x in spins)]
+		return [spins]
+	
+	def __reached(self,target,spins):
+		# the (integer) numbers of unpaired electrons of the target can't be compared with Mulliken spin densities, which
+		# are considerably smaller for open d shells; the target counts as reached, if the signs of the spin densities
+		# of all centers are those of the target (densities within the tolerance count as zero)
+		signs = tuple((x > self.spin_tol_) - (x < -self.spin_tol_) for x in spins)
+		target_signs = tuple((k > 0) - (k < 0) for k in target[2])
+		if signs == target_signs:
+			return True
+		return sum(target[2]) == 0 and tuple(-x for x in signs) == target_signs
+	
+	def __same(self,spins,other):
+		return any(all(abs(a - b) <= self.spin_tol_ for a,b in zip(variant,other)) for variant in self.__variants(spins))
+	
+	def watch(self,job,job_id,target,group=None):
+		# target is the spin signature the job is supposed to reach, e.g. signature(spinflipper.patterns_[job.path_]);
+		# jobs are compared only within their group, e.g. the jobs of one reference job
+		if not isinstance(job,jm.tmjob):
+			raise DeduplicatorError('given job is not an instance of tmjob!')
+		
+		# without target, only the job ID of an already watched job is updated (e.g. after resubmission by the scfmonitor)
+		if job.path_ in self.jobs_:
+			self.jobs_[job.path_]['id'] = job_id
+		elif target:
+			self.jobs_[job.path_] = {'job':job, 'id':job_id, 'target':self.__key(target,group)}
+	
+	def __markRedundant(self,job,equivalent,reason):
+		self.redundant_[job.path_] = equivalent.path_
+		with open(os.path.join(job.path_,'REDUNDANT'),'w') as fh:
+			fh.write('{}: equivalent to {}\n'.format(reason,equivalent.path_))
+		
+		if self.vrbs_lvl_ >= 0:
+			print("  -> job {} is redundant ({}: equivalent to {})".format(job,reason,equivalent),flush=True)
+	
+	def __harvest(self,job,target):
+		# add the state of a finished job, returns the job of an equivalent state found before (or None)
+		energy = job.getEnergy()
+		if energy is None:
+			return None
+		
+		group,centers,key = target
+		spins = job.getSpinDensities()
+		try:
+			spins = tuple(spins[c] for c in centers)
+		except KeyError:
+			raise DeduplicatorError('no spin densities of the metal centers found in the output of job "' + str(job) + '"! Was $pop set?')
+		
+		# the job may have collapsed into the target state of another job, thus all targets of the group are checked
+		targets = [target] + [entry['target'] for entry in self.jobs_.values() if entry['target'][:2] == target[:2]]
+		for reached in targets:
+			if self.__reached(reached,spins):
+				self.known_.setdefault(reached,job)
+		
+		for state_group,state_centers,state_spins,state_energy,state_job in self.states_:
+			if state_group == group and state_centers == centers and self.__same(spins,state_spins) and abs(state_energy - energy) < self.energy_tol_:
+				return state_job
+		
+		self.states_.append((group,centers,spins,energy,job))
+		return None
+	
+	def poll(self):
+		# one pass over all watched jobs, returns the number of jobs not yet finished
+		schedule = self.queue_.get_schedule()
+		queued = [line[0] for line in schedule if line[4] in 'QH']
+		active = [line[0] for line in schedule if line[4] in 'QRH']
+		
+		# collect the states of all jobs finished since the last call
+		for path in list(self.jobs_):
+			entry = self.jobs_[path]
+			if entry['id'] in active:
+				continue
+			
+			del self.jobs_[path]
+			if not entry['job'].isConverged():
+				continue
+			
+			equivalent = self.__harvest(entry['job'],entry['target'])
+			if equivalent:
+				self.__markRedundant(entry['job'],equivalent,'same state and energy')
+		
+		# jobs still waiting in the queue are redundant, if another job has already reached their target state
+		known = self.known_
+		for path in list(self.jobs_):
+			entry = self.jobs_[path]
+			if entry['id'] in queued and entry['target'] in known:
+				if self.cancel_:
+					try:
+						self.queue_.cancel(entry['id'])
+					except qs.QueueSysError:
+						continue		# the job may just have started
+				
+				self.__markRedundant(entry['job'],known[entry['target']],'target state already converged')
+				del self.jobs_[path]
+		
+		return len(self.jobs_)
+	
+	def run(self,interval=60.0):
+		print(" Watching {:d} job(s) for duplicates ...".format(len(self.jobs_)),flush=True)
+		while self.poll() > 0:
+			time.sleep(interval)
+		
+		return self.redundant_
@@ -0,0 +1,225 @@
+#! /usr/bin/python3
+
+##################################
+# exporter class definition      #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import os
+import csv
+import math
+import hashlib
+import importlib
+import tempfile
+import tmjob as jm
+from tools import UMASK, lazyModule
+np = lazyModule('numpy')		# imported on first use
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class ExporterError(Exception):
+	pass
+
+
+def referenceHash(job):
+	# SHA-256 of the control file of the job and all files it refers to (coord, basis, MOs, ...), i.e. of its input
+	# and its converged orbitals; it identifies the reference job in exported tables independent of its location
+	sha = hashlib.sha256()
+	sha.update(''.join(job.control_).encode())
+	for line in job.control_:
+		words = line.split()
+		if len(words) > 1 and words[0].startswith('$') and words[-1].startswith('file='):
+			path = os.path.join(job.path_,words[-1].split('=',1)[1])
+			if os.path.isfile(path):
+				with open(path,'rb') as fh:
+					for block in iter(lambda: fh.read(1 << 20),b''):
+						sha.update(block)
+	
+	return sha.hexdigest()
+
+def pyarrowAvailable():
+	try:
+		importlib.import_module('pyarrow.parquet')
+	except ImportError:
+		return False
+	return True
+
+
+# a table with typed columns; the types are 'str', 'int64', 'float64' and 'bool', so that files of different runs
+# always have the same columns of the same types (missing floats are NaN)
+class table:
+	types_ = ['str','int64','float64','bool']
+	
+	def __init__(self,name,columns):
+		self.name_ = name
+		self.columns_ = list(columns)		# pairs of column name and type, e.g. [('center','str'),('num_alpha','int64')]
+		for col,kind in self.columns_:
+			if not kind in self.types_:
+				raise ExporterError('unknown type {} of column {} in table {}!'.format(kind,col,name))
+		self.rows_ = []
+	
+	def append(self,row):
+		# row is a dict with the column names as keys
+		try:
+			self.rows_.append(tuple(self.__convert(row[col],kind) for col,kind in self.columns_))
+		except KeyError as err:
+			raise ExporterError('no value for column {} in table {}!'.format(err,self.name_))
+	
+	def __convert(self,value,kind):
+		if kind == 'str':
+			return '' if value is None else str(value)
+		if kind == 'int64':
+			return int(value)
+		if kind == 'float64':
+			return math.nan if value is None else float(value)
+		return bool(value)
+	
+	def column(self,col):
+		i = [c for c,kind in self.columns_].index(col)
+		return [row[i] for row in self.rows_]
+
+
+# writes the tables of an analysis and its low spin jobs into a directory, one file per table in one of the formats
+# 'npz' (numpy), 'parquet' (needs pyarrow) or 'csv'; 'auto' means parquet, if pyarrow is available, and npz otherwise;
+# every file carries the hash of the reference job (see referenceHash); with by_hash, the files are written into a
+# subdirectory named after the hash and the location of the reference job, e.g. to export many reference jobs into
+# one directory (reference jobs with the same input in different directories don't overwrite each other's tables)
+class exporter:
+	formats_ = ['auto','npz','parquet','csv']
+	
+	def __init__(self,refjob,directory,fmt='auto',by_hash=False,verbose=0):
+		if not isinstance(refjob,jm.tmjob):
+			raise ExporterError('given reference job is not an instance of tmjob!')
+		
+		if not fmt in self.formats_:
+			raise ExporterError('unknown export format "{}"!'.format(fmt))
+		
+		if fmt in ['auto','parquet'] and not pyarrowAvailable():
+			if fmt == 'parquet' and verbose >= 0:
+				print(" pyarrow is not available, exporting CSV files instead of parquet files")
+			fmt = 'npz' if fmt == 'auto' else 'csv'
+		elif fmt == 'auto':
+			fmt = 'parquet'
+		
+		self.refjob_ = refjob
+		self.fmt_ = fmt
+		self.hash_ = referenceHash(refjob)
+		self.dir_ = os.path.abspath(directory)
+		if by_hash:
+			location = hashlib.sha256(os.path.abspath(refjob.path_).encode()).hexdigest()
+			self.dir_ = os.path.join(self.dir_,self.hash_[:16] + '-' + location[:8])
+		self.vrbs_lvl_ = verbose
+		self.files_ = []		# paths of all files written so far
+	
+	def exportAnalysis(self,analysis):
+		# tables 'centers' (one row per metal center) and 'lmos' (one row per Mulliken contribution to an LMO)
+		lmos = analysis.lmos_
+		spins = analysis.popanalyzer_.popjob_.getSpinDensities() if analysis.popanalyzer_ and analysis.popanalyzer_.popjob_ else {}
+		domain = {}
+		for i,dom in enumerate(analysis.domains_ or []):
+			for center in dom:
+				domain[center] = i + 1
+		
+		centers = table('centers',[('center','str'),('element','str'),('num_alpha','int64'),('num_beta','float64'),
+		                           ('ox_state','str'),('spin_density','float64'),('domain','int64')])
+		for center in analysis.metal_centers_:
+			centers.append({'center':center, 'element':center.lstrip('0123456789'), 'num_alpha':len(lmos.metal_alpha_idxs_[center]),
+			                'num_beta':lmos.partition_beta_electrons_[center], 'ox_state':analysis.ox_states_[center],
+			                'spin_density':spins.get(center), 'domain':domain.get(center,0)})
+		self.write(centers)
+		
+		assigned = {idx:center for center,idxs in lmos.metal_alpha_idxs_.items() for idx in idxs}
+		lmo_table = table('lmos',[('spin','str'),('lmo','int64'),('atom','str'),('charge','float64'),('center','str')])
+		for spin in ['alpha','beta']:
+			for num,charges in analysis.localizer_.getLMOs(spin):
+				for atom,charge in charges:
+					lmo_table.append({'spin':spin, 'lmo':num, 'atom':atom, 'charge':charge,
+					                  'center':assigned.get(num) if spin == 'alpha' else None})
+		self.write(lmo_table)
+	
+	def exportConfigurations(self,entries,metal_centers,name='configurations'):
+		# table with one row per low spin job; entries are LowSpinJobs (see lowspin.generate), whose energies are read,
+		# if the jobs are finished, or plan entries (see lowspin.plan)
+		configs = table(name,[('dir','str'),('flip','str'),('rank','int64'),('alpha','int64'),('beta','int64'),('multiplicity','int64')] +
+		                     [('occ_' + center,'int64') for center in metal_centers] + [('energy','float64'),('converged','bool')])
+		for entry in entries:
+			if isinstance(entry,dict):
+				row = {'dir':entry['dir'], 'flip':','.join(entry['flip']), 'rank':entry.get('rank',-1), 'alpha':entry['alpha'],
+				       'beta':entry['beta'], 'multiplicity':entry['multiplicity'], 'energy':None, 'converged':False}
+				beta_occ = entry['beta_occ']
+			else:
+				alpha = entry.job_.getNumE('alpha')
+				beta = entry.job_.getNumE('beta')
+				row = {'dir':os.path.basename(entry.job_.path_), 'flip':','.join(entry.centers_), 'rank':-1, 'alpha':alpha,
+				       'beta':beta, 'multiplicity':abs(alpha - beta) + 1, 'energy':entry.job_.getEnergy(),
+				       'converged':entry.job_.isConverged()}
+				beta_occ = entry.beta_occ_
+			
+			for center in metal_centers:
+				row['occ_' + center] = beta_occ[center]
+			configs.append(row)
+		self.write(configs)
+	
+	def write(self,tab):
+		os.makedirs(self.dir_,exist_ok=True)
+		path = os.path.join(self.dir_,tab.name_ + '.' + self.fmt_)
+		
+		# the table is written to a temporary file first, so that readers never see a partial file
+		fd,tmp_path = tempfile.mkstemp(dir=self.dir_,prefix='.' + os.path.basename(path) + '.')
+		os.close(fd)
+		try:
+			if self.fmt_ == 'npz':
+				self.__writeNPZ(tab,tmp_path)
+			elif self.fmt_ == 'parquet':
+				self.__writeParquet(tab,tmp_path)
+			else:
+				self.__writeCSV(tab,tmp_path)
+			os.chmod(tmp_path,0o666 & ~UMASK)
+			os.replace(tmp_path,path)
+		except:
+			if os.path.isfile(tmp_path):
+				os.remove(tmp_path)
+			raise
+		
+		self.files_.append(path)
+		if self.vrbs_lvl_ > 0:
+			print("  {:d} row(s) exported to {}".format(len(tab.rows_),path))
+		return path
+	
+	def __writeNPZ(self,tab,path):
+		dtypes = {'str':'U','int64':np.int64,'float64':np.float64,'bool':np.bool_}
+		arrays = {col:np.array(tab.column(col),dtype=dtypes[kind]) for col,kind in tab.columns_}
+		arrays['__table__'] = np.array(tab.name_)
+		arrays['__reference__'] = np.array(self.refjob_.path_)
+		arrays['__reference_hash__'] = np.array(self.hash_)
+		with open(path,'wb') as fh:
+			np.savez_compressed(fh,**arrays)
+	
+	def __writeParquet(self,tab,path):
+		pa = importlib.import_module('pyarrow')
+		pq = importlib.import_module('pyarrow.parquet')
+		types = {'str':pa.string(),'int64':pa.int64(),'float64':pa.float64(),'bool':pa.bool_()}
+		schema = pa.schema([(col,types[kind]) for col,kind in tab.columns_],
+		                   metadata={'table':tab.name_,'reference':self.refjob_.path_,'reference_hash':self.hash_})
+		pq.write_table(pa.table({col:tab.column(col) for col,kind in tab.columns_},schema=schema),path)
+	
+	def __writeCSV(self,tab,path):
+		# the header lines starting with '#' hold the meta data and the column types
+		with open(path,'w',newline='') as fh:
+			fh.write('# table: {}\n'.format(tab.name_))
+			fh.write('# reference: {}\n'.format(self.refjob_.path_))
+			fh.write('# reference_hash: {}\n'.format(self.hash_))
+			fh.write('# types: {}\n'.format(','.join(kind for col,kind in tab.columns_)))
+			writer = csv.writer(fh)
+			writer.writerow([col for col,kind in tab.columns_])
+			writer.writerows(tab.rows_)
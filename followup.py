@@ -0,0 +1,135 @@
+#! /usr/bin/python3
+
+##################################
+# followup class definition      #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import os
+import re
+import time
+import tmjob as jm
+import QueueSys as qs
+from tools import writeAtomic
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class FollowupError(Exception):
+	pass
+
+
+# a call of dscf or ridft in a job script (comments excluded)
+ENERGY_CALL = re.compile(r'^[^#]*\b(dscf|ridft)\b')
+
+
+# watches low spin jobs until they are finished and launches a geometry optimization (jobex) followed by a frequency
+# calculation (aoforce) for the lowest states through the queuing system; the converged jobs are reused in place, i.e.
+# the optimization starts from their orbitals; the job script of the follow-up is the PBS script with its call of
+# dscf/ridft replaced, so that it asks for the same resources
+class followup:
+	script_name_ = 'followup.job'
+	marker_ = 'FOLLOWUP'			# written into each followed up job, such jobs are never launched twice
+	
+	def __init__(self,queuesys,num_best=1,window=None,opt_flags=[],verbose=0):
+		if not isinstance(queuesys,qs.QueueSys):
+			raise FollowupError('given argument is not an instance of QueueSys!')
+		if num_best < 1:
+			raise FollowupError('at least the lowest state has to be followed up!')
+		
+		self.queue_ = queuesys
+		self.num_best_ = num_best		# number of the lowest states followed up per group ...
+		self.window_ = window			# ... or all states up to this energy (in Hartree) above the lowest one
+		self.opt_flags_ = list(opt_flags)	# further flags of jobex, e.g. ['-c','100']
+		self.vrbs_lvl_ = verbose
+		
+		self.jobs_ = {}			# job path -> {'job', 'id', 'group'}
+		self.launched_ = []		# follow-up runs: (job, job ID)
+	
+	def watch(self,job,job_id,group=None):
+		# jobs are compared only within their group, e.g. the jobs of one reference job
+		if not isinstance(job,jm.tmjob):
+			raise FollowupError('given job is not an instance of tmjob!')
+		
+		self.jobs_[job.path_] = {'job':job, 'id':job_id, 'group':group}
+	
+	def poll(self):
+		# returns the number of watched jobs still in the queue
+		active = self.queue_.get_job_IDs('QRH')
+		return len([entry for entry in self.jobs_.values() if entry['id'] in active])
+	
+	def select(self):
+		# the jobs to be followed up in the order of their energies, grouped by the groups of the jobs; jobs marked as
+		# redundant (see deduplicator) and unconverged jobs are left out
+		states = {}
+		for entry in self.jobs_.values():
+			job = entry['job']
+			if os.path.isfile(os.path.join(job.path_,'REDUNDANT')) or not job.isConverged():
+				continue
+			energy = job.getEnergy()
+			if energy is not None:
+				states.setdefault(entry['group'],[]).append((energy,job))
+		
+		selected = {}
+		for group,group_states in states.items():
+			group_states.sort(key=lambda state:state[0])
+			if self.window_ is not None:
+				selected[group] = [(e,job) for e,job in group_states if e - group_states[0][0] <= self.window_]
+			else:
+				selected[group] = group_states[:self.num_best_]
+		
+		return selected
+	
+	def __script(self,job):
+		# the PBS script with the optimization and the frequency calculation instead of the single point; the
+		# frequencies are calculated only if the optimization converged
+		opt,freq = job.getCommands(opt=True,opt_flags=self.opt_flags_,freq=True,energy=False)
+		with open(self.queue_.job_script_,'r') as fh:
+			lines = fh.readlines()
+		
+		calls = [i for i,line in enumerate(lines) if ENERGY_CALL.match(line)]
+		if not calls:
+			raise FollowupError('no call of dscf or ridft found in the job script "' + str(self.queue_.job_script_) + '"!')
+		
+		indent = re.match(r'\s*',lines[calls[0]]).group(0)
+		lines[calls[0]] = indent + opt + '\n' + indent + 'test -f GEO_OPT_CONVERGED && ' + freq + '\n'
+		return ''.join(line for i,line in enumerate(lines) if not i in calls[1:])
+	
+	def launch(self):
+		# submits the follow-up runs of the selected jobs; returns them as pairs of job and job ID
+		launched = []
+		for group,states in self.select().items():
+			for energy,job in states:
+				marker = os.path.join(job.path_,self.marker_)
+				if os.path.isfile(marker):
+					continue
+				
+				script = os.path.join(job.path_,self.script_name_)
+				writeAtomic(script,self.__script(job))
+				job_id = self.queue_.schedule(job.path_,script)
+				with open(marker,'w') as fh:
+					fh.write('optimization and frequencies submitted as job {}\n'.format(job_id))
+				
+				launched.append((job,job_id))
+				if self.vrbs_lvl_ >= 0:
+					print("  -> follow-up of job {} (E = {:.6f}) submitted as {}".format(job,energy,job_id),flush=True)
+		
+		self.launched_ += launched
+		return launched
+	
+	def run(self,interval=60.0):
+		# waits for all watched jobs and launches the follow-up runs
+		print(" Waiting for {:d} job(s) to finish before following up the lowest states ...".format(len(self.jobs_)),flush=True)
+		while self.poll() > 0:
+			time.sleep(interval)
+		
+		return self.launch()
@@ -0,0 +1,231 @@
+#! /usr/bin/python3
+
+##################################
+# heisenberg class definition    #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+from fractions import Fraction
+from tools import lazyModule
+np = lazyModule('numpy')		# imported on first use
+sparse = lazyModule('scipy.sparse')
+splinalg = lazyModule('scipy.sparse.linalg')
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class HeisenbergError(Exception):
+	pass
+
+
+def spinLabel(s):
+	# e.g. 2.5 -> '5/2', 2.0 -> '2'
+	return str(Fraction(s).limit_denominator(2))
+
+# reads the exchange constants of the metal centers from a file with lines like "1fe 2fe -25.3" (empty lines and
+# everything after '#' are ignored); pairs not listed are uncoupled; returns the symmetric J matrix
+def readCouplings(path,centers):
+	index = {center:i for i,center in enumerate(centers)}
+	J = [[0.0 for j in centers] for i in centers]
+	with open(path) as fh:
+		for num,line in enumerate(fh,1):
+			words = line.split('#')[0].split()
+			if not words:
+				continue
+			
+			try:
+				a,b,value = words[0].lower(),words[1].lower(),float(words[2])
+			except (IndexError,ValueError):
+				raise HeisenbergError('unable to read exchange constant in line {:d} of "{}"!'.format(num,path))
+			
+			if not a in index or not b in index or a == b:
+				raise HeisenbergError('no pair of metal centers {} and {} in line {:d} of "{}"!'.format(a,b,num,path))
+			J[index[a]][index[b]] = J[index[b]][index[a]] = value
+	
+	return J
+
+# Heisenberg model H = -2 sum_{i<j} J_ij S_i.S_j of the local spins of the metal centers; the Hamiltonian is set up as
+# sparse matrix block by block, one block (sector) per total MS, since it commutes with the total MS; the lowest
+# eigenvalues of a block are found iteratively (Lanczos), so that only the block, not the full Hamiltonian, has to fit
+# into memory, e.g. 16 centers with s=1/2 (12870 states for MS=0), 12 centers with s=1 (73789 states) or 8 centers with s=5/2
+# (135954 states)
+class heisenberg:
+	dense_limit_ = 500			# blocks up to this size are diagonalized directly
+	max_levels_ = 16			# number of levels of a sector searched for the lowest one of a total spin (see ladder)
+	
+	def __init__(self,centers,spins,J,verbose=0):
+		if len(centers) < 2 or len(spins) != len(centers):
+			raise HeisenbergError('at least two metal centers with one spin each are needed!')
+		
+		self.centers_ = list(centers)
+		self.twos_ = np.array([int(round(2*s)) for s in spins])	# 2s of each center, so that all spin quantum numbers are integers
+		if np.any(self.twos_ < 0) or np.any(np.abs(self.twos_ - 2*np.array(spins,dtype=float)) > 1e-6):
+			raise HeisenbergError('local spins have to be non-negative multiples of 1/2: {}'.format(spins))
+		
+		self.J_ = np.array(J,dtype=float)
+		if self.J_.shape != (len(centers),len(centers)) or not np.allclose(self.J_,self.J_.T):
+			raise HeisenbergError('the exchange constants have to form a symmetric {0:d}x{0:d} matrix!'.format(len(centers)))
+		
+		# states are numbered in a mixed radix system with the digits twos + 2m of the centers (first center most significant)
+		self.bases_ = self.twos_ + 1
+		self.radix_ = np.ones(len(centers),dtype=np.int64)
+		for i in range(len(centers)-2,-1,-1):
+			self.radix_[i] = self.radix_[i+1] * self.bases_[i+1]
+		if float(np.prod(self.bases_.astype(float))) > 2.0**62:
+			raise HeisenbergError('too many spin states to be numbered!')
+		
+		self.vrbs_lvl_ = verbose
+		self.sectors_ = {}			# cached blocks: 2MS -> (states, H, S^2)
+	
+	def spins(self):
+		return [t / 2.0 for t in self.twos_]
+	
+	def sectorValues(self):
+		# all possible total MS >= 0, e.g. [0.0, 1.0, 2.0, ...] or [0.5, 1.5, ...]
+		total = int(self.twos_.sum())
+		return [t / 2.0 for t in range(total % 2,total+1,2)]
+	
+	def __states(self,two_M):
+		# numbers of all states with total 2MS = two_M (sorted); the digits are added center by center, partial sums
+		# which can't be completed by the remaining centers are dropped immediately
+		rest = np.concatenate((np.cumsum(self.twos_[::-1])[::-1][1:],[0]))
+		states = np.zeros(1,dtype=np.int64)
+		partial = np.zeros(1,dtype=np.int64)		# 2MS of the centers so far
+		for i,two_s in enumerate(self.twos_):
+			digits = np.arange(two_s+1)
+			states = (states[:,None] * self.bases_[i] + digits[None,:]).ravel()
+			partial = (partial[:,None] + 2*digits[None,:] - two_s).ravel()
+			keep = np.abs(two_M - partial) <= rest[i]
+			states,partial = states[keep],partial[keep]
+		
+		return states
+	
+	def __operator(self,states,K,const=0.0):
+		# sparse matrix of sum_{i<j} K_ij S_i.S_j + const in the basis of the given states
+		twoM = np.empty((len(states),len(self.twos_)),dtype=np.int16)		# 2m of each center
+		for i in range(len(self.twos_)):
+			twoM[:,i] = (states // self.radix_[i]) % self.bases_[i] * 2 - self.twos_[i]
+		ss = self.twos_ * (self.twos_ + 2) / 4.0		# s(s+1)
+		
+		diag = np.full(len(states),const)
+		rows = []
+		cols = []
+		vals = []
+		for i in range(len(self.twos_)):
+			for j in range(i+1,len(self.twos_)):
+				if K[i,j] == 0.0:
+					continue
+				
+				# S_i^z S_j^z
+				diag += K[i,j] * twoM[:,i] * twoM[:,j] / 4.0
+				
+				# (S_i^+ S_j^- + S_i^- S_j^+) / 2, the second term is the transpose of the first one
+				src = np.nonzero((twoM[:,i] < self.twos_[i]) & (twoM[:,j] > -self.twos_[j]))[0]
+				dst = np.searchsorted(states,states[src] + self.radix_[i] - self.radix_[j])
+				mi = twoM[src,i] / 2.0
+				mj = twoM[src,j] / 2.0
+				val = 0.5 * K[i,j] * np.sqrt((ss[i] - mi*(mi+1)) * (ss[j] - mj*(mj-1)))
+				rows += [dst,src]
+				cols += [src,dst]
+				vals += [val,val]
+		
+		rows.append(np.arange(len(states)))
+		cols.append(np.arange(len(states)))
+		vals.append(diag)
+		return sparse.csr_matrix((np.concatenate(vals),(np.concatenate(rows),np.concatenate(cols))),shape=(len(states),len(states)))
+	
+	def sector(self,MS):
+		# states, Hamiltonian and total spin S^2 of the block of the given MS
+		two_M = int(round(2*abs(MS)))
+		if not abs(MS) in self.sectorValues():
+			raise HeisenbergError('there is no sector MS = {}!'.format(spinLabel(MS)))
+		
+		if not two_M in self.sectors_:
+			states = self.__states(two_M)
+			H = self.__operator(states,-2.0*self.J_)
+			S2 = self.__operator(states,np.full(self.J_.shape,2.0),(self.twos_ * (self.twos_ + 2) / 4.0).sum())
+			self.sectors_[two_M] = (states,H,S2)
+			if self.vrbs_lvl_ > 0:
+				print("  sector MS = {:>4}: {:d} states, {:d} non-zero matrix elements".format(spinLabel(abs(MS)),len(states),H.nnz),flush=True)
+		
+		return self.sectors_[two_M]
+	
+	def __eigen(self,A,k):
+		# k lowest eigenvalues (ascending) and eigenvectors of the symmetric sparse matrix A
+		if A.shape[0] <= self.dense_limit_:
+			vals,vecs = np.linalg.eigh(A.toarray())
+			return (vals[:k],vecs[:,:k])
+		
+		vals,vecs = splinalg.eigsh(A,k=min(k,A.shape[0]-1),which='SA')
+		order = np.argsort(vals)
+		return (vals[order],vecs[:,order])
+	
+	def __levels(self,MS,k):
+		# the k lowest eigenvalues of the sector MS and the expectation values of S^2 of their eigenvectors; H and S^2
+		# commute, so the eigenvectors of a degenerate level (e.g. of an uncoupled center) are rotated such that they
+		# diagonalize S^2, which gives them a definite S (unless the degenerate level is cut off by k)
+		states,H,S2 = self.sector(MS)
+		vals,vecs = self.__eigen(H,k)
+		
+		tol = 1e-8 * max(1.0,float(np.abs(vals).max()))
+		start = 0
+		for end in range(1,len(vals)+1):
+			if end == len(vals) or vals[end] - vals[end-1] > tol:
+				if end - start > 1:
+					block = vecs[:,start:end]
+					vecs[:,start:end] = block @ np.linalg.eigh(block.T @ (S2 @ block))[1]
+				start = end
+		
+		return (vals,np.einsum('ij,ij->j',vecs,S2 @ vecs))
+	
+	def lowest(self,MS=None,k=1):
+		# the k lowest levels of the sector MS (default: the smallest MS, which contains all levels) as pairs of energy and
+		# total spin S, e.g. [(-1204.3,0.0),(-1180.1,1.0)]; S is found from the expectation value of S^2
+		if MS is None:
+			MS = self.sectorValues()[0]
+		vals,s2 = self.__levels(MS,k)
+		
+		return [(float(e),float(round(np.sqrt(0.25 + max(float(x),0.0)) - 0.5,1))) for e,x in zip(vals,s2)]
+	
+	def __lowestOfSpin(self,MS):
+		# lowest energy of the levels with S = MS; these are among the lowest levels of the sector MS in most cases,
+		# otherwise all levels with S > MS are shifted up by lam * (S^2 - MS(MS+1)), which exceeds the spectral range of the
+		# sector (this converges much slower, since it widens the spectrum)
+		k = 1
+		while k <= self.max_levels_:
+			vals,s2 = self.__levels(MS,k)
+			for e,x in zip(vals,s2):
+				if abs(x - MS * (MS + 1.0)) < 1e-6:
+					return float(e)
+			k *= 4
+		
+		states,H,S2 = self.sector(MS)
+		spread = float(splinalg.eigsh(H,k=1,which='LA',return_eigenvectors=False)[0]) - self.lowest(MS,1)[0][0]
+		lam = 1.01 * spread / (2.0*MS + 2.0) + 1e-6
+		vals,vecs = self.__eigen(H + lam * (S2 - sparse.identity(len(states),format='csr') * MS * (MS + 1.0)),1)
+		return float(vals[0])
+	
+	def ladder(self):
+		# the lowest energy for each total spin S as list of pairs (S, energy)
+		ladder = []
+		values = self.sectorValues()
+		for n,MS in enumerate(values):
+			# there are levels with S = MS only, if the sector is larger than the next one
+			if n+1 < len(values) and len(self.sector(MS)[0]) == len(self.sector(values[n+1])[0]):
+				continue
+			ladder.append((MS,self.__lowestOfSpin(MS)))
+		
+		return ladder
+	
+	def groundState(self):
+		# total spin and energy of the ground state, e.g. (0.5,-1204.3)
+		return min(self.ladder(),key=lambda level:(level[1],level[0]))
@@ -11,8 +11,11 @@
 # load some helpful modules
 import os
 import shutil
+import subprocess as sp
 import tmjob as jm
-from tools import TMavailable
+import metrics as mt
+from tools import TMavailable, lazyModule
+np = lazyModule('numpy')		# imported on first use
 
 
 # prevent stand-alone execution
@@ -26,13 +29,23 @@ class LocalizerError(Exception):
 	pass
 
 
+# the charge contributions of the atoms to the LMOs are either read from the Mulliken analysis in the output of the
+# localization ('mulliken') or computed from the LMO coefficients and the basis sets ('coefficients', see __populateLMOs)
 class localizer:
-	def __init__(self,refjob,verbose=0):
+	assignments_ = ['mulliken','coefficients']
+	min_contrib_ = 1e-5		# smaller contributions computed from the coefficients are dropped
+	
+	def __init__(self,refjob,verbose=0,assignment='mulliken'):
 		if not isinstance(refjob,jm.tmjob):
 			raise LocalizerError('given argument is not an instance of tmjob!')
 		
+		if not assignment in self.assignments_:
+			raise LocalizerError('unknown assignment of LMOs "{}"!'.format(assignment))
+		
 		self.refjob_ = refjob
+		self.assignment_ = assignment
 		self.locjob_ = None
+		self.lmo_cache_ = {}		# LMOs read from the output of the localization per spin (see __readLMOs)
 		self.vrbs_lvl_ = verbose
 		
 		# check if there are already localized orbitals in the reference job
@@ -50,20 +63,49 @@ class localizer:
 		if isinstance(AtomIndices,str):
 			AtomIndices = [AtomIndices]
 		
+		occ_tol = 0.1 if not tol else tol
+		
+		indices = {}
+		lmos = self.__readLMOs(spin)
+		uhf = self.locjob_.isUHF()
+		for tmp_num,charges in lmos:
+			tmp_occ,contribs = self.__accumulateCharges(AtomIndices,charges)
+			
+			# accept lmos with occupation close to 1.00
+			if not uhf: tmp_occ /= 2.0
+			if abs(tmp_occ - 1.00) < occ_tol:
+				indices[tmp_num] = contribs
+		
+		return indices
+	
+	def getLMOs(self,spin=None):
+		# all LMOs (of the given spin), see __readLMOs
+		return self.__readLMOs(spin)
+	
+	# returns a list of all LMOs (of the given spin) as pairs of the LMO number and a list of the Mulliken charge
+	# contributions of the atoms, e.g. (41, [('1fe',0.33279),('2fe',0.33339)]); the output of the localization is
+	# read only once per spin, since the LMOs are asked for again and again
+	def __readLMOs(self,spin):
 		# in case there are no localized orbitals yet, produce them
 		if not self.locjob_:
 			self.boys()		# this sets self.locjob_
 		
+		if spin in self.lmo_cache_:
+			return self.lmo_cache_[spin]
+		
+		if self.assignment_ == 'coefficients':
+			self.lmo_cache_[spin] = self.__populateLMOs(spin)
+			return self.lmo_cache_[spin]
+		
 		boys_output = self.locjob_.getOutputFile('energy')
 		if not boys_output:
 			raise LocalizerError('output file from orbital localization is missing in "' + str(self.locjob_.path_) + '"!')
 		
-		indices = {}
+		lmos = []
 		with open(boys_output) as fh:
 			# set defaults for search range: all localized MOs
 			start_anker = 'BOYS ORBITAL LOCALISATION'
 			end_anker = '=========='
-			occ_tol = 0.1 if not tol else tol
 			
 			# adapt search range to alpha/beta shells only
 			if spin == 'alpha':
@@ -106,18 +148,63 @@ class localizer:
 						except ValueError:
 							tmp_num = int(block[0].split()[2].split('.')[1])
 						
-						tmp_occ,contribs = self.__accumulateCharges(AtomIndices,block)
-						
-						# accept lmos with occupation close to 1.00
-						if not self.locjob_.isUHF(): tmp_occ /= 2.0
-						if abs(tmp_occ - 1.00) < occ_tol:
-							indices[tmp_num] = contribs
+						lmos.append((tmp_num,self.__readCharges(block)))
 				
 				if start_anker in line:
 					reading_LMOs = True
 					fh.readline()		# skip one line (containing "...======...") to avoid premature break
 		
-		return indices
+		self.lmo_cache_[spin] = lmos
+		return lmos
+	
+	def __populateLMOs(self,spin):
+		# same as __readLMOs, but the contributions are the Mulliken gross populations of the atoms computed from the
+		# coefficients of the LMOs (lalp/lbet or lmos), for all LMOs at once and without any print threshold; the overlap
+		# matrix of the basis functions follows from the canonical MOs without any integrals: they are all nsaos
+		# orthonormal MOs, i.e. C S C^T = 1 and therefore S = (C^T C)^-1 (one MO per row of C)
+		atoms = self.locjob_.getBasisFunctionAtoms()
+		labels = list(dict.fromkeys(atoms))		# in the order of the coord file
+		owners = np.zeros((len(atoms),len(labels)))
+		owners[np.arange(len(atoms)),[labels.index(atom) for atom in atoms]] = 1.0
+		
+		uhf = self.locjob_.isUHF()
+		if not uhf:
+			spins = [None]
+		elif spin in ['alpha','beta']:
+			spins = [spin]
+		else:
+			spins = ['alpha','beta']
+		
+		try:
+			canonical = self.locjob_.getMOMatrix(spins[0],local=False)
+		except jm.TMJobHandlerError as tmerr:
+			raise LocalizerError('unable to read the canonical MOs in "' + str(self.locjob_.path_) + '": ' + str(tmerr))
+		
+		if canonical.shape != (len(atoms),len(atoms)):
+			raise LocalizerError('the overlap matrix can be computed only from all {:d} canonical MOs, found {:d} of {:d} coefficients!'.format(
+			                     len(atoms),canonical.shape[0],canonical.shape[1]))
+		try:
+			overlap = np.linalg.inv(canonical.T @ canonical)
+		except np.linalg.LinAlgError:
+			raise LocalizerError('the canonical MOs in "' + str(self.locjob_.path_) + '" are linearly dependent!')
+		
+		lmos = []
+		for s in spins:
+			try:
+				coeffs = self.locjob_.getMOMatrix(s,local=True)
+			except jm.TMJobHandlerError as tmerr:
+				raise LocalizerError('unable to read the LMOs in "' + str(self.locjob_.path_) + '": ' + str(tmerr))
+			
+			if coeffs.shape[1] != len(atoms):
+				raise LocalizerError('the LMOs have {:d} coefficients, but there are {:d} basis functions!'.format(coeffs.shape[1],len(atoms)))
+			
+			# populations of shape (#LMOs,#atoms); closed shell LMOs are doubly occupied
+			pops = ((coeffs * (coeffs @ overlap)) @ owners) * (1.0 if uhf else 2.0)
+			order = np.argsort(-pops,axis=1,kind='stable')
+			for num,(pop,idxs) in enumerate(zip(pops,order),1):
+				lmos.append((num,[(labels[i],float(pop[i])) for i in idxs if pop[i] >= self.min_contrib_]))
+		
+		return lmos
 	
 	def __readLMOInfoBlock(self,line,fh):
 		block = []
@@ -134,10 +221,7 @@ class localizer:
 		
 		return block
 	
-	def __accumulateCharges(self,idxs,block):
-		contribs = {i:0.0 for i in idxs}
-		occ = 0.0
-		
+	def __readCharges(self,block):
 		# find the beginning of the Mulliken analysis, add one to get in the next line
 		try:
 			start = block.index('Mulliken contributions greater than  0.1000000:') + 1
@@ -147,19 +231,26 @@ class localizer:
 		if start >= len(block):
 			raise LocalizerError('Mulliken charge contribution table seems to be empty in\n' + block[0])
 		
+		charges = []
 		for line in block[start:]:
 			words = line.split()
-			
-			if words[0] in idxs:
+			try:
+				charges.append((words[0],float(words[1])))
+			except ValueError:
 				try:
-					tmp_occ = float(words[1])
-				except ValueError:
-					try:
-						tmp_occ = float(words[2])
-					except ValueError:
-						continue
-				
-				contribs[words[0]] = tmp_occ
+					charges.append((words[0],float(words[2])))
+				except (IndexError,ValueError):
+					continue
+		
+		return charges
+	
+	def __accumulateCharges(self,idxs,charges):
+		contribs = {i:0.0 for i in idxs}
+		occ = 0.0
+		
+		for atom,tmp_occ in charges:
+			if atom in contribs:
+				contribs[atom] = tmp_occ
 				occ += tmp_occ
 		
 		return (occ,contribs)
@@ -182,7 +273,9 @@ class localizer:
 		num_beta = int(round(tmp_beta))
 		return (num_beta,total_contribs)
 	
-	def boys(self,target_dir):
+	# with pop=True the Mulliken population analysis is requested in the same property run,
+	# so that the popanalyzer can use this job instead of running one on its own
+	def boys(self,target_dir,pop=False):
 		if self.vrbs_lvl_ > 1:
 			print("entering BOYS LOCALIZATION")
 		
@@ -221,16 +314,16 @@ class localizer:
 			if os.path.isdir(loc_dir):
 				shutil.rmtree(loc_dir)
 		
-			# copy input to new directory
-			start_dir = os.getcwd()
-			os.chdir(self.refjob_.path_)
+			# copy input to new directory (each stage logs to its own file, since localization and
+			# population analysis may be prepared at the same time)
+			mt.inc('subprocesses_spawned',command='cpc')
 			if self.vrbs_lvl_ > 1:
 				print(" copying job files ...")
-				os.system('cpc ' + str(loc_dir))
+				sp.call(['cpc',loc_dir],cwd=self.refjob_.path_)
 				print()
 			else:
-				os.system('cpc ' + str(loc_dir) + ' > cpc.err 2>&1')
-			os.chdir(start_dir)
+				with open(os.path.join(self.refjob_.path_,'cpc_' + os.path.basename(os.path.normpath(target_dir)) + '.err'),'w') as log:
+					sp.call(['cpc',loc_dir],cwd=self.refjob_.path_,stdout=log,stderr=sp.STDOUT)
 		
 			if self.vrbs_lvl_ > 0:
 				print(" localizing the valence orbitals " + str(startMO) + "-" + str(endMO) + " ...")
@@ -242,8 +335,9 @@ class localizer:
 			
 			try:
 				self.locjob_ = jm.tmjob(os.path.join(loc_dir,'control'))
-				self.locjob_.addToControl(['$localize mo ' + str(startMO) + '-' + str(endMO)])
-				self.locjob_.run(prop=True)
+				self.locjob_.addToControl(['$localize mo ' + str(startMO) + '-' + str(endMO)] + (['$pop'] if pop else []))
+				with mt.timer('stage_duration_seconds',stage='localization'):
+					self.locjob_.run(prop=True)
 			except jm.TMJobHandlerError as tmerr:
 				print(tmerr)
 				raise LocalizerError('failed to localize orbitals!')
@@ -19,15 +19,27 @@ if not sys.version_info.major == 3 and sys.version_info.minor >= 4:
 import argparse
 import os
 import glob
+import json
 import tmjob as jm
 import QueueSys as qs
 import localizer as lc
 import popanalyzer as pa
 import spinflipper as sf
+import scfmonitor as sm
+import deduplicator as dd
+import connectivity as cn
+import configurations as cs
+import heisenberg as hb
+import exporter as ex
+import wavedriver as wd
+import metrics as mt
+import followup as fu
+import resources as rs
 import PSE
+import tools
 import re
 import math
-from itertools import combinations
+import time
 #from tools import getCombinations
 #import traceback
 from datetime import datetime
@@ -36,11 +48,563 @@ from datetime import datetime
 # global definition
 ox_state = {-5:'-V', -4:'-IV', -3:'-III', -2:'-II', -1:'-I', 0:'0', 1:'I', 2:'II', 3:'III', 4:'IV', 5:'V', 6:'VI', 7:'VII', 8:'VIII'}
 
+def shard(arg):
+	# argument type of --shard, e.g. '2/8' -> (2,8)
+	try:
+		i,n = (int(x) for x in arg.split('/'))
+	except ValueError:
+		raise argparse.ArgumentTypeError('expected the form i/N, e.g. 2/8')
+	if not 1 <= i <= n:
+		raise argparse.ArgumentTypeError('i has to be between 1 and N')
+	return (i,n)
+
+def tolRange(arg):
+	# argument type of --sweep, e.g. '0.1:0.3:0.1' -> [0.1,0.2,0.3] (end included), '0.1,0.25' -> [0.1,0.25], '0.1' -> [0.1]
+	try:
+		if ':' in arg:
+			start,stop,step = (float(x) for x in arg.split(':'))
+			if step <= 0.0:
+				raise ValueError
+			return [round(start + i*step,10) for i in range(int(math.floor((stop - start) / step + 1e-9)) + 1)]
+		return [float(x) for x in arg.split(',')]
+	except ValueError:
+		raise argparse.ArgumentTypeError('expected the form START:STOP:STEP or a comma-separated list of tolerances')
+
+# specialized exception
+class LowSpinError(Exception):
+	pass
+
+
+# possible candidates for spin flipping ... this list can be expanded on demand
+metal_candidates = ['cr','mn','fe','co','ni','cu']
+
+# result of the analysis of a high spin reference job (see analyze)
+class AnalysisResult:
+	def __init__(self,job):
+		self.job_ = job				# the high spin job (tmjob)
+		self.metal_centers_ = []		# e.g. ['9cr','2fe','3fe','5co']
+		self.lmos_ = None			# LMOset of the metal centers
+		self.ox_states_ = {}			# e.g. {'2fe':'III','3fe':'II/III'}
+		self.domains_ = None			# groups of bridged metal centers (see connectivity.domains), if requested
+		self.popanalyzer_ = None
+		self.localizer_ = None
+
+# rules for producing low spin jobs from an analysis (see generate)
+class GenerationPolicy:
+	def __init__(self,scaredy_cat=False,ox_tol=0.1,warm_start=False,pop=False,budget=None,strategy='random',seed=None,shard=None,
+	             bond_tol=1.2,prefix='flip_'):
+		self.scaredy_cat_ = scaredy_cat		# use the exhaustive algorithm when redistributing the excess electrons
+		self.ox_tol_ = ox_tol
+		self.warm_start_ = warm_start
+		self.pop_ = pop				# request a population analysis in each low spin job (needed by the deduplicator)
+		self.budget_ = budget			# see configsource.select
+		self.strategy_ = strategy
+		self.seed_ = seed
+		self.shard_ = shard
+		self.bond_tol_ = bond_tol		# bond detection for the energy model of the selection
+		self.prefix_ = prefix			# new subdirs begin with this prefix
+
+# a newly created low spin job
+class LowSpinJob:
+	def __init__(self,job,refjob,centers,beta_occ,pattern):
+		self.job_ = job				# the new job (tmjob)
+		self.refjob_ = refjob			# the high spin job it is derived from (tmjob)
+		self.centers_ = centers			# flipped metal centers
+		self.beta_occ_ = beta_occ		# number of excess electrons per metal center
+		self.pattern_ = pattern			# number of alpha and beta electrons per metal center, e.g. {'1fe':(5,0),'2fe':(1,5)}
+		self.MS_ = abs(sum(a - b for a,b in pattern.values())) / 2.0
+	
+	def __repr__(self):
+		return str(self.job_)
+
+def findMetalCenters(job):
+	# create a list of all present metal atoms (those that can be flipped) in the job
+	metal_centers = []
+	for metal in metal_candidates:
+		metal_centers += job.getAtomIndexList(metal)	# appends an empty list, if the resp. metal is not in the molecule
+							# metal_centers is now a list like ['9cr','2fe','3fe','5co']
+	return metal_centers
+
+def oxidationState(center,num_alpha,num_beta,ox_tol=0.1):
+	# oxidation state of a metal center from its number of alpha and beta electrons in the valence LMOs, e.g. 'III' or 'II/III'
+	e = re.findall("[a-z]+", center)[0]
+	try:
+		d = PSE.VE[e] - num_alpha - num_beta
+	except KeyError:
+		print("  The element {} is not listed in the program's periodic table so far... :(".format(e))
+		return "---"
+	
+	try:
+		if abs(d - round(d)) < ox_tol:
+			return ox_state[int(round(d))]
+		else:
+			return ox_state[math.floor(d)] + "/" + ox_state[math.ceil(d)]
+	except KeyError:
+		print("  Oxidation state {:f} of element {} seems strange.".format(d,e))
+		return "---"
+
+# localizes the valence orbitals of the high spin job in job_path (if not already done), runs the population analysis
+# and assigns LMOs and excess electrons to the metal centers; with readahead, the MO files are read into the page cache
+# meanwhile (if spin flipping follows)
+def analyze(job_path,alpha_tol=0.1,beta_tol=0.4,ox_tol=0.1,merged=False,bond_tol=None,verbose=0,readahead=False,assignment='mulliken'):
+	start = time.perf_counter()
+	result = AnalysisResult(jm.tmjob(os.path.join(os.path.abspath(job_path),'control')))
+	highspinjob = result.job_
+	result.metal_centers_ = findMetalCenters(highspinjob)
+	metal_centers = result.metal_centers_
+	
+	# fetch general electronic information and spin density population analysis and
+	# localize MOs (if not already done); both are independent property runs and thus run concurrently
+	popanalyzer = pa.popanalyzer(highspinjob,verbose)
+	localizer = lc.localizer(highspinjob,verbose,assignment)
+	if merged:
+		# a single property run in "analysis" serves both (the population analysis only runs
+		# on its own, if an already existing localization lacks it)
+		localizer.boys('analysis',pop=not popanalyzer.popjob_)
+		if len(localizer.locjob_.readDataGrp('$pop')) > 0:
+			popanalyzer.assign(localizer.locjob_)
+		popanalyzer.mulliken('pop')
+	else:
+		from concurrent.futures import ThreadPoolExecutor		# imported here, since it is rather expensive
+		with ThreadPoolExecutor(max_workers=2) as pool:
+			prep_stages = [pool.submit(popanalyzer.mulliken,'pop'),pool.submit(localizer.boys,'loc')]
+		
+		# report failures of all stages, the first one is raised
+		prep_errors = [stage.exception() for stage in prep_stages if stage.exception()]
+		for err in prep_errors[1:]:
+			print("Error in concurrent preparation stage ({}):".format(type(err).__name__))
+			print(err)
+		if prep_errors:
+			raise prep_errors[0]
+	result.popanalyzer_ = popanalyzer
+	result.localizer_ = localizer
+	
+	# the MO files are needed for spin flipping only, they are read into the page cache meanwhile
+	if readahead:
+		tools.readAhead([highspinjob.getDataGrpFile(grp) for grp in ['$uhfmo_alpha','$uhfmo_beta','$scfmo']] +
+		                [localizer.locjob_.getDataGrpFile('$lmo_alpha','lalp')])
+	
+	# collect all necessary data from the (localized) high spin system
+	hs_lmos = sf.LMOset(localizer.locjob_)		# container for lmo infos needed for spin flipping
+	if verbose >= 0:
+		print(" Evaluating Localized MOs ...\n  ",end="",flush=True)
+	for center in metal_centers:
+		# dict like {'1fe':[1,2,4,5],'2fe':[3,7,8,9,10],'4co':[23,24,26,30]}
+		hs_lmos.metal_alpha_idxs_[center] = localizer.getLMOIndices(center,spin='alpha',tol=alpha_tol).keys()
+		if verbose >= 0:
+			print("#",flush=True,end="")
+	if verbose >= 0:
+		print("\n",flush=True)
+	# for spin flipping only the number of already existing beta electrons in the valence states of the metals
+	# that will be flipped are of interest, not their actual LMOs since they are assumed to be delocalized anyways
+	hs_lmos.num_beta_electrons_,hs_lmos.partition_beta_electrons_ = localizer.findBetaElectrons(metal_centers,tol=beta_tol)
+	# for reordering the LMOs it is necessary to know the remainder of orbitals that are not located at one of the
+	# metal sites but belong to the valence region
+	num_alpha_VE = highspinjob.getNumE('alpha') - (highspinjob.getNumE() - highspinjob.getNumVE()) // 2
+	metals_idxs = [idx for i in hs_lmos.metal_alpha_idxs_.values() for idx in i]
+	hs_lmos.other_alpha_idxs_ = [idx for idx in range(1,num_alpha_VE+1) if not idx in metals_idxs]
+	result.lmos_ = hs_lmos
+	
+	for center in hs_lmos.metal_alpha_idxs_:
+		result.ox_states_[center] = oxidationState(center,len(hs_lmos.metal_alpha_idxs_[center]),hs_lmos.partition_beta_electrons_[center],ox_tol)
+	
+	# find groups of bridged metal centers
+	if bond_tol:
+		result.domains_ = cn.connectivity(highspinjob,bond_tol,verbose).domains(metal_centers)
+	
+	mt.observe('stage_duration_seconds',time.perf_counter() - start,stage='analysis')
+	return result
+
+def printAnalysis(analysis):
+	# give a summary of the high spin reference state
+	analysis.popanalyzer_.printSpinDensity()
+	
+	print(flush=True)
+	print()
+	print(" Analysis of Localized MOs")
+	print("---------------------------")
+	print()
+	print("  center   #alpha   #beta   ox. state")
+	print(" -------------------------------------")
+	for center in analysis.lmos_.metal_alpha_idxs_:
+		a = len(analysis.lmos_.metal_alpha_idxs_[center])
+		b = analysis.lmos_.partition_beta_electrons_[center]
+		print("  {:^6}     {:3d}     {:4.2f}   {:^9}".format(center,a,b,analysis.ox_states_[center]))
+	print(" -------------------------------------")
+	print(flush=True)
+	
+	if analysis.domains_:
+		print(" Metal domains:")
+		for dom in analysis.domains_:
+			print("  " + ", ".join(dom))
+		print(flush=True)
+
+# outcome of the analysis for one combination of tolerances (see sweep)
+class SweepPoint:
+	def __init__(self,alpha_tol,beta_tol,ox_tol):
+		self.alpha_tol_ = alpha_tol
+		self.beta_tol_ = beta_tol
+		self.ox_tol_ = ox_tol
+		self.alpha_idxs_ = {}			# alpha LMOs assigned to each metal center, e.g. {'1fe':frozenset([1,2,4,5,6])}
+		self.num_beta_electrons_ = 0		# number of excess electrons
+		self.ox_states_ = {}
+		self.num_beta_occ_ = None		# number of beta occupations (see spinflipper.beta_occupations_), None if there are none
+		self.changes_ = []			# what differs from the previous point, e.g. ['alpha','occ']
+
+# evaluates the analysis for all combinations of the given tolerances (lists); the LMOs are read only once by the
+# localizer of the analysis, so that no TURBOMOLE run is needed; returns a list of SweepPoints (the ox. tolerance
+# changes fastest, the alpha tolerance slowest)
+def sweep(analysis,alpha_tols,beta_tols,ox_tols,scaredy_cat=False):
+	localizer = analysis.localizer_
+	metal_centers = analysis.metal_centers_
+	mode = 0 if scaredy_cat else 1
+	
+	points = []
+	for alpha_tol in alpha_tols:
+		alpha_idxs = {center:frozenset(localizer.getLMOIndices(center,spin='alpha',tol=alpha_tol)) for center in metal_centers}
+		for beta_tol in beta_tols:
+			lmos = sf.LMOset(localizer.locjob_)
+			lmos.metal_alpha_idxs_ = alpha_idxs
+			lmos.num_beta_electrons_,lmos.partition_beta_electrons_ = localizer.findBetaElectrons(metal_centers,tol=beta_tol)
+			for ox_tol in ox_tols:
+				point = SweepPoint(alpha_tol,beta_tol,ox_tol)
+				point.alpha_idxs_ = alpha_idxs
+				point.num_beta_electrons_ = lmos.num_beta_electrons_
+				point.ox_states_ = {center:oxidationState(center,len(alpha_idxs[center]),lmos.partition_beta_electrons_[center],ox_tol) for center in metal_centers}
+				try:
+					point.num_beta_occ_ = len(sf.createBetaOccList(lmos,mode,ox_tol,analysis.domains_))
+				except sf.SpinFlipperError:
+					pass		# the excess electrons can't be distributed among the metal centers
+				
+				if points:
+					prev = points[-1]
+					if prev.alpha_idxs_ != point.alpha_idxs_:
+						point.changes_.append('alpha')
+					if prev.num_beta_electrons_ != point.num_beta_electrons_:
+						point.changes_.append('beta')
+					if prev.ox_states_ != point.ox_states_:
+						point.changes_.append('ox')
+					if prev.num_beta_occ_ != point.num_beta_occ_:
+						point.changes_.append('occ')
+				points.append(point)
+	
+	return points
+
+def printSweep(points):
+	rows = []
+	for point in points:
+		rows.append((" ".join(str(len(idxs)) for idxs in point.alpha_idxs_.values()),
+		             str(point.num_beta_occ_) if point.num_beta_occ_ is not None else "---",
+		             " ".join(point.ox_states_.values())))
+	w_lmos = max([len("#LMOs per center")] + [len(row[0]) for row in rows])
+	w_ox = max([len("ox. states")] + [len(row[2]) for row in rows])
+	line = " " + "-"*(58 + w_lmos + w_ox)
+	
+	print(" Tolerance Sweep")
+	print("-----------------")
+	print()
+	print("  alpha    beta     ox    {:<{}}   #excess   #beta occ.   {:<{}}   changes".format("#LMOs per center",w_lmos,"ox. states",w_ox))
+	print(line)
+	for point,(lmos,occ,ox) in zip(points,rows):
+		print("  {:5.3f}   {:5.3f}   {:5.3f}   {:<{}}   {:7d}   {:>10}   {:<{}}   {}".format(point.alpha_tol_,point.beta_tol_,point.ox_tol_,lmos,w_lmos,
+		      point.num_beta_electrons_,occ,ox,w_ox,", ".join(point.changes_)).rstrip())
+	print(line)
+	print(flush=True)
+
+def localSpins(analysis):
+	# local spin of each metal center of the high spin reference, e.g. {'1fe':2.5,'2fe':2.0}; it is half the number of
+	# unpaired electrons of the (unambiguous) oxidation state, i.e. of the alpha LMOs less the excess electrons
+	spins = {}
+	for center in analysis.metal_centers_:
+		if '/' in analysis.ox_states_[center]:
+			raise LowSpinError('the local spin of {} is ambiguous (oxidation state {})!'.format(center,analysis.ox_states_[center]))
+		num_alpha = len(analysis.lmos_.metal_alpha_idxs_[center])
+		spins[center] = (num_alpha - int(round(analysis.lmos_.partition_beta_electrons_[center]))) / 2.0
+	
+	return spins
+
+def printHeisenberg(model):
+	# spin ladder of a Heisenberg model (see heisenberg.ladder)
+	ladder = model.ladder()
+	S0,E0 = min(ladder,key=lambda level:(level[1],level[0]))
+	
+	print(" Heisenberg Spin Ladder  (H = -2 sum J_ij S_i.S_j)")
+	print("---------------------------------------------------")
+	print()
+	print("  local spins: " + ", ".join("{} {}".format(center,hb.spinLabel(s)) for center,s in zip(model.centers_,model.spins())))
+	print()
+	print("     S        E             E - E0")
+	print(" ------------------------------------")
+	for S,E in ladder:
+		print("  {:>5}   {:12.4f}   {:12.4f}{}".format(hb.spinLabel(S),E,E - E0,"   <-- ground state" if S == S0 else ""))
+	print(" ------------------------------------")
+	print(flush=True)
+
+def prepareFlipping(analysis,policy,verbose=0,prefetch=False):
+	# sets up the spin flipper and the source of the configurations (combinations of flipped centers and beta occupations);
+	# with prefetch, the spin flipper starts reading the MO files right away
+	num_centers = len(analysis.metal_centers_)
+	if num_centers < 2:
+		raise LowSpinError("there is only one metal atom in the system; this program can't help you here.")
+	
+	# set up the spin flipper
+	spinflipper = sf.spinflipper(analysis.job_,analysis.lmos_,policy.prefix_,policy.scaredy_cat_,policy.ox_tol_,verbose,policy.warm_start_,
+	                             policy.pop_,analysis.domains_,prefetch)
+	
+	# the configurations are selected within the budget; the energy model couples bridged centers only
+	pairs = None
+	if policy.budget_ and policy.strategy_ == 'energy':
+		pairs = cn.connectivity(analysis.job_,policy.bond_tol_,verbose).pairs(analysis.metal_centers_)
+	configs = cs.configsource(analysis.metal_centers_,int(num_centers//2),analysis.lmos_,spinflipper.beta_occupations_,pairs,verbose)
+	
+	return (spinflipper,configs)
+
+def printSelection(configs,policy):
+	num_configs = configs.count()
+	if policy.budget_ and policy.budget_ < num_configs:
+		print(" {:d} low spin configuration(s) in total, selecting {:d} ({})".format(num_configs,policy.budget_,policy.strategy_),flush=True)
+	if policy.shard_:
+		print(" creating shard {:d} of {:d}".format(*policy.shard_),flush=True)
+
+# produces the low spin jobs of the analyzed high spin job batch by batch (one batch per set of flipped centers);
+# a batch is created not before the previous one has been fetched, e.g. to allow for warm starts from finished jobs
+def generateBatches(analysis,policy=None,verbose=0):
+	if policy is None:
+		policy = GenerationPolicy()
+	
+	spinflipper,configs = prepareFlipping(analysis,policy,verbose,True)
+	
+	# the first combination is selected before the information on the spin flipper is printed, which has to wait for
+	# the MO files, so that the selection overlaps with reading them
+	selection = configs.select(policy.budget_,policy.strategy_,policy.seed_,policy.shard_)
+	combination = next(selection,None)
+	if verbose >= 0:
+		spinflipper.printInfo()
+		printSelection(configs,policy)
+	
+	# loop through all selected combinations
+	while combination:
+		# produce new job(s) with the current centers spin flipped
+		flip_centers,beta_occ_idxs = combination
+		lowspinjobs = spinflipper.flip(list(flip_centers),beta_occ_idxs)
+		yield [LowSpinJob(ls,analysis.job_,list(flip_centers),spinflipper.beta_occupations_[nr],spinflipper.patterns_[ls.path_])
+		       for ls,nr in zip(lowspinjobs,beta_occ_idxs)]
+		combination = next(selection,None)
+
+def generate(analysis,policy=None,verbose=0):
+	# produces the low spin jobs of the analyzed high spin job one by one (see generateBatches)
+	for batch in generateBatches(analysis,policy,verbose):
+		for lsjob in batch:
+			yield lsjob
+
+# describes all low spin jobs generate would create (see spinflipper.plan) without creating them; returns (as
+# generator) one dict per job, which also holds the rank of its configuration (see configsource.rank)
+def plan(analysis,policy=None,verbose=0):
+	if policy is None:
+		policy = GenerationPolicy()
+	
+	spinflipper,configs = prepareFlipping(analysis,policy,verbose)
+	if verbose >= 0:
+		printSelection(configs,policy)
+	
+	for flip_centers,beta_occ_idxs in configs.select(policy.budget_,policy.strategy_,policy.seed_,policy.shard_):
+		first_rank = configs.rank(flip_centers,0)
+		for nr,entry in zip(beta_occ_idxs,spinflipper.plan(list(flip_centers),beta_occ_idxs)):
+			entry['rank'] = first_rank + nr
+			yield entry
+
+def writePlan(path,analysis,policy=None,verbose=0):
+	# writes the plan (see plan) as JSON file, one job per line; returns the number of planned jobs
+	num_jobs = [0]
+	def lines():
+		yield '{\n'
+		yield '  "reference": {},\n'.format(json.dumps(analysis.job_.path_))
+		yield '  "metal_centers": {},\n'.format(json.dumps(analysis.metal_centers_))
+		yield '  "jobs": [\n'
+		for entry in plan(analysis,policy,verbose):
+			yield ('    ' if num_jobs[0] == 0 else ',\n    ') + json.dumps(entry)
+			num_jobs[0] += 1
+		yield '\n  ],\n'
+		yield '  "num_jobs": {:d}\n'.format(num_jobs[0])
+		yield '}\n'
+	
+	tools.writeAtomic(path,lines())
+	return num_jobs[0]
+
+# submits the low spin jobs in waves until the lowest num_lowest states are pinned down (see wavedriver); the Ising model
+# couples bridged centers only; returns the wave driver and the submitted jobs (pairs of LowSpinJob and job ID)
+def runWaves(analysis,policy,queuesys,num_lowest=1,wave_size=None,interval=60.0,verbose=0):
+	spinflipper,configs = prepareFlipping(analysis,policy,verbose,True)
+	
+	# the selection and the model overlap with reading the MO files (see generateBatches)
+	selection = list(configs.select(policy.budget_,policy.strategy_,policy.seed_,policy.shard_))
+	pairs = cn.connectivity(analysis.job_,policy.bond_tol_,verbose).pairs(analysis.metal_centers_)
+	driver = wd.wavedriver(spinflipper,configs,queuesys,pairs,num_lowest,wave_size,seed=policy.seed_,verbose=verbose)
+	if verbose >= 0:
+		spinflipper.printInfo()
+		printSelection(configs,policy)
+	
+	released = driver.run(selection,interval)
+	
+	submitted = [(LowSpinJob(entry['job'],analysis.job_,list(entry['flip']),spinflipper.beta_occupations_[entry['nr']],
+	                         spinflipper.patterns_[entry['job'].path_]),entry['id']) for entry in released]
+	return (driver,submitted)
+
+def printWaves(driver,submitted):
+	# the lowest states found by the wave driver and the number of jobs it saved
+	jobs = {ls.job_.path_:ls for ls,job_id in submitted}
+	lowest = driver.lowest()
+	
+	print()
+	print(" {:d} wave(s) with {:d} job(s), {:d} configuration(s) withdrawn".format(len(driver.waves_),len(driver.released_),driver.withdrawn()))
+	print()
+	print("  job                           MS        energy           E - E0")
+	print(" ----------------------------------------------------------------")
+	for entry in lowest:
+		print("  {:<26} {:5.1f}   {:15.6f}   {:12.6f}".format(os.path.basename(entry['job'].path_),jobs[entry['job'].path_].MS_,
+		      entry['energy'],entry['energy'] - lowest[0]['energy']))
+	print(" ----------------------------------------------------------------")
+	print(flush=True)
+
+def exportResults(directory,fmt,analysis,lowspinjobs=None,by_hash=False,verbose=0):
+	# writes the tables of the analysis and (if given) of the low spin jobs, i.e. LowSpinJobs or plan entries (see exporter)
+	exp = ex.exporter(analysis.job_,directory,fmt,by_hash,verbose)
+	exp.exportAnalysis(analysis)
+	if lowspinjobs is not None:
+		exp.exportConfigurations(lowspinjobs,analysis.metal_centers_)
+	return exp
+
+# watches the submitted jobs (list of pairs of LowSpinJob and job ID) until they are finished; stalled SCFs are relaunched
+# (if monitor_interval is given) and redundant jobs are cancelled (if dedup_interval is given);
+# returns the scfmonitor and the deduplicator (each None, if not used)
+def supervise(submitted,queuesys,monitor_interval=None,dedup_interval=None,verbose=0):
+	monitor = None
+	dedup = None
+	if monitor_interval and submitted:
+		monitor = sm.scfmonitor(queuesys,verbose=verbose)
+		for ls,job_id in submitted:
+			monitor.watch(ls.job_,job_id)
+	
+	# watch the outcome of the jobs and get rid of the redundant ones
+	if dedup_interval and submitted:
+		dedup = dd.deduplicator(queuesys,verbose=verbose)
+		for ls,job_id in submitted:
+			dedup.watch(ls.job_,job_id,dd.signature(ls.pattern_),ls.refjob_.path_)
+	
+	if monitor and dedup:
+		print(" Monitoring {:d} SCF(s) and watching for duplicates ...".format(len(submitted)),flush=True)
+		while True:
+			running = monitor.poll()
+			for ls,job_id in monitor.resubmitted_:
+				dedup.watch(ls,job_id,None)
+			monitor.resubmitted_ = []
+			waiting = dedup.poll()
+			for path in dedup.redundant_:
+				monitor.unwatch(path,'redundant')
+			if waiting == 0 and running == 0:
+				break
+			time.sleep(min(monitor_interval,dedup_interval))
+	elif monitor:
+		monitor.run(monitor_interval)
+	elif dedup:
+		dedup.run(dedup_interval)
+	
+	return (monitor,dedup)
+
+# optimizes the lowest states of each reference job and calculates their frequencies in place, once all submitted jobs
+# (pairs of LowSpinJob and job ID) have finished (see followup); returns the follow-up runs as pairs of LowSpinJob and job ID
+def followUp(submitted,queuesys,num_best=1,window=None,interval=60.0,verbose=0):
+	follower = fu.followup(queuesys,num_best,window,verbose=verbose)
+	lowspinjobs = {}
+	for ls,job_id in submitted:
+		follower.watch(ls.job_,job_id,ls.refjob_.path_)
+		lowspinjobs[ls.job_.path_] = ls
+	
+	return [(lowspinjobs[job.path_],job_id) for job,job_id in follower.run(interval)]
+
+def findReferenceJobs(spec):
+	# returns the absolute paths of the reference jobs of a campaign; spec is either a file listing the job
+	# directories (one per line, relative to the file, '#' starts a comment) or a glob pattern of job directories
+	if os.path.isfile(spec):
+		with open(spec,'r') as fh:
+			paths = [line.split('#')[0].strip() for line in fh]
+		return [os.path.join(os.path.dirname(os.path.abspath(spec)),path) for path in paths if path]
+	
+	return [os.path.abspath(path) for path in sorted(glob.glob(spec)) if os.path.isfile(os.path.join(path,'control'))]
+
+# result of one reference job of a campaign (see runCampaign)
+class CampaignEntry:
+	def __init__(self,job_path):
+		self.path_ = job_path
+		self.analysis_ = None			# AnalysisResult
+		self.jobs_ = []				# created LowSpinJobs
+		self.submitted_ = []			# pairs of LowSpinJob and job ID
+		self.error_ = None			# the error that stopped the processing of this reference job
+		self.time_ = 0.0			# wall time in seconds
+
+# analyzes many reference jobs on a pool of worker threads and (if policy is given) produces their low spin jobs,
+# which are submitted to queuesys (if given); returns a list of CampaignEntry in the order of job_paths; any error
+# stops the processing of its reference job only and is reported in the summary, since the low spin jobs of the
+# other reference jobs may already be submitted
+def runCampaign(job_paths,policy=None,queuesys=None,workers=4,alpha_tol=0.1,beta_tol=0.4,ox_tol=0.1,merged=False,bond_tol=None,verbose=-1,assignment='mulliken'):
+	from concurrent.futures import ThreadPoolExecutor, as_completed
+	
+	def process(entry):
+		start = time.time()
+		try:
+			entry.analysis_ = analyze(entry.path_,alpha_tol,beta_tol,ox_tol,merged,bond_tol,verbose,policy is not None,assignment)
+			if policy:
+				for batch in generateBatches(entry.analysis_,policy,verbose):
+					entry.jobs_ += batch
+					if queuesys:
+						entry.submitted_ += [(ls,queuesys.schedule(ls.job_.path_)) for ls in batch]
+		except Exception as err:
+			entry.error_ = err
+		entry.time_ = time.time() - start
+		
+		print("  {} {} ({:d} job(s), {:.1f} s)".format('failed:  ' if entry.error_ else 'finished:',entry.path_,len(entry.jobs_),entry.time_),flush=True)
+		return entry
+	
+	entries = [CampaignEntry(path) for path in job_paths]
+	with ThreadPoolExecutor(max_workers=workers) as pool:
+		for future in as_completed([pool.submit(process,entry) for entry in entries]):
+			future.result()
+	
+	return entries
+
+def printCampaignSummary(entries):
+	# one line per reference job
+	base = os.path.commonpath([entry.path_ for entry in entries]) if len(entries) > 1 else ''
+	width = max([len(os.path.relpath(entry.path_,base) if base else entry.path_) for entry in entries] + [9])
+	
+	print(" Campaign Summary")
+	print("------------------")
+	print()
+	print("  {:<{w}}   #metals   ox. states                #jobs   #submitted   result".format('reference',w=width))
+	print(" " + "-" * (width + 80))
+	for entry in entries:
+		name = os.path.relpath(entry.path_,base) if base else entry.path_
+		if entry.analysis_:
+			ox = {}
+			for state in entry.analysis_.ox_states_.values():
+				ox[state] = ox.get(state,0) + 1
+			ox = " ".join("{:d}x{}".format(n,state) for state,n in sorted(ox.items()))
+			num_metals = len(entry.analysis_.metal_centers_)
+		else:
+			ox = "---"
+			num_metals = 0
+		
+		result = "{}: {}".format(type(entry.error_).__name__,str(entry.error_).split('\n')[0]) if entry.error_ else "ok"
+		print("  {:<{w}}   {:7d}   {:<24}  {:5d}   {:10d}   {}".format(name,num_metals,ox,len(entry.jobs_),len(entry.submitted_),result,w=width))
+	print(" " + "-" * (width + 80))
+	print("  {:d} of {:d} reference job(s) processed successfully".format(len([e for e in entries if not e.error_]),len(entries)))
+	print(flush=True)
+
 #############################################
 # Spin flipping algorithm                   #
 #############################################
 
-if __name__ == "__main__":
+def main():
 	parser = argparse.ArgumentParser(description='Semi-automatic spin flipping algorithm for TURBOMOLE')
 	parser.add_argument('hsjob',metavar='JOB',nargs='?',default='.',help='relative path to the high spin job (default: cwd)')
 	parser.add_argument('--pbs-script','-p',nargs=1,metavar='SCRIPT',help='relative path to a PBS job script')
@@ -49,18 +613,61 @@ if __name__ == "__main__":
 	parser.add_argument('--beta-tolerance','-b',nargs=1,metavar='TOL',type=float,default=[0.4],help='Accepted occupation deviation from 1.0 for beta LMOs when searching excess electrons (default: 0.4)')
 	parser.add_argument('--alpha-tolerance','-t',nargs=1,metavar='TOL',type=float,default=[0.1],help='Accepted occupation deviation from 1.0 for alpha LMOs when searching flipable electrons (default: 0.1)')
 	parser.add_argument('--ox-tolerance','-o',nargs=1,metavar='TOL',type=float,default=[0.1],help='Accepted deviation from proper integer occupation number for determination of the oxidation state (default: 0.1)')
+	parser.add_argument('--sweep',nargs=3,metavar=('ALPHA','BETA','OX'),type=tolRange,help='perform only the analysis and evaluate it for all combinations of the given alpha, beta and ox. tolerances (each as START:STOP:STEP or comma-separated list), e.g. --sweep 0.05:0.2:0.05 0.4 0.1,0.2')
+	parser.add_argument('--heisenberg',nargs=1,metavar='JFILE',help='perform only the analysis and compute the spin ladder of the Heisenberg model H = -2 sum J_ij S_i.S_j of the metal centers with the exchange constants given in JFILE (lines like "1fe 2fe -25.3")')
+	parser.add_argument('--warm-start','-w',action='store_true',help='build the start orbitals of new low spin jobs from the closest already converged configuration')
+	parser.add_argument('--monitor',nargs='?',metavar='SEC',type=float,const=60.0,default=None,help='keep watching the SCFs of the submitted jobs and resubmit stalled ones with stronger damping (poll interval in seconds, default: 60)')
+	parser.add_argument('--dedup',nargs='?',metavar='SEC',type=float,const=60.0,default=None,help='request a population analysis in each low spin job and cancel queued jobs whose spin state has already been reached by another job (poll interval in seconds, default: 60)')
+	parser.add_argument('--domains',nargs='?',metavar='TOL',type=float,const=1.2,default=None,help='redistribute excess electrons only within groups of bridged metal centers of the same element instead of among all centers of the element (bonds are detected up to TOL times the sum of the covalent radii, default: 1.2)')
+	parser.add_argument('--budget',nargs=1,metavar='N',type=int,default=None,help='create at most N low spin jobs, selected according to --strategy')
+	parser.add_argument('--strategy',nargs=1,choices=cs.configsource.strategies_,default=['random'],help='selection of the low spin configurations within the budget: a random sample, those of lowest energy in a simple Ising model or a random sample stratified by MS (default: random)')
+	parser.add_argument('--seed',nargs=1,metavar='SEED',type=int,default=[None],help='seed for the random selection of low spin configurations')
+	parser.add_argument('--shard',nargs=1,metavar='i/N',type=shard,default=[None],help='create only the i-th of N disjoint slices of the (selected) low spin configurations, e.g. to share the work among N independent runs (random selections need the same --seed in all runs)')
+	parser.add_argument('--waves',nargs='?',metavar='K',type=int,const=1,default=None,help='submit the low spin jobs in waves and stop once the lowest K states (default: 1) are pinned down by an Ising model fitted to the energies of the finished jobs; configurations which can not be among them are withdrawn')
+	parser.add_argument('--wave-size',nargs=1,metavar='N',type=int,default=[None],help='number of jobs per wave (default: number of parameters of the Ising model plus 3)')
+	parser.add_argument('--wave-interval',nargs=1,metavar='SEC',type=float,default=[60.0],help='poll interval in seconds while waiting for a wave (default: 60)')
+	parser.add_argument('--followup',nargs='?',metavar='K',type=int,const=1,default=None,help='once the low spin jobs have finished, optimize the K lowest states (default: 1) of each reference job with jobex and calculate their frequencies with aoforce, in place and through the queuing system')
+	parser.add_argument('--followup-window',nargs=1,metavar='DE',type=float,default=[None],help='follow up all states up to DE Hartree above the lowest one instead of the K lowest states (implies --followup)')
+	parser.add_argument('--followup-interval',nargs=1,metavar='SEC',type=float,default=[60.0],help='poll interval in seconds while waiting for the jobs to be followed up (default: 60)')
+	parser.add_argument('--plan',nargs=1,metavar='FILE',help='write all low spin jobs that would be created (flipped centers, excess electron distribution, occupation numbers, multiplicity and directory) as JSON to FILE instead of creating them')
+	parser.add_argument('--export',nargs=1,metavar='DIR',help='export the tables of the analysis (metal centers, LMOs) and of the low spin jobs (including their energies, if finished) to DIR (one subdir per reference job in a campaign)')
+	parser.add_argument('--export-format',nargs=1,choices=ex.exporter.formats_,default=['auto'],help='file format of the exported tables: parquet (needs pyarrow, CSV otherwise), npz, csv or auto, i.e. parquet if pyarrow is available and npz otherwise (default: auto)')
+	parser.add_argument('--campaign',nargs=1,metavar='JOBS',help='process many reference jobs given by a glob pattern of job directories or a file listing them (one per line); all low spin jobs are submitted without asking')
+	parser.add_argument('--workers',nargs=1,metavar='N',type=int,default=[4],help='number of reference jobs processed at the same time in a campaign (default: 4)')
+	parser.add_argument('--lmo-assignment',nargs=1,choices=lc.localizer.assignments_,default=['mulliken'],help='take the contributions of the atoms to the LMOs from the Mulliken analysis in the output of the localization or compute them from the LMO coefficients and the basis sets (C1 symmetry only) (default: mulliken)')
+	parser.add_argument('--merged-analysis','-m',action='store_true',help='do the population analysis and the localization in one property run (in the subdir "analysis")')
+	parser.add_argument('--resources',action='store_true',help='choose the threads (SMP), the memory ($ricore/$maxcor) and the matching PBS resources of each job from the size of its system')
+	parser.add_argument('--resource-profiles',nargs=1,metavar='FILE',help='take the resource profiles from the JSON file FILE instead of the built-in ones, a list like [{"name":"small","threads":2,"memory":2000,"max_atoms":30,"max_nsaos":400}, ...] with the memory in MB (implies --resources)')
+	parser.add_argument('--metrics',nargs=1,metavar='FILE',help='keep writing throughput metrics (low spin jobs created, bytes of orbitals written, subprocesses, queue depth, stage latencies) to FILE, as JSON status for *.json and in the Prometheus text format otherwise (e.g. for the textfile collector of the node exporter)')
+	parser.add_argument('--metrics-interval',nargs=1,metavar='SEC',type=float,default=[15.0],help='interval in seconds between updates of the metrics file (default: 15)')
 	parser.add_argument('--verbose','-v',nargs=1,metavar='LEVEL',type=int,default=[0],help='change verbose level (0 means off)')
+	parser.add_argument('--stand-in',action='store_true',help='use the bundled stand-in TURBOMOLE and PBS executables instead of the real ones (also enabled by LOWSPIN_STANDIN=1)')
 	
 	args = parser.parse_args()
+	if args.plan and args.campaign:
+		parser.error('--plan can not be combined with --campaign')
+	if args.waves and (args.plan or args.campaign or args.monitor or args.dedup):
+		parser.error('--waves can not be combined with --plan, --campaign, --monitor or --dedup')
+	if args.followup_window[0] is not None and not args.followup:
+		args.followup = 1
+	if args.followup and args.plan:
+		parser.error('--followup can not be combined with --plan')
+	if args.resource_profiles:
+		args.resources = True
+	if args.sweep or args.heisenberg:
+		args.analysis = True
+	
+	if args.stand_in or os.environ.get('LOWSPIN_STANDIN') == '1':
+		tools.useStandIn()
 	
 	hs_job_path = os.getcwd()
 	if not args.hsjob is None:
 		if os.path.isdir(os.path.abspath(args.hsjob)):
 			hs_job_path = os.path.abspath(args.hsjob)
 	
-	if not args.analysis:
+	if not args.analysis and not args.plan:
 		try:	
-			pbs_script_path = os.path.abspath(args.pbs_script[0]) if args.pbs_script else glob.glob("*.job")[0]
+			pbs_script_path = os.path.abspath(args.pbs_script[0]) if args.pbs_script else os.path.abspath(glob.glob("*.job")[0])
 		except IndexError:
 			print("Please provide a PBS job script either via the -p option or as .job file in the cwd.")
 			exit()
@@ -73,114 +680,119 @@ if __name__ == "__main__":
 	print('\t|    lowSpin v1.3.0    |')
 	print('\t+----------------------+')
 	print(flush=True)
-		
-	try:
-		# set up environment
-		highspinjob = jm.tmjob(os.path.join(hs_job_path,'control'))
-		
-		# analyze input job
-		element_abundance = highspinjob.getElementAbundances()	
 	
-		# possible candidates for spin flipping ... this list can be expanded on demand
-		candidates = ['cr','mn','fe','co','ni','cu']
-		
-		# create a list of all present metal atoms (those that can be flipped) in the reference job
-		metal_centers = []
-		for metal in candidates:
-			metal_centers += highspinjob.getAtomIndexList(metal)	# appends an empty list, if the resp. metal is not in the molecule
-										# metal_centers is now a list like ['9cr','2fe','3fe','5co']
-		
-		# get number of metal centers
-		num_centers = len(metal_centers)
-		if num_centers < 2 and not args.analysis:
-			print("there is only one metal atom in the system; this program can't help you here.")
+	# metrics are written in the background during the whole run
+	metricswriter = None
+	if args.metrics:
+		try:
+			metricswriter = mt.metricswriter(args.metrics[0],interval=args.metrics_interval[0]).start()
+		except (mt.MetricsError,OSError) as mterr:
+			print("Error while setting up the metrics file:")
+			print(mterr)
 			exit()
+	
+	try:
+		# set up queuing system and create new subdirs beginning with the 'flip_' and use the exhaustive algorithm on user request
+		submitter = None
+		policy = None
+		planner = None
+		if args.resources:
+			planner = rs.resourceplanner(rs.readProfiles(args.resource_profiles[0]) if args.resource_profiles else None,vrbs_level)
+		if not args.analysis:
+			if not args.plan:
+				submitter = qs.QueueSys(pbs_script_path,planner)
+			policy = GenerationPolicy(args.scaredy_cat,args.ox_tolerance[0],args.warm_start,args.dedup is not None,args.budget[0] if args.budget else None,
+			                          args.strategy[0],args.seed[0],args.shard[0],args.domains if args.domains else 1.2)
 		
-		# fetch general electronic information and spin density population analysis
-		popanalyzer = pa.popanalyzer(highspinjob,vrbs_level)
-		popanalyzer.mulliken('pop')
-		
-		# localize MOs (if not already done)
-		localizer = lc.localizer(highspinjob,vrbs_level)
-		localizer.boys('loc')
-		
-		# collect all necessary data from the (localized) high spin system
-		hs_lmos = sf.LMOset(localizer.locjob_)		# container for lmo infos needed for spin flipping
-		print(" Evaluating Localized MOs ...\n  ",end="",flush=True)
-		for center in metal_centers:
-			# dict like {'1fe':[1,2,4,5],'2fe':[3,7,8,9,10],'4co':[23,24,26,30]}
-			hs_lmos.metal_alpha_idxs_[center] = localizer.getLMOIndices(center,spin='alpha',tol=args.alpha_tolerance[0]).keys()
-			print("#",flush=True,end="")
-		print("\n",flush=True)
-		# for spin flipping only the number of already existing beta electrons in the valence states of the metals
-		# that will be flipped are of interest, not their actual LMOs since they are assumed to be delocalized anyways
-		hs_lmos.num_beta_electrons_,hs_lmos.partition_beta_electrons_ = localizer.findBetaElectrons(metal_centers,tol=args.beta_tolerance[0])
-		# for reordering the LMOs it is necessary to know the remainder of orbitals that are not located at one of the
-		# metal sites but belong to the valence region
-		num_alpha_VE = highspinjob.getNumE('alpha') - (highspinjob.getNumE() - highspinjob.getNumVE()) // 2
-		metals_idxs = [idx for i in hs_lmos.metal_alpha_idxs_.values() for idx in i]
-		hs_lmos.other_alpha_idxs_ = [idx for idx in range(1,num_alpha_VE+1) if not idx in metals_idxs]
-		
-		# give a summary of the high spin reference state
-		popanalyzer.printSpinDensity()
-		
-		print(flush=True)
-		print()
-		print(" Analysis of Localized MOs")
-		print("---------------------------")
-		print()
-		print("  center   #alpha   #beta   ox. state")
-		print(" -------------------------------------")
-		for center in hs_lmos.metal_alpha_idxs_:
-			a = len(hs_lmos.metal_alpha_idxs_[center])
-			b = hs_lmos.partition_beta_electrons_[center]
-			e = re.findall("[a-z]+", center)[0]
-			try:
-				d = PSE.VE[e] - a - b
-			except IndexError:
-				print("  The element {} is not listed in the program's periodic table so far... :(".format(e))
-				ox = "---"
-			else:
-				try:
-					if abs(d - round(d)) < args.ox_tolerance[0]:
-						ox = ox_state[int(round(d))]
-					else:
-						ox = ox_state[math.floor(d)] + "/" + ox_state[math.ceil(d)]
-				except IndexError:
-					print("  Oxidation state {:f} of element {} seems strange.".format(d,e))
-					ox = "---"
+		submitted = []
+		entries = []
+		analysis = None
+		if args.campaign:
+			# process all reference jobs on a pool of workers and submit all low spin jobs without asking
+			job_paths = findReferenceJobs(args.campaign[0])
+			if len(job_paths) == 0:
+				print("no reference jobs found in " + str(args.campaign[0]))
+				exit()
 			
-			print("  {:^6}     {:3d}     {:4.2f}   {:^9}".format(center,a,b,ox))
-		print(" -------------------------------------")
-		print(flush=True)
-		
-		if not args.analysis:
-			# set up queuing system
-			submitter = qs.QueueSys(pbs_script_path)
+			print(" Processing {:d} reference job(s) with {:d} worker(s) ...".format(len(job_paths),args.workers[0]),flush=True)
+			entries = runCampaign(job_paths,policy,submitter,args.workers[0],args.alpha_tolerance[0],args.beta_tolerance[0],args.ox_tolerance[0],
+			                      args.merged_analysis,args.domains,vrbs_level if vrbs_level > 0 else -1,args.lmo_assignment[0])
+			print()
+			printCampaignSummary(entries)
+			submitted = [sub for entry in entries for sub in entry.submitted_]
+		else:
+			# check the input job before running any analysis
+			if len(findMetalCenters(jm.tmjob(os.path.join(hs_job_path,'control')))) < 2 and not args.analysis:
+				print("there is only one metal atom in the system; this program can't help you here.")
+				exit()
 			
-			# set up the spin flipper (tell it to create new subdirs beginning with the 'flip_' and use the exhaustive algorithm on user request)
-			spinflipper = sf.spinflipper(highspinjob,hs_lmos,'flip_',args.scaredy_cat,args.ox_tolerance[0],vrbs_level)
+			# the property runs of the analysis are run by this process with the threads of the profile of the input job
+			if planner:
+				os.environ.update(planner.environment(planner.choose(jm.tmjob(os.path.join(hs_job_path,'control')))))
 			
-			# loop through all combinations
-			combinations = combinations(list(range(num_centers)),int(num_centers//2))
-			for comb in combinations:
-				# associate the metal centers to the numbers in the current combination
-				flip_centers = [metal_centers[item] for item in comb]
-				
-				# produce new job(s) with the current centers spin flipped
-				lowspinjobs = spinflipper.flip(flip_centers)
-				
-				# ask user whether really to start the job
-				q_start = input("  -> Submit this batch of {:d} job(s)? (default: yes)> ".format(len(lowspinjobs))).lower() in ['n','no','0']
-				if q_start:
-					q_keep = input("  -->  Keep job files? (default: no)> ").lower() in ['y','yes','1']
-				
-				for ls in lowspinjobs:
+			# analyze input job
+			analysis = analyze(hs_job_path,args.alpha_tolerance[0],args.beta_tolerance[0],args.ox_tolerance[0],args.merged_analysis,args.domains,vrbs_level,
+			                   not args.analysis and not args.plan,args.lmo_assignment[0])
+			printAnalysis(analysis)
+			
+			if args.sweep:
+				printSweep(sweep(analysis,args.sweep[0],args.sweep[1],args.sweep[2],args.scaredy_cat))
+			
+			if args.heisenberg:
+				spins = localSpins(analysis)
+				J = hb.readCouplings(args.heisenberg[0],analysis.metal_centers_)
+				printHeisenberg(hb.heisenberg(analysis.metal_centers_,[spins[center] for center in analysis.metal_centers_],J,vrbs_level))
+			
+			if args.plan and not args.analysis:
+				num_jobs = writePlan(args.plan[0],analysis,policy,vrbs_level)
+				print(" {:d} low spin job(s) planned in {}".format(num_jobs,args.plan[0]),flush=True)
+			elif args.waves and not args.analysis:
+				driver,submitted = runWaves(analysis,policy,submitter,args.waves,args.wave_size[0],args.wave_interval[0],vrbs_level)
+				printWaves(driver,submitted)
+			elif not args.analysis:
+				for lowspinjobs in generateBatches(analysis,policy,vrbs_level):
+					# ask user whether really to start the job
+					q_start = input("  -> Submit this batch of {:d} job(s)? (default: yes)> ".format(len(lowspinjobs))).lower() in ['n','no','0']
 					if q_start:
-						if not q_keep:
-							ls.remove()
-					else:
-						submitter.schedule(ls.path_)
+						q_keep = input("  -->  Keep job files? (default: no)> ").lower() in ['y','yes','1']
+					
+					for ls in lowspinjobs:
+						if q_start:
+							if not q_keep:
+								ls.job_.remove()
+						else:
+							submitted.append((ls,submitter.schedule(ls.job_.path_)))
+		
+		# watch the SCFs until all jobs are finished
+		if submitted:
+			monitor,dedup = supervise(submitted,submitter,args.monitor,args.dedup,vrbs_level)
+			
+			if monitor:
+				finished = monitor.finished_
+				print()
+				print(" {:d} of {:d} SCF(s) finished without being given up".format(len([f for f in finished if f[2] == 'done']),len([f for f in finished if f[2] != 'redundant'])))
+			if dedup:
+				print()
+				print(" {:d} of {:d} job(s) turned out to be redundant".format(len(dedup.redundant_),len(submitted)))
+			
+			# optimize the lowest states and calculate their frequencies
+			if args.followup:
+				print()
+				followups = followUp(submitted,submitter,args.followup,args.followup_window[0],args.followup_interval[0],vrbs_level)
+				print(" {:d} follow-up run(s) submitted".format(len(followups)),flush=True)
+		
+		# export the tables of the analyses and the low spin jobs (including the energies of the finished ones)
+		if args.export:
+			if args.campaign:
+				for entry in entries:
+					if entry.analysis_:
+						exportResults(args.export[0],args.export_format[0],entry.analysis_,entry.jobs_ if policy else None,True,vrbs_level)
+			elif args.plan and not args.analysis:
+				exportResults(args.export[0],args.export_format[0],analysis,plan(analysis,policy,-1),False,vrbs_level)
+			else:
+				exportResults(args.export[0],args.export_format[0],analysis,[ls for ls,job_id in submitted] if policy else None,False,vrbs_level)
+			print()
+			print(" Tables exported to " + args.export[0],flush=True)
 	
 	except jm.TMJobHandlerError as tmerr:
 		print("Error while evaluating TM job data:")
@@ -207,11 +819,66 @@ if __name__ == "__main__":
 		print(sferr)
 		#traceback.print_exc()
 		exit()
+	except sm.SCFMonitorError as smerr:
+		print("Error while monitoring SCF runs:")
+		print(smerr)
+		#traceback.print_exc()
+		exit()
+	except cn.ConnectivityError as cnerr:
+		print("Error while determining the connectivity of the metal centers:")
+		print(cnerr)
+		#traceback.print_exc()
+		exit()
+	except cs.ConfigSourceError as cserr:
+		print("Error while selecting low spin configurations:")
+		print(cserr)
+		#traceback.print_exc()
+		exit()
+	except dd.DeduplicatorError as dderr:
+		print("Error while searching for redundant jobs:")
+		print(dderr)
+		#traceback.print_exc()
+		exit()
+	except wd.WaveDriverError as wderr:
+		print("Error while submitting low spin jobs in waves:")
+		print(wderr)
+		#traceback.print_exc()
+		exit()
+	except fu.FollowupError as fuerr:
+		print("Error while following up the lowest states:")
+		print(fuerr)
+		#traceback.print_exc()
+		exit()
+	except rs.ResourcesError as rserr:
+		print("Error while choosing the resources of the jobs:")
+		print(rserr)
+		#traceback.print_exc()
+		exit()
+	except ex.ExporterError as exerr:
+		print("Error while exporting tables:")
+		print(exerr)
+		#traceback.print_exc()
+		exit()
+	except hb.HeisenbergError as hberr:
+		print("Error while solving the Heisenberg model:")
+		print(hberr)
+		#traceback.print_exc()
+		exit()
+	except LowSpinError as lserr:
+		print(lserr)
+		exit()
 	except:
 		print("Unexpected error:")
 		raise
 		exit()
+	finally:
+		# final state of the metrics
+		if metricswriter:
+			metricswriter.stop()
 	
 	print()
 	print("Done!")
 
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,187 @@
+#! /usr/bin/python3
+
+##################################
+# metrics class definition       #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from tools import writeAtomic
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class MetricsError(Exception):
+	pass
+
+
+# all metrics with their kind and description; in the Prometheus format, the names get the prefix 'lowspin_' and
+# counters the suffix '_total'
+METRICS = {'configurations_generated':('counter','low spin jobs created by the spin flipper'),
+           'orbital_bytes_written':('counter','bytes of MO files written for new low spin jobs'),
+           'subprocesses_spawned':('counter','external programs run (TURBOMOLE, cpc, queuing system)'),
+           'queue_jobs':('gauge','own jobs in the queue per status at the last status request'),
+           'stage_duration_seconds':('histogram','wall time of the stages (analysis, localization, population, flip, submit, qstat)')}
+
+# upper bounds of the histogram buckets in seconds
+BUCKETS = [0.01,0.05,0.1,0.5,1.0,5.0,10.0,60.0,300.0,1800.0]
+
+
+# thread-safe collection of counters, gauges and histograms, each of them per set of labels,
+# e.g. inc('subprocesses_spawned',command='cpc')
+class registry:
+	def __init__(self):
+		self.lock_ = threading.Lock()
+		self.start_ = time.time()
+		self.values_ = {}		# (name, sorted label pairs) -> value, for histograms [counts per bucket, +Inf, sum]
+	
+	def __key(self,name,kind,labels):
+		if METRICS.get(name,(None,))[0] != kind:
+			raise MetricsError('there is no {} "{}"!'.format(kind,name))
+		return (name,tuple(sorted(labels.items())))
+	
+	def inc(self,name,value=1,**labels):
+		key = self.__key(name,'counter',labels)
+		with self.lock_:
+			self.values_[key] = self.values_.get(key,0) + value
+	
+	def setGauge(self,name,value,**labels):
+		key = self.__key(name,'gauge',labels)
+		with self.lock_:
+			self.values_[key] = value
+	
+	def observe(self,name,value,**labels):
+		key = self.__key(name,'histogram',labels)
+		with self.lock_:
+			hist = self.values_.setdefault(key,[0] * (len(BUCKETS) + 1) + [0.0])
+			for i,bound in enumerate(BUCKETS):
+				if value <= bound:
+					hist[i] += 1
+			hist[len(BUCKETS)] += 1
+			hist[-1] += value
+	
+	@contextmanager
+	def timer(self,name,**labels):
+		# observes the wall time of the with block, e.g. with timer('stage_duration_seconds',stage='flip'): ...
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.observe(name,time.perf_counter() - start,**labels)
+	
+	def snapshot(self):
+		with self.lock_:
+			return {key:(list(value) if isinstance(value,list) else value) for key,value in self.values_.items()}
+	
+	def prometheus(self):
+		# text exposition format, e.g. for the textfile collector of the node exporter
+		values = self.snapshot()
+		lines = []
+		for name,(kind,text) in METRICS.items():
+			full = 'lowspin_' + name + ('_total' if kind == 'counter' else '')
+			lines += ['# HELP {} {}'.format(full,text),'# TYPE {} {}'.format(full,kind)]
+			for (metric,labels),value in sorted(values.items(),key=lambda item:item[0]):
+				if metric != name:
+					continue
+				if kind == 'histogram':
+					for bound,count in zip(['{:g}'.format(b) for b in BUCKETS] + ['+Inf'],value):
+						lines.append('{}_bucket{} {:d}'.format(full,labelText(labels + (('le',bound),)),count))
+					lines.append('{}_sum{} {:.6f}'.format(full,labelText(labels),value[-1]))
+					lines.append('{}_count{} {:d}'.format(full,labelText(labels),value[len(BUCKETS)]))
+				else:
+					lines.append('{}{} {}'.format(full,labelText(labels),value))
+		lines += ['# HELP lowspin_start_time_seconds start of this run (unix time)','# TYPE lowspin_start_time_seconds gauge',
+		          'lowspin_start_time_seconds {:.3f}'.format(self.start_)]
+		return '\n'.join(lines) + '\n'
+	
+	def status(self):
+		# the same as dict for a JSON status file; histograms are given by count, sum and the counts per bucket
+		now = time.time()
+		values = self.snapshot()
+		status = {'updated':now, 'uptime_seconds':now - self.start_}
+		for (name,labels),value in sorted(values.items(),key=lambda item:item[0]):
+			if METRICS[name][0] == 'histogram':
+				value = {'count':value[len(BUCKETS)], 'sum':value[-1], 'buckets':dict(zip(['{:g}'.format(b) for b in BUCKETS],value))}
+			entry = status.setdefault(name,{})
+			entry[','.join('{}={}'.format(l,v) for l,v in labels) or 'all'] = value
+		status['configurations_per_second'] = sum(status.get('configurations_generated',{}).values()) / max(now - self.start_,1e-9)
+		return status
+
+def labelText(labels):
+	# e.g. (('command','cpc'),) -> '{command="cpc"}'
+	if not labels:
+		return ''
+	return '{' + ','.join('{}="{}"'.format(l,str(v).replace('\\','\\\\').replace('"','\\"')) for l,v in labels) + '}'
+
+
+# the registry of this process, all modules report to it
+REGISTRY = registry()
+inc = REGISTRY.inc
+setGauge = REGISTRY.setGauge
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+
+
+# writes the metrics of the registry periodically to a file (each time atomically), either in the Prometheus text
+# format (e.g. "lowspin.prom" for the textfile collector of the node exporter) or as JSON status ("*.json")
+class metricswriter:
+	formats_ = ['auto','prometheus','json']
+	
+	def __init__(self,path,fmt='auto',interval=15.0,reg=None):
+		if not fmt in self.formats_:
+			raise MetricsError('unknown metrics format "{}"!'.format(fmt))
+		if interval <= 0.0:
+			raise MetricsError('the metrics have to be written at positive intervals!')
+		
+		self.path_ = os.path.abspath(path)
+		if not os.path.isdir(os.path.dirname(self.path_)):
+			raise MetricsError('the directory of the metrics file "{}" does not exist!'.format(self.path_))
+		
+		if fmt == 'auto':
+			fmt = 'json' if self.path_.endswith('.json') else 'prometheus'
+		self.fmt_ = fmt
+		self.interval_ = interval
+		self.registry_ = reg if reg else REGISTRY
+		self.stop_ = threading.Event()
+		self.thread_ = None
+	
+	def write(self):
+		if self.fmt_ == 'json':
+			writeAtomic(self.path_,json.dumps(self.registry_.status(),indent=1,sort_keys=True) + '\n')
+		else:
+			writeAtomic(self.path_,self.registry_.prometheus())
+	
+	def __loop(self):
+		while not self.stop_.wait(self.interval_):
+			try:
+				self.write()
+			except OSError as err:
+				print(" unable to write metrics to {}: {}".format(self.path_,err),flush=True)
+	
+	def start(self):
+		# the file is written right away and then in the background every interval seconds
+		self.write()
+		self.thread_ = threading.Thread(target=self.__loop,daemon=True)
+		self.thread_.start()
+		return self
+	
+	def stop(self):
+		# stops the background thread and writes the final state
+		if self.thread_:
+			self.stop_.set()
+			self.thread_.join()
+			self.thread_ = None
+		self.write()
@@ -11,7 +11,9 @@
 # load some helpful modules
 import os
 import shutil
+import subprocess as sp
 import tmjob as jm
+import metrics as mt
 from tools import TMavailable
 
 
@@ -64,16 +66,15 @@ class popanalyzer:
 			if os.path.isdir(pop_dir):
 				shutil.rmtree(pop_dir)
 			
-			# copy input to new directory
-			start_dir = os.getcwd()
-			os.chdir(self.refjob_.path_)
+			# copy input to new directory (with a log of its own, see localizer)
+			mt.inc('subprocesses_spawned',command='cpc')
 			if self.vrbs_lvl_ > 1:
 				print(" copying job files ...")
-				os.system('cpc ' + str(pop_dir))
+				sp.call(['cpc',pop_dir],cwd=self.refjob_.path_)
 				print()
 			else:
-				os.system('cpc ' + str(pop_dir) + ' > cpc.err 2>&1')
-			os.chdir(start_dir)
+				with open(os.path.join(self.refjob_.path_,'cpc_' + os.path.basename(os.path.normpath(target_dir)) + '.err'),'w') as log:
+					sp.call(['cpc',pop_dir],cwd=self.refjob_.path_,stdout=log,stderr=sp.STDOUT)
 			
 			# run population analysis
 			if not os.path.isdir(pop_dir):
@@ -83,7 +84,8 @@ class popanalyzer:
 			try:
 				self.popjob_ = jm.tmjob(os.path.join(pop_dir,'control'))
 				self.popjob_.addToControl(['$pop'])
-				self.popjob_.run(prop=True)
+				with mt.timer('stage_duration_seconds',stage='population'):
+					self.popjob_.run(prop=True)
 			except jm.TMJobHandlerError as tmerr:
 				print(tmerr)
 				raise PopAnalyzerError('failed to perform Mulliken population analysis!')
@@ -93,6 +95,23 @@ class popanalyzer:
 		if not self.popout_:
 			raise PopAnalyzerError('unable to read single point output!')
 		
+	def assign(self,popjob):
+		# use a property run that already contains the population analysis, e.g. the merged analysis job of the localizer
+		if self.popjob_:
+			return
+		
+		if not isinstance(popjob,jm.tmjob):
+			raise PopAnalyzerError('given argument is not an instance of tmjob!')
+		
+		if len(popjob.readDataGrp('$pop')) == 0:
+			raise PopAnalyzerError('job in "' + str(popjob) + '" does not contain a population analysis!')
+		
+		self.popout_ = popjob.getOutputFile('energy')
+		if not self.popout_:
+			raise PopAnalyzerError('unable to read single point output!')
+		
+		self.popjob_ = popjob
+	
 	def printSpinDensity(self):
 		if not self.popjob_:
 			self.mulliken('pop')
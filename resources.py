@@ -0,0 +1,167 @@
+#! /usr/bin/python3
+
+##################################
+# resources class definition     #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import os
+import re
+import json
+import tmjob as jm
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class ResourcesError(Exception):
+	pass
+
+
+# PBS resources which are requested by a profile and therefore dropped from the "#PBS -l" lines of the job script
+PBS_RESOURCES = ['nodes','ppn','ncpus','select','mem','vmem','pmem','pvmem']
+
+# settings of the parallel run of TURBOMOLE in the job script, e.g. "export PARNODES=8" or "setenv PARNODES 8"
+PARALLEL_SETTING = re.compile(r'^\s*(export\s+|setenv\s+)?(PARA_ARCH|PARNODES|OMP_NUM_THREADS)\b')
+
+
+# the resources of a job: number of SMP threads and memory in MB; a profile applies to all jobs with at most
+# max_atoms atoms and at most max_nsaos basis functions (None means no limit)
+class profile:
+	def __init__(self,name,threads,memory,max_atoms=None,max_nsaos=None):
+		if threads < 1 or memory < 100:
+			raise ResourcesError('profile "{}" needs at least one thread and 100 MB of memory!'.format(name))
+		
+		self.name_ = name
+		self.threads_ = int(threads)
+		self.memory_ = int(memory)
+		self.max_atoms_ = max_atoms
+		self.max_nsaos_ = max_nsaos
+	
+	def __str__(self):
+		return '{} ({:d} thread(s), {:d} MB)'.format(self.name_,self.threads_,self.memory_)
+	
+	def fits(self,num_atoms,nsaos):
+		if self.max_atoms_ is not None and num_atoms > self.max_atoms_:
+			return False
+		if self.max_nsaos_ is not None and nsaos is not None and nsaos > self.max_nsaos_:
+			return False
+		return True
+
+
+# default profiles from small to large, the last one takes all jobs
+PROFILES = [profile('small',2,2000,max_atoms=30,max_nsaos=400),
+            profile('medium',8,8000,max_atoms=100,max_nsaos=1200),
+            profile('large',16,32000,max_atoms=300,max_nsaos=3500),
+            profile('huge',32,96000)]
+
+
+def readProfiles(path):
+	# profiles from a JSON file holding a list like [{"name":"small","threads":2,"memory":2000,"max_atoms":30}, ...]
+	# in the order they are tried (the last one should have no limits)
+	try:
+		with open(path,'r') as fh:
+			entries = json.load(fh)
+	except (OSError,ValueError) as err:
+		raise ResourcesError('unable to read resource profiles from "{}": {}'.format(path,err))
+	
+	if not isinstance(entries,list) or len(entries) == 0:
+		raise ResourcesError('the file "{}" does not hold a list of resource profiles!'.format(path))
+	
+	profiles = []
+	for i,entry in enumerate(entries):
+		try:
+			profiles.append(profile(entry.get('name','profile{:d}'.format(i+1)),entry['threads'],entry['memory'],
+			                        entry.get('max_atoms'),entry.get('max_nsaos')))
+		except (AttributeError,KeyError,TypeError) as err:
+			raise ResourcesError('invalid resource profile {:d} in "{}": {}'.format(i+1,path,err))
+	
+	return profiles
+
+
+# chooses the resources of each job from the size of its system (number of atoms, number of basis functions) and
+# applies them when the job is submitted: the number of threads of the SMP version of TURBOMOLE (PARA_ARCH, PARNODES,
+# OMP_NUM_THREADS) and the "#PBS -l" lines asking for one node with these cores and the memory are written into the
+# job script, the memory of the integrals ($ricore for RI jobs and $maxcor) into the control file; the rest of the
+# memory is left to the programs themselves
+class resourceplanner:
+	ricore_share_ = 0.5		# share of the memory of a job for the RI integrals ($ricore) ...
+	maxcor_share_ = 0.3		# ... and for the other integrals ($maxcor, 0.7 without RI)
+	
+	def __init__(self,profiles=None,verbose=0):
+		self.profiles_ = list(profiles) if profiles else list(PROFILES)
+		self.vrbs_lvl_ = verbose
+		self.chosen_ = {}		# (#atoms, nsaos, RI) -> profile, all jobs of one reference job have the same size
+	
+	def size(self,job):
+		# number of atoms, number of basis functions (None if there are no MOs yet) and whether RI is used
+		return (sum(job.getElementAbundances().values()),job.getNumBasisFunctions(),job.isRI())
+	
+	def choose(self,job):
+		key = self.size(job)
+		if not key in self.chosen_:
+			fitting = [prof for prof in self.profiles_ if prof.fits(key[0],key[1])]
+			self.chosen_[key] = fitting[0] if fitting else self.profiles_[-1]
+			if self.vrbs_lvl_ > 0:
+				print("  resource profile {} for {:d} atoms and {} basis functions{}".format(self.chosen_[key],key[0],key[1],
+				      ' (RI)' if key[2] else ''),flush=True)
+		
+		return self.chosen_[key]
+	
+	def environment(self,prof):
+		return {'PARA_ARCH':'SMP', 'PARNODES':str(prof.threads_), 'OMP_NUM_THREADS':str(prof.threads_)}
+	
+	def memoryGroups(self,prof,ri):
+		# data groups of the control file, the memory is given in MB
+		if ri:
+			return ['$ricore    {:d}'.format(int(prof.memory_ * self.ricore_share_)),
+			        '$maxcor    {:d} MiB total'.format(int(prof.memory_ * self.maxcor_share_))]
+		
+		return ['$maxcor    {:d} MiB total'.format(int(prof.memory_ * (self.ricore_share_ + self.maxcor_share_)))]
+	
+	def pbsLines(self,prof):
+		return ['#PBS -l nodes=1:ppn={:d}\n'.format(prof.threads_),'#PBS -l mem={:d}mb\n'.format(prof.memory_)]
+	
+	def settingLines(self,prof,csh=False):
+		if csh:
+			return ['setenv {} {}\n'.format(var,value) for var,value in self.environment(prof).items()]
+		return ['export {}={}\n'.format(var,value) for var,value in self.environment(prof).items()]
+	
+	def apply(self,job_path,script_lines):
+		# sets the memory in the control file of the job and returns the lines of its job script with the resources
+		# of its profile; a script adapted before is adapted again without leftovers
+		job = jm.tmjob(os.path.join(job_path,'control'))
+		prof = self.choose(job)
+		
+		job.removeFromControl(['$ricore','$maxcor'])
+		job.addToControl(self.memoryGroups(prof,job.isRI()))
+		job.updateControl()
+		
+		# drop the requests of cores and memory and the parallel settings of the script
+		lines = []
+		for line in script_lines:
+			if line.startswith('#PBS') and len(line.split()) > 2 and line.split()[1] == '-l':
+				kept = [res for res in line.split()[2].split(',') if not re.split(r'[=:]',res)[0] in PBS_RESOURCES]
+				if kept:
+					lines.append('#PBS -l ' + ','.join(kept) + '\n')
+			elif not PARALLEL_SETTING.match(line):
+				lines.append(line)
+		
+		# the new PBS lines follow the shebang, the parallel settings the header of comments and PBS lines
+		shebang = 1 if lines and lines[0].startswith('#!') else 0
+		csh = shebang == 1 and 'csh' in lines[0]
+		lines[shebang:shebang] = self.pbsLines(prof)
+		header = shebang
+		while header < len(lines) and (lines[header].strip() == '' or lines[header].lstrip().startswith('#')):
+			header += 1
+		lines[header:header] = self.settingLines(prof,csh)
+		
+		return lines
@@ -0,0 +1,202 @@
+#! /usr/bin/python3
+
+#################################
+# scfmonitor class definition   #
+#                               #
+# by Fabian                     #
+# 19.10.26                      #
+#################################
+
+
+# load some helpful modules
+import os
+import time
+import tmjob as jm
+import QueueSys as qs
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class SCFMonitorError(Exception):
+	pass
+
+
+# watches the SCF iterations of queued low spin jobs and relaunches stalled ones with stronger damping
+class scfmonitor:
+	# escalation ladder of SCF settings; level 0 corresponds to the settings written by the spinflipper
+	ladder_ = [['$scfdamp   start=5.500  step=0.050  min=0.500','$scforbitalshift  automatic=1.0'],
+	           ['$scfdamp   start=8.500  step=0.100  min=1.000','$scforbitalshift  automatic=1.5'],
+	           ['$scfdamp   start=12.000  step=0.200  min=2.000','$scforbitalshift  automatic=2.0'],
+	           ['$scfdamp   start=20.000  step=0.500  min=4.000','$scforbitalshift  automatic=3.0']]
+	
+	def __init__(self,queuesys,window=30,verbose=0):
+		if not isinstance(queuesys,qs.QueueSys):
+			raise SCFMonitorError('given argument is not an instance of QueueSys!')
+		
+		if window < 4:
+			raise SCFMonitorError('the observation window has to span at least 4 iterations!')
+		
+		self.queue_ = queuesys
+		self.window_ = window
+		self.vrbs_lvl_ = verbose
+		self.jobs_ = {}		# job ID -> state of the watched job (see watch)
+		self.finished_ = []	# jobs that are not watched anymore: (job, last job ID, verdict)
+		self.resubmitted_ = []	# relaunched jobs not yet fetched by others: (job, new job ID)
+	
+	def watch(self,job,job_id,level=0):
+		if not isinstance(job,jm.tmjob):
+			raise SCFMonitorError('given job is not an instance of tmjob!')
+		
+		self.jobs_[job_id] = {'job':job, 'level':level, 'out':os.path.join(job.path_,'ridft.out' if job.isRI() else 'dscf.out'),
+		                      'offset':0, 'rest':'', 'header':False, 'energies':[], 'norms':[]}
+	
+	def unwatch(self,job_path,verdict='dropped'):
+		# stop watching the job in the given directory (e.g. if it has been cancelled by someone else)
+		for job_id in [i for i,state in self.jobs_.items() if state['job'].path_ == job_path]:
+			self.finished_.append((self.jobs_.pop(job_id)['job'],job_id,verdict))
+	
+	def __tail(self,state):
+		# read only what has been appended to the output since the last call
+		try:
+			with open(state['out'],'r') as fh:
+				fh.seek(state['offset'])
+				new = fh.read()
+				state['offset'] = fh.tell()
+		except FileNotFoundError:
+			return ''
+		
+		# keep incomplete lines for the next call
+		new = state['rest'] + new
+		lines = new.split('\n')
+		state['rest'] = lines[-1]
+		
+		# iteration lines look like (the line before is the table head containing "ITERATION")
+		# "   1  -2545.0773856412    -8386.6157     2833.2553    0.000D+00 0.107D-07"
+		# the first iteration has no density change yet (its norm is always 0), so it is left out
+		for line in lines[:-1]:
+			if 'ITERATION' in line and 'ENERGY' in line:
+				state['header'] = True
+				continue
+			
+			if state['header']:
+				state['header'] = False
+				words = line.split()
+				try:
+					if int(words[0]) == 1:
+						continue
+					energy = float(words[1])
+					norm = float(words[4].replace('D','E'))
+				except (IndexError,ValueError):
+					continue
+				state['energies'].append(energy)
+				state['norms'].append(norm)
+		
+		# only the recent history is needed
+		del state['energies'][:-2*self.window_]
+		del state['norms'][:-2*self.window_]
+		
+		return '\n'.join(lines[:-1])
+	
+	def diagnose(self,energies,norms):
+		# returns 'divergence', 'oscillation', 'stagnation' or None for the given SCF history
+		n = self.window_
+		if len(energies) < n:
+			return None
+		
+		e = energies[-n:]
+		d = norms[-n:]
+		de = [e[i+1] - e[i] for i in range(n-1)]
+		
+		# zero norms (e.g. of a restarted SCF) are no reference for the growth of the density change
+		d_min = min([x for x in d if x > 0.0],default=None)
+		d_min_before = min([x for x in norms[-2*n:-n] if x > 0.0],default=None)
+		
+		# the density change grows by an order of magnitude or the energy rises steadily
+		if (d_min and d[-1] > 10.0 * d_min) or (all(x > 0.0 for x in de[-5:]) and e[-1] - e[-6] > 1e-3):
+			return 'divergence'
+		
+		# the energy changes keep flipping their sign without getting smaller
+		flips = sum(1 for i in range(len(de)-1) if de[i] * de[i+1] < 0.0)
+		first = sum(abs(x) for x in de[:len(de)//2]) / (len(de)//2)
+		second = sum(abs(x) for x in de[len(de)//2:]) / (len(de) - len(de)//2)
+		if flips >= 0.8 * (len(de)-1) and second > 1e-5 and second >= 0.5 * first:
+			return 'oscillation'
+		
+		# no progress in the density change compared to the window before
+		if len(norms) >= 2*n and d_min and d_min_before and min(d) > 1e-4 and d_min >= 0.5 * d_min_before:
+			return 'stagnation'
+		
+		return None
+	
+	def __relaunch(self,job_id,reason):
+		state = self.jobs_.pop(job_id)
+		job = state['job']
+		
+		try:
+			self.queue_.cancel(job_id)
+		except qs.QueueSysError:
+			pass		# the job may just have ended
+		
+		level = state['level'] + 1
+		if level >= len(self.ladder_):
+			print("  -> {} of job {} ({}); no stronger SCF settings left, giving up".format(reason,job,job_id),flush=True)
+			self.finished_.append((job,job_id,reason))
+			return
+		
+		# keep the output of the stalled run
+		if os.path.isfile(state['out']):
+			os.replace(state['out'],state['out'] + '.stalled{:d}'.format(level))
+		
+		# the control file may have been changed by the stalled run
+		job.reloadControl()
+		job.removeFromControl(['$scfdamp','$scforbitalshift'])
+		job.addToControl(self.ladder_[level])
+		job.updateControl()
+		
+		new_id = self.queue_.schedule(job.path_)
+		print("  -> {} of job {} ({}); resubmitted with SCF settings of level {:d} as {}".format(reason,job,job_id,level,new_id),flush=True)
+		self.watch(job,new_id,level)
+		self.resubmitted_.append((job,new_id))
+	
+	def poll(self):
+		# one pass over all watched jobs, returns the number of jobs still watched
+		active = self.queue_.get_job_IDs('QRH')
+		
+		for job_id in list(self.jobs_):
+			state = self.jobs_[job_id]
+			new = self.__tail(state)
+			
+			if 'did not converge' in new:
+				self.__relaunch(job_id,'no convergence')
+				continue
+			
+			if 'all done' in new or 'abnormally' in new:
+				self.finished_.append((state['job'],job_id,'done'))
+				del self.jobs_[job_id]
+				continue
+			
+			reason = self.diagnose(state['energies'],state['norms'])
+			if reason:
+				self.__relaunch(job_id,reason)
+				continue
+			
+			# the job left the queue without finishing its output
+			if not job_id in active:
+				if self.vrbs_lvl_ > 0:
+					print("  -> job {} ({}) left the queue".format(state['job'],job_id),flush=True)
+				self.finished_.append((state['job'],job_id,'gone'))
+				del self.jobs_[job_id]
+		
+		return len(self.jobs_)
+	
+	def run(self,interval=60.0):
+		print(" Monitoring {:d} SCF(s) ...".format(len(self.jobs_)),flush=True)
+		while self.poll() > 0:
+			time.sleep(interval)
+		
+		return self.finished_
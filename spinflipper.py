@@ -11,12 +11,15 @@
 # load some helpful modules
 import os
 import shutil
+import subprocess as sp
 import re
+import json
 from itertools import combinations, product
 from operator import itemgetter
-import numpy as np
 import tmjob as jm
-from tools import TMavailable
+import metrics as mt
+from tools import TMavailable, writeAtomic, lazyModule
+np = lazyModule('numpy')		# imported on first use
 
 
 # prevent stand-alone execution
@@ -40,8 +43,138 @@ class SpinFlipperError(Exception):
 	pass
 
 
+# sequence of all beta occupations, i.e. of all combinations of the occupation dicts of the single metal domains
+# (one dict per domain); the occupations are glued together on access, so that the full product is never stored
+class BetaOccupations:
+	def __init__(self,beta_distribs,num_beta_electrons):
+		self.distribs_ = beta_distribs		# e.g. [[{'1fe':1,'2fe':0},{'1fe':0,'2fe':1}],[{'4co':0}]]
+		self.num_beta_electrons_ = num_beta_electrons
+		self.length_ = 1
+		for occ_dicts in self.distribs_:
+			self.length_ *= len(occ_dicts)
+	
+	def __len__(self):
+		return self.length_
+	
+	def __getitem__(self,nr):
+		if nr < 0:
+			nr += len(self)
+		if nr < 0 or nr >= len(self):
+			raise IndexError('beta occupation index out of range')
+		
+		# same order as itertools.product, i.e. the last domain changes fastest
+		occ = []
+		for occ_dicts in reversed(self.distribs_):
+			nr,i = divmod(nr,len(occ_dicts))
+			occ.insert(0,occ_dicts[i])
+		
+		return self.__glue(occ)
+	
+	def __iter__(self):
+		for occ in product(*self.distribs_):
+			yield self.__glue(occ)
+	
+	def __glue(self,occ):
+		# this glues together the domain-specific dicts to form the desired output
+		lst = {}
+		for d in occ:
+			lst.update(d)
+		
+		# sanity check II: count electrons and compare those with the number of excess electrons
+		assert sum(lst.values()) == self.num_beta_electrons_, \
+		"electron number not matching in {} (desired value: {})".format(lst,self.num_beta_electrons_)
+		
+		return lst
+
+
+# creates dicts containing meaningful integer distributions of already existing beta electrons at the flipable metal centers
+# this is necessary for reduced transition metals; example output:
+# [{'1fe':1, '3fe':0, '4co':1, '7ni':3, '9ni':2}, {'1fe':0 ,'3fe':1, '4co':1, '7ni':3, '9ni':2},
+#  {'1fe':1, '3fe':0, '4co':1, '7ni':2, '9ni':3}, {'1fe':0 ,'3fe':1, '4co':1, '7ni':2, '9ni':3}]
+# for a system containing: 1xFe(II), 1xFe(III), 1xCo(III), 1xNi(II) & 1xNi(III)
+# it doesn't need a spinflipper, so that it can be evaluated cheaply for many tolerances (see lowspin.sweep)
+#
+# two modi exist:
+# mode=0 is rather exhaustive, i.e. it produces all electron distributions
+# mode=1 reduces the number of distributions if the beta electrons in a domain are properly localised,
+# since they don't have to be distributed over all centers in the domain
+# e.g. Fe4O5+ --> 1xFe(II) & 3xFe(III)
+# mode=0:	[{'1fe':1, '2fe':0, '3fe':0, '4fe':0}, {'1fe':0, '2fe':1, '3fe':0, '4fe':0},
+# 		 {'1fe':0, '2fe':0, '3fe':1, '4fe':0}, {'1fe':0, '2fe':0, '3fe':0, '4fe':1}]
+# mode=1:	[{'1fe':1, '2fe':0, '3fe':0, '4fe':0}]
+def createBetaOccList(lmos,mode=0,ox_tol=0.1,domains=None,verbose=0):
+	# find metal domains (i.e. kinds of metals or the given groups of centers)
+	metal_centers = lmos.partition_beta_electrons_.keys()					# e.g. ['1fe','3fe','4co','7ni','9ni']
+	centers_per_dom = {}										# e.g. {'fe':['1fe','3fe'],'co':['4co'],'ni':['7ni','9ni']}
+	if domains:
+		for i,dom in enumerate(domains):
+			centers_per_dom['domain{:d}'.format(i+1)] = [center for center in dom if center in metal_centers]
+	else:
+		for center in metal_centers:
+			centers_per_dom.setdefault(re.findall("[a-z]+", center)[0],[]).append(center)
+	metal_domains = list(centers_per_dom.keys())
+	
+	# count beta electrons per domain
+	num_beta_per_dom = {d:0.0 for d in metal_domains}
+	num_atoms_per_dom = {d:0 for d in metal_domains}
+	ambig_occ_per_dom = {d:False for d in metal_domains}
+	for dom in metal_domains:
+		for center in centers_per_dom[dom]:
+			occ = lmos.partition_beta_electrons_[center]
+			num_beta_per_dom[dom] += occ
+			num_atoms_per_dom[dom] += 1
+			ambig_occ_per_dom[dom] = abs(occ - round(occ)) >= ox_tol		# check for ambiguous occupations
+	
+	# excess electrons shared among several domains can't be assigned to any of them
+	if domains and int(sum(round(n) for n in num_beta_per_dom.values())) != lmos.num_beta_electrons_:
+		if verbose > 0:
+			print("  -> excess electrons are not localized within the given domains, using one domain per element")
+		return createBetaOccList(lmos,mode,ox_tol,None,verbose)
+	
+	# sanity check I: compare number of beta electrons from num_beta_per_dom and lmos.num_beta_electrons_
+	# (fails for mixed valence systems, whose excess electrons are shared among the centers)
+	if int(round(np.array(list(num_beta_per_dom.values())).sum())) != lmos.num_beta_electrons_:
+		raise SpinFlipperError("electron number not matching in {} (desired value: {})".format(num_beta_per_dom,lmos.num_beta_electrons_))
+	
+	# produce integer occupation lists for beta electrons
+	beta_distribs = []
+	for dom in metal_domains:
+		occ_dicts = []
+		centers_in_dom = centers_per_dom[dom]
+		if mode == 0 or ambig_occ_per_dom[dom]:
+			if verbose > 1:
+				print("  -> using exhaustive excess electron redistribution mode in domain {} (mode={}, ambig_occ={})".format(dom,mode,ambig_occ_per_dom[dom]))
+			equal_distrib = int(round(num_beta_per_dom[dom]) // num_atoms_per_dom[dom])
+			individual = int(round(num_beta_per_dom[dom]) % num_atoms_per_dom[dom])
+			for comb in list(combinations(centers_in_dom,individual)):
+				occ_nums = {}
+				for center in centers_in_dom:
+					occ_nums[center] = equal_distrib
+					occ_nums[center] += 1 if center in comb else 0
+				occ_dicts.append(occ_nums)
+		else:	# in case the beta occupation pattern from LMOs is rather definite produce only one occ list based on those numbers
+			occ_dicts.append({center:int(round(lmos.partition_beta_electrons_[center])) for center in centers_in_dom})
+		
+		beta_distribs.append(occ_dicts)
+	beta_occupations = BetaOccupations(beta_distribs,lmos.num_beta_electrons_)
+	
+	assert len(beta_occupations) >= 1, "not good!"
+	
+	return beta_occupations
+
+
 class spinflipper:
-	def __init__(self,refjob,hs_lmos,dirprefix='',scaredy_cat=False,ox_tol=0.1,verbose=0):
+	# data groups of the reference control that are replaced in every low spin job
+	templ_grps_ = ['$alpha shells','$beta shells','$scfdamp','$scforbitalshift','$scfiterlimit']
+	
+	# SCF damping of new jobs and of jobs starting from the orbitals of a converged neighbor
+	damping_ = '$scfdamp   start=5.500  step=0.050  min=0.500'
+	warm_damping_ = '$scfdamp   start=1.000  step=0.050  min=0.100'
+	
+	# file in each low spin job holding its occupation pattern, so that later runs can start from its orbitals
+	pattern_file_ = 'PATTERN'
+	
+	def __init__(self,refjob,hs_lmos,dirprefix='',scaredy_cat=False,ox_tol=0.1,verbose=0,warm_start=False,pop=False,domains=None,prefetch=False):
 		if not isinstance(refjob,jm.tmjob):
 			raise SpinFlipperError('given refernce job is not an instance of tmjob!')
 		
@@ -56,6 +189,12 @@ class spinflipper:
 		self.lmos_ = hs_lmos
 		self.prefix_ = dirprefix
 		self.lsjobs_ = []
+		self.patterns_ = {}		# occupation pattern of each low spin job, see __pattern
+		self.earlier_jobs_ = []		# converged low spin jobs of earlier runs (warm start only)
+		self.converged_ = {}		# job path -> (modification time of its output, converged), see __isConverged
+		self.warm_start_ = warm_start
+		self.pop_ = pop			# request a population analysis in each low spin job
+		self.domains_ = domains		# groups of metal centers sharing excess electrons (default: one group per element)
 		self.vrbs_lvl_ = verbose
 		
 		if not self.refjob_.isUHF() or self.refjob_.getMS() < 1.0:
@@ -66,111 +205,100 @@ class spinflipper:
 		self.ref_MS_ = self.refjob_.getMS()
 		
 		m = 0 if scaredy_cat else 1
-		self.__fetchMOs()
-		self.beta_occupations_ = self.__createBetaOccList(mode=m,ox_tol=ox_tol)
-		
+		self.__compileControlTemplate()
+		self.loc_mos_ = None		# the MO coefficients are read not before they are needed (see __fetchMOs)
+		self.mo_reads_ = None		# pending reads of the MO files (see prefetch)
+		if prefetch:
+			self.prefetch()
+		self.beta_occupations_ = createBetaOccList(self.lmos_,mode=m,ox_tol=ox_tol,domains=self.domains_,verbose=self.vrbs_lvl_)
+		if warm_start:
+			self.__findEarlierJobs()
+	
+	def printInfo(self):
 		# user info
+		self.__fetchMOs()
 		print()
 		print(" Spin Flipper")
 		print("--------------")
 		print(" #core orbitals: {:4d}   #LMOs: {:4d} ({:4d} flipable, {:4d} others)   #virtual orbitals: {:4d}   #excess electrons: {:4d}".format(len(self.core_mos_), \
 		len(self.loc_mos_), len(self.loc_mos_)-len(self.other_lmos_), len(self.other_lmos_), len(self.virt_mos_), self.lmos_.num_beta_electrons_),flush=True)
-		
+	
+	def prefetch(self):
+		# starts reading the MO files on a small pool of I/O threads (see __fetchMOs), so that the reads overlap with
+		# each other and with whatever is done until the MOs are needed
+		if not self.loc_mos_ is None or self.mo_reads_:
+			return
+		
+		from concurrent.futures import ThreadPoolExecutor		# imported here, since it is rather expensive
+		pool = ThreadPoolExecutor(max_workers=4)
+		self.mo_reads_ = {'can':pool.submit(self.refjob_.getTextMOs,spin='alpha',sequential=True),
+		                  'loc':pool.submit(self.lmos_.locjob_.getTextMOs,spin='alpha',local=True,sequential=True),
+		                  'alpha_head':pool.submit(self.__readHeader,'alpha'),
+		                  'beta_head':pool.submit(self.__readHeader,'beta')}
+		pool.shutdown(wait=False)
+	
+	def __readHeader(self,mo_file):
+		# first line of a MO file of the reference job
+		with open(os.path.join(self.refjob_.path_,mo_file),'r') as fh:
+			return fh.readline()
+	
 	def __fetchMOs(self):
+		if not self.loc_mos_ is None:
+			return
+		
+		# the files are read concurrently, the results are collected here
+		self.prefetch()
+		reads = self.mo_reads_
+		self.mo_reads_ = None
+		
 		# general electronic information
 		num_e = self.ref_alpha_ + self.ref_beta_
 		num_ve = self.refjob_.getNumVE()
 		num_core_alpha = (num_e - num_ve) // 2
 		
 		# gather all canonical MO coefficients
-		can_mos = list(self.refjob_.getTextMOs(spin='alpha',sequential=True).values())
+		can_mos = list(reads['can'].result().values())
 		self.core_mos_ = can_mos[:num_core_alpha]
 		self.virt_mos_ = can_mos[self.ref_alpha_:]
 		
 		# get all LMO coefficients
-		self.loc_mos_ = list(self.lmos_.locjob_.getTextMOs(spin='alpha',local=True,sequential=True).values())
+		loc_mos = list(reads['loc'].result().values())
 		
 		# extract LMOs of unflipable atoms
-		self.other_lmos_ = [self.loc_mos_[i-1] for i in self.lmos_.other_alpha_idxs_]
+		self.other_lmos_ = [loc_mos[i-1] for i in self.lmos_.other_alpha_idxs_]
 		
 		# remember file header of alpha and beta mo files
-		with open(os.path.join(self.refjob_.path_,'alpha'),'r') as fh:
-			self.ref_alpha_head_ = fh.readline()
-		
-		with open(os.path.join(self.refjob_.path_,'beta'),'r') as fh:
-			self.ref_beta_head_ = fh.readline()
+		self.ref_alpha_head_ = reads['alpha_head'].result()
+		self.ref_beta_head_ = reads['beta_head'].result()
+		self.loc_mos_ = loc_mos		# set last, since it marks the MOs as fetched
 	
-	# creates dicts containing meaningful integer distributions of already existing beta electrons at the flipable metal centers
-	# this is necessary for reduced transition metals; example output:
-	# [{'1fe':1, '3fe':0, '4co':1, '7ni':3, '9ni':2}, {'1fe':0 ,'3fe':1, '4co':1, '7ni':3, '9ni':2},
-	#  {'1fe':1, '3fe':0, '4co':1, '7ni':2, '9ni':3}, {'1fe':0 ,'3fe':1, '4co':1, '7ni':2, '9ni':3}]
-	# for a system containing: 1xFe(II), 1xFe(III), 1xCo(III), 1xNi(II) & 1xNi(III)
-	#
-	# two modi exist:
-	# mode=0 is rather exhaustive, i.e. it produces all electron distributions
-	# mode=1 reduces the number of distributions if the beta electrons in a domain are properly localised,
-	# since they don't have to be distributed over all centers in the domain
-	# e.g. Fe4O5+ --> 1xFe(II) & 3xFe(III)
-	# mode=0:	[{'1fe':1, '2fe':0, '3fe':0, '4fe':0}, {'1fe':0, '2fe':1, '3fe':0, '4fe':0},
-	# 		 {'1fe':0, '2fe':0, '3fe':1, '4fe':0}, {'1fe':0, '2fe':0, '3fe':0, '4fe':1}]
-	# mode=1:	[{'1fe':1, '2fe':0, '3fe':0, '4fe':0}]
-	def __createBetaOccList(self,mode=0,ox_tol=0.1):
-		# find metal domains (i.e. kinds of metals)
-		metal_centers = self.lmos_.partition_beta_electrons_.keys()					# e.g. ['1fe','3fe','4co','7ni','9ni']
-		metal_domains = list(dict.fromkeys([re.findall("[a-z]+", mc)[0] for mc in metal_centers]))	# e.g. ['fe','co','ni']
-		
-		# count beta electrons per domain
-		num_beta_per_dom = {d:0.0 for d in metal_domains}
-		num_atoms_per_dom = {d:0 for d in metal_domains}
-		ambig_occ_per_dom = {d:False for d in metal_domains}
-		for center in metal_centers:
-			for dom in metal_domains:
-				if dom in center:
-					occ = self.lmos_.partition_beta_electrons_[center]
-					num_beta_per_dom[dom] += occ
-					num_atoms_per_dom[dom] += 1
-					ambig_occ_per_dom[dom] = abs(occ - round(occ)) >= ox_tol		# check for ambiguous occupations
-		
-		# sanity check I: compare number of beta electrons from num_beta_per_dom and self.lmos_.num_beta_electrons_
-		assert int(round(np.array(list(num_beta_per_dom.values())).sum())) == self.lmos_.num_beta_electrons_, \
-		"electron number not matching in {} (desired value: {})".format(num_beta_per_dom,self.lmos_.num_beta_electrons_)
-		
-		# produce integer occupation lists for beta electrons
-		beta_distribs = []
-		for dom in metal_domains:
-			occ_dicts = []
-			centers_in_dom = [center for center in metal_centers if dom in center]
-			if mode == 0 or ambig_occ_per_dom[dom]:
-				if self.vrbs_lvl_ > 1:
-					print("  -> using exhaustive excess electron redistribution mode in domain {} (mode={}, ambig_occ={})".format(dom,mode,ambig_occ_per_dom[dom]))
-				equal_distrib = int(round(num_beta_per_dom[dom]) // num_atoms_per_dom[dom])
-				individual = int(round(num_beta_per_dom[dom]) % num_atoms_per_dom[dom])
-				for comb in list(combinations(centers_in_dom,individual)):
-					occ_nums = {}
-					for center in centers_in_dom:
-						occ_nums[center] = equal_distrib
-						occ_nums[center] += 1 if center in comb else 0
-					occ_dicts.append(occ_nums)
-			else:	# in case the beta occupation pattern from LMOs is rather definite produce only one occ list based on those numbers
-				occ_dicts.append({center:int(round(self.lmos_.partition_beta_electrons_[center])) for center in centers_in_dom})
-			
-			beta_distribs.append(occ_dicts)
-		beta_occupations_raw = product(*beta_distribs)		# produces all combinations of dicts stored in beta_distribs (i.e. take on dict per domain)
-		beta_occupations = []
-		for occ in beta_occupations_raw:			# this glues together the domain-specific dicts to form the desired output
-			lst = {}
-			for d in occ:
-				lst.update(d)
-			
-			# sanity check II: count electrons in each dict in beta_occupations and compare those with self.lmos_.num_beta_electrons_
-			assert np.array(list(lst.values())).sum() == self.lmos_.num_beta_electrons_, \
-			"electron number not matching in {} (desired value: {})".format(lst,self.lmos_.num_beta_electrons_)
-			
-			beta_occupations.append(lst)
+	# the control files of all low spin jobs differ from the reference only in the occupations and the SCF settings,
+	# thus the reference control is stripped from those data groups once and each new control is rendered from it
+	def __compileControlTemplate(self):
+		try:
+			iter_limit = int(self.refjob_.readDataGrp('$scfiterlimit')[0].split()[1])
+		except (IndexError,ValueError):
+			iter_limit = 0
+		self.iter_limit_ = iter_limit if iter_limit > 500 else 500
 		
-		assert len(beta_occupations) >= 1, "not good!"
+		control = [line.strip('\n') + '\n' for line in self.refjob_.strippedControl(self.templ_grps_) if line.strip() != '']
+		try:
+			end = [i for i,line in enumerate(control) if '$end' in line][0]
+		except IndexError:
+			raise SpinFlipperError('reference control file "' + repr(self.refjob_) + '" has no $end!')
 		
-		return beta_occupations
+		self.control_head_ = ''.join(control[:end])
+		self.control_tail_ = ''.join(control[end:])
+	
+	def __renderControl(self,alpha_occ,beta_occ,damping=None):
+		return self.control_head_ + \
+		'$alpha shells\n a       1-{:d}                     (1)\n'.format(alpha_occ) + \
+		'$beta shells\n a       1-{:d}                     (1)\n'.format(beta_occ) + \
+		(damping if damping else self.damping_) + '\n' + \
+		'$scforbitalshift  automatic=1.0\n' + \
+		'$scfiterlimit {:d}\n'.format(self.iter_limit_) + \
+		('$pop\n' if self.pop_ and not '$pop' in self.control_head_ else '') + \
+		self.control_tail_
 	
 	def __writeOrbFile(self,path,cont):
 		with open(path,'w') as fh:
@@ -187,31 +315,33 @@ class spinflipper:
 				for line in mo:			# write MO coeffs
 					fh.write(line)
 			fh.write('$end')
+			mt.inc('orbital_bytes_written',fh.tell())
 	
-	def __createLSJob(self,dir_name):
+	def __createLSJob(self,dir_name,control):
 		flip_dir = os.path.join(self.refjob_.path_,dir_name)
 		
 		if os.path.isdir(flip_dir):
 			shutil.rmtree(flip_dir)
 		
-		# copy input to new file
-		start_dir = os.getcwd()
-		os.chdir(self.refjob_.path_)
+		# copy input to new file (cpc runs in the reference job's directory, the cwd of this process is left untouched)
+		mt.inc('subprocesses_spawned',command='cpc')
 		if self.vrbs_lvl_ > 1:
 			print("copying job files ...")
-			os.system('cpc ' + str(dir_name))
+			sp.call(['cpc',flip_dir],cwd=self.refjob_.path_)
 			print()
 		else:
-			os.system('cpc ' + str(dir_name) + ' > cpc.err 2>&1')
-		
-		os.chdir(start_dir)
+			cpc_out = sp.run(['cpc',flip_dir],cwd=self.refjob_.path_,stdout=sp.PIPE,stderr=sp.STDOUT,universal_newlines=True).stdout
+			writeAtomic(os.path.join(self.refjob_.path_,'cpc.err'),cpc_out)
 		
 		if not os.path.isdir(flip_dir):
 			raise SpinFlipperError('error while copying turbomole files to directory "' + str(flip_dir) + '"!')
 		
-		# set up new TM job
+		# write the new control file in one go and set up the new TM job without reading it again
+		control_path = os.path.join(flip_dir,'control')
+		writeAtomic(control_path,control)
+		
 		try:
-			lsjob = jm.tmjob(os.path.join(flip_dir,'control'))
+			lsjob = jm.tmjob(control_path,control=control.splitlines(True))
 		except jm.TMJobHandlerError as tmerr:
 			print(tmerr)
 			raise SpinFlipperError('unable to set up low spin job!')
@@ -224,7 +354,178 @@ class spinflipper:
 		
 		return lsjob
 	
-	def flip(self,centers):
+	# number of alpha and beta electrons in the LMOs of each metal center, e.g. {'1fe':(5,0),'2fe':(1,5)}
+	def __pattern(self,centers,beta_occ):
+		pattern = {}
+		for center,lmo_idxs in self.lmos_.metal_alpha_idxs_.items():
+			if center in centers:
+				pattern[center] = (beta_occ[center],len(lmo_idxs))
+			else:
+				pattern[center] = (len(lmo_idxs),beta_occ[center])
+		
+		return pattern
+	
+	# the low spin jobs of earlier runs in the directory of the reference job (recognized by their pattern files) that
+	# are converged; the jobs created in this run are usually all still queued, when the next ones are created
+	def __findEarlierJobs(self):
+		for name in sorted(os.listdir(self.refjob_.path_)):
+			pattern_path = os.path.join(self.refjob_.path_,name,self.pattern_file_)
+			if not os.path.isfile(pattern_path):
+				continue
+			
+			try:
+				with open(pattern_path,'r') as fh:
+					pattern = {center:tuple(occ) for center,occ in json.load(fh).items()}
+				job = jm.tmjob(os.path.join(self.refjob_.path_,name,'control'))
+			except (OSError,ValueError,AttributeError,TypeError,jm.TMJobHandlerError):
+				continue
+			
+			if set(pattern) == set(self.lmos_.metal_alpha_idxs_) and self.__isConverged(job):
+				self.earlier_jobs_.append(job)
+				self.patterns_[job.path_] = pattern
+		
+		if self.vrbs_lvl_ > 0:
+			print("  {:d} converged low spin job(s) of earlier runs found for warm starts".format(len(self.earlier_jobs_)),flush=True)
+	
+	# the converged status is read from the output only if it has changed since the last check
+	def __isConverged(self,job):
+		energy_out = job.getOutputFile('energy')
+		if not energy_out:
+			return False
+		
+		try:
+			mtime = os.stat(energy_out).st_mtime_ns
+		except FileNotFoundError:
+			return False
+		
+		if not job.path_ in self.converged_ or self.converged_[job.path_][0] != mtime:
+			self.converged_[job.path_] = (mtime,job.isConverged())
+		return self.converged_[job.path_][1]
+	
+	# the converged low spin job (of this run or an earlier one) whose pattern differs at the fewest metal centers
+	# from the given one
+	def __convergedNeighbor(self,pattern):
+		# jobs of this run replace earlier jobs in the same directory
+		candidates = {job.path_:job for job in self.earlier_jobs_ + self.lsjobs_}
+		
+		neighbor = None
+		min_dist = len(pattern) + 1
+		for lsjob in candidates.values():
+			if not lsjob.path_ in self.patterns_:
+				continue
+			
+			dist = sum(1 for center,occ in self.patterns_[lsjob.path_].items() if pattern[center] != occ)
+			if dist < min_dist and self.__isConverged(lsjob):
+				neighbor = lsjob
+				min_dist = dist
+		
+		return neighbor
+	
+	# builds start orbitals from the converged orbitals of a neighboring configuration:
+	# at each metal center that loses electrons of one spin, the occupied orbitals with the largest overlap
+	# with the center's LMOs become virtual; centers gaining electrons receive these orbitals from the
+	# other spin (or the center's LMOs from the reference job, if there are not enough of them)
+	def __warmStartMOs(self,nbjob,pattern):
+		nb_pattern = self.patterns_[nbjob.path_]
+		num_core = len(self.core_mos_)
+		
+		occ = {}
+		virt = {}
+		head = {}
+		for spin in ['alpha','beta']:
+			with open(os.path.join(nbjob.path_,spin),'r') as fh:
+				head[spin] = fh.readline()
+			width = jm.coeffWidth(head[spin])
+			mos = [(mo,jm.floatMO(mo,width)) for mo in nbjob.getTextMOs(spin=spin,sequential=True).values()]
+			num_occ = nbjob.getNumE(spin)
+			occ[spin] = mos[:num_occ]
+			virt[spin] = mos[num_occ:]
+		nsaos = len(occ['alpha']) + len(virt['alpha'])
+		
+		pool = {center:{'alpha':[],'beta':[]} for center in pattern}
+		lmos = {}
+		
+		# take away electrons ...
+		for center,(num_a,num_b) in pattern.items():
+			lmos[center] = [(self.loc_mos_[i-1],jm.floatMO(self.loc_mos_[i-1])) for i in self.lmos_.metal_alpha_idxs_[center]]
+			proj = np.array([vec for mo,vec in lmos[center]])
+			for spin,diff in [('alpha',num_a - nb_pattern[center][0]),('beta',num_b - nb_pattern[center][1])]:
+				if diff >= 0:
+					continue
+				
+				weights = [np.sum(np.dot(proj,vec)**2) for mo,vec in occ[spin][num_core:]]
+				leaving = sorted(np.argsort(weights)[::-1][:-diff] + num_core,reverse=True)
+				for i in leaving:
+					pool[center][spin].append(occ[spin][i])
+					virt[spin].insert(0,occ[spin].pop(i))
+		
+		# ... and add them where they are missing
+		for center,(num_a,num_b) in pattern.items():
+			for spin,other,diff in [('alpha','beta',num_a - nb_pattern[center][0]),('beta','alpha',num_b - nb_pattern[center][1])]:
+				if diff <= 0:
+					continue
+				
+				arriving = pool[center][other][:diff]
+				if len(arriving) < diff:
+					occ_vecs = np.array([vec for mo,vec in occ[spin]])
+					weights = [np.sum(np.dot(occ_vecs,vec)**2) for mo,vec in lmos[center]]
+					arriving += [lmos[center][i] for i in np.argsort(weights)[:diff - len(arriving)]]
+				occ[spin] += arriving
+		
+		for k,spin in enumerate(['alpha','beta']):
+			assert len(occ[spin]) == nbjob.getNumE(spin) + sum(occs[k] - nb_pattern[center][k] for center,occs in pattern.items()), \
+			"incorrect number of {} electrons in warm start from {}".format(spin,nbjob)
+		
+		new_mos = []
+		for spin in ['alpha','beta']:
+			new_mos.append([head[spin]] + [mo for mo,vec in occ[spin]] + [mo for mo,vec in virt[spin]][:nsaos - len(occ[spin])])
+		
+		return new_mos
+	
+	def __occupationNumbers(self,centers,beta_occ):
+		# numbers of alpha and beta electrons and MS of the low spin job with the given centers flipped: the alpha electrons
+		# of a flipped center become beta electrons, except for those taking the place of its excess electrons
+		num_flip_alpha = 0
+		add_alpha = 0
+		for center in centers:
+			num_lmos = len(self.lmos_.metal_alpha_idxs_[center])
+			num_flip_alpha += num_lmos
+			add_alpha += min(beta_occ[center],num_lmos)
+		
+		new_alpha_occ = self.ref_alpha_ - num_flip_alpha + add_alpha
+		new_beta_occ  = self.ref_beta_  + num_flip_alpha - add_alpha
+		return (new_alpha_occ,new_beta_occ,abs(new_alpha_occ - new_beta_occ) / 2.0)
+	
+	def __dirName(self,centers,new_MS,nr):
+		# the directory's name consists of the label of the flipped centers ...
+		dir_name = self.prefix_
+		for item in centers:
+			dir_name += str(item)
+		# ... the new spin multiplicity ...
+		dir_name += '_' + str(int(2*new_MS+1)) + 'tet'
+		# ... and a running number
+		if len(self.beta_occupations_) > 1: dir_name += '_' + str(nr+1)
+		
+		return dir_name
+	
+	# describes the low spin jobs flip would create for the given centers and beta occupations (see flip) without creating
+	# them, i.e. without reading any MO coefficients or writing any file; returns (as generator) one dict per job, e.g.
+	# {'flip':['1fe','2fe'],'beta_occ':{'1fe':1,'2fe':0,...},'alpha':71,'beta':63,'multiplicity':9,'dir':'flip_1fe2fe_9tet_1'}
+	def plan(self,centers,beta_occ_idxs=None):
+		if len(centers) == 0:
+			raise SpinFlipperError('no centers specified to be flipped!')
+		
+		if beta_occ_idxs is None:
+			beta_occ_idxs = range(len(self.beta_occupations_))
+		
+		for nr in beta_occ_idxs:
+			beta_occ = self.beta_occupations_[nr]
+			new_alpha_occ,new_beta_occ,new_MS = self.__occupationNumbers(centers,beta_occ)
+			yield {'flip':list(centers), 'beta_occ':beta_occ, 'alpha':new_alpha_occ, 'beta':new_beta_occ,
+			       'multiplicity':int(2*new_MS+1), 'dir':self.__dirName(centers,new_MS,nr)}
+	
+	# beta_occ_idxs restricts the new jobs to the given indices of self.beta_occupations_ (default: all of them)
+	def flip(self,centers,beta_occ_idxs=None):
 		if self.vrbs_lvl_ > 1:
 			print("entering FLIPPING")
 		
@@ -238,9 +539,14 @@ class spinflipper:
 			print("  There are {:d} possibilities to distribute the existing excess electrons among the metal centers.".format(len(self.beta_occupations_)))
 		
 		num_existing_lsjobs = len(self.lsjobs_)
+		self.__fetchMOs()
 		
 		# calculate sorting weights of LMOS depending on occupation
-		for nr,beta_occ in enumerate(self.beta_occupations_):
+		if beta_occ_idxs is None:
+			beta_occ_idxs = range(len(self.beta_occupations_))
+		
+		for nr in beta_occ_idxs:
+			beta_occ = self.beta_occupations_[nr]
 			lmo_weights_alpha = []
 			lmo_weights_beta = []
 			num_flip_alpha = 0
@@ -272,9 +578,7 @@ class spinflipper:
 			add_beta = [iw[1] for iw in lmo_weights_beta].count(10)			# which stands for excess beta electrons
 			assert add_alpha+add_beta == self.lmos_.num_beta_electrons_, \
 			"incorrect number of excess electrons: {} a, {} b; (desired value: {})".format(add_alpha,add_beta,self.lmos_.num_beta_electrons_)
-			new_alpha_occ = self.ref_alpha_ - num_flip_alpha + add_alpha
-			new_beta_occ  = self.ref_beta_  + num_flip_alpha - add_alpha
-			new_MS = abs(new_alpha_occ - new_beta_occ) / 2.0
+			new_alpha_occ,new_beta_occ,new_MS = self.__occupationNumbers(centers,beta_occ)
 			
 			# inform the user
 			if self.vrbs_lvl_ > 0:
@@ -285,41 +589,36 @@ class spinflipper:
 				print("       flipped alpha electrons: {}   flipped excess electrons: {}".format(num_flip_alpha, add_alpha))
 			
 			# creat new directory
-			# the directory's name consists of the label of the flipped centers ...
-			dir_name = self.prefix_
-			for item in centers:
-				dir_name += str(item)
-			# ... the new spin multiplicity ...
-			dir_name += '_' + str(int(2*new_MS+1)) + 'tet'
-			# ... and a running number
-			if len(self.beta_occupations_) > 1: dir_name += '_' + str(nr+1)
-			
-			self.lsjobs_.append(self.__createLSJob(dir_name))
+			dir_name = self.__dirName(centers,new_MS,nr)
 			
-			# create new orbital files
-			if self.vrbs_lvl_ > 1:
-				print('creating new orbital files ...')
+			assert new_MS < self.ref_MS_, \
+			"new low spin job {} has wrong occupation, old MS: {}, new MS: {}".format(dir_name,self.ref_MS_,new_MS)
 			
-			# write out new alpha and beta orbitals
-			self.__writeOrbFile(os.path.join(self.lsjobs_[-1].path_,'alpha'),new_alpha_mos)
-			self.__writeOrbFile(os.path.join(self.lsjobs_[-1].path_,'beta'),new_beta_mos)
+			# start from the orbitals of the closest already converged configuration, if requested
+			pattern = self.__pattern(centers,beta_occ)
+			neighbor = self.__convergedNeighbor(pattern) if self.warm_start_ else None
+			if neighbor:
+				if self.vrbs_lvl_ > 0:
+					print("       starting from the converged orbitals of {}".format(neighbor))
+				new_alpha_mos,new_beta_mos = self.__warmStartMOs(neighbor,pattern)
+				assert len(new_alpha_mos) == len(new_beta_mos) and len(new_alpha_mos) - 1 == len(self.core_mos_ + self.loc_mos_ + self.virt_mos_), \
+				"incorrect number of orbitals in warm start from {}".format(neighbor)
 			
-			# update control file
-			try:
-				iter_limit = int(self.lsjobs_[-1].readDataGrp('$scfiterlimit')[0].split()[1])
-			except (IndexError,ValueError):
-				iter_limit = 0
-			new_iter_limit = iter_limit if iter_limit > 500 else 500
-			self.lsjobs_[-1].removeFromControl(['$alpha shells','$beta shells','$scfdamp','$scforbitalshift','$scfiterlimit'])
-			self.lsjobs_[-1].addToControl([	'$alpha shells',' a       1-{:d}                     (1)'.format(new_alpha_occ),\
-							'$beta shells', ' a       1-{:d}                     (1)'.format(new_beta_occ),\
-							'$scfdamp   start=5.500  step=0.050  min=0.500',\
-							'$scforbitalshift  automatic=1.0',\
-							'$scfiterlimit {:d}'.format(new_iter_limit)])
-			self.lsjobs_[-1].updateControl()
+			damping = self.warm_damping_ if neighbor else None
+			with mt.timer('stage_duration_seconds',stage='flip'):
+				self.lsjobs_.append(self.__createLSJob(dir_name,self.__renderControl(new_alpha_occ,new_beta_occ,damping)))
+				
+				# create new orbital files
+				if self.vrbs_lvl_ > 1:
+					print('creating new orbital files ...')
+				
+				# write out new alpha and beta orbitals
+				self.__writeOrbFile(os.path.join(self.lsjobs_[-1].path_,'alpha'),new_alpha_mos)
+				self.__writeOrbFile(os.path.join(self.lsjobs_[-1].path_,'beta'),new_beta_mos)
 			
-			assert self.lsjobs_[-1].getMS() < self.ref_MS_, \
-			"new low spin job {} has wrong occupation, old MS: {}, new MS: {}".format(self.lsjobs_[-1],self.ref_MS_,self.lsjobs_[-1].getMS())
+			self.patterns_[self.lsjobs_[-1].path_] = pattern
+			writeAtomic(os.path.join(self.lsjobs_[-1].path_,self.pattern_file_),json.dumps(pattern,sort_keys=True) + '\n')
+			mt.inc('configurations_generated')
 			
 			# run job!
 			# Attention! This is only needed for testing reasons!
@@ -329,8 +628,8 @@ class spinflipper:
 			#	print(tmerr)
 			#	raise SpinFlipperError('failed to flip spins! please check job at {}'.format(self.lsjobs_[-1]))
 		
-		assert len(self.lsjobs_) == num_existing_lsjobs + len(self.beta_occupations_), \
-		"there is not the correct number of low spin jobs, old: {:d}, new {:d}, supposed added: {:d}".format(num_existing_lsjobs, len(self.lsjobs_), len(self.beta_occupations_))
+		assert len(self.lsjobs_) == num_existing_lsjobs + len(beta_occ_idxs), \
+		"there is not the correct number of low spin jobs, old: {:d}, new {:d}, supposed added: {:d}".format(num_existing_lsjobs, len(self.lsjobs_), len(beta_occ_idxs))
 		
-		return self.lsjobs_[-len(self.beta_occupations_):]
+		return self.lsjobs_[num_existing_lsjobs:]
 
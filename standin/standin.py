@@ -0,0 +1,738 @@
+#! /usr/bin/env python3
+
+###############################
+# stand-in TURBOMOLE and PBS  #
+# executables                 #
+#                             #
+# by Fabian                   #
+# 19.10.26                    #
+###############################
+
+# This script impersonates the external programs lowSpin talks to (cpc, dscf,
+# ridft, jobex, aoforce, qsub, qstat and qdel). The links in this directory
+# point here and the program to mimic is picked by the name it is called with.
+# Enable them with "lowspin.py --stand-in" or by setting LOWSPIN_STANDIN=1.
+#
+# Called directly, the script offers two helpers:
+#   standin.py mkjob DIR [options]	creates a synthetic high spin reference job
+#   standin.py reset			clears the fake queue table
+#
+# The fakes are deterministic and can be tuned by environment variables:
+#   LOWSPIN_STANDIN_ITER_TIME		seconds per SCF iteration (default: 0.0)
+#   LOWSPIN_STANDIN_PROPER_TIME		seconds per property run (default: 0.0)
+#   LOWSPIN_STANDIN_FAULT_RATE		fraction of SCFs that do not converge (default: 0.0)
+#   LOWSPIN_STANDIN_FAULT		kind of failure: oscillate, diverge or stagnate (default: oscillate)
+#   LOWSPIN_STANDIN_FAULT_DAMP		$scfdamp start value curing a faulty SCF (default: 8.0)
+#   LOWSPIN_STANDIN_QUEUE		path of the fake queue table
+#   LOWSPIN_STANDIN_QUEUE_DELAY		seconds a job stays queued (default: 5.0)
+#   LOWSPIN_STANDIN_RUN_TIME		seconds a job is shown as running (default: 30.0)
+#   LOWSPIN_STANDIN_KEEP_TIME		seconds a completed job stays in the table (default: 60.0)
+#   LOWSPIN_STANDIN_EXECUTE		if 1, qsub really runs the job script in the background
+
+
+# load some helpful modules
+import os
+import sys
+import re
+import json
+import math
+import time
+import shutil
+import fcntl
+import getpass
+import hashlib
+import tempfile
+import argparse
+import subprocess as sp
+
+STANDIN_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,os.path.dirname(STANDIN_DIR))
+
+import tmjob as jm
+import PSE
+
+
+# name of the file describing a synthetic job (basis function owners, couplings)
+SIDECAR = 'standin.json'
+
+# nuclear charges of the elements known to mkjob
+Z = {'h':1, 'c':6, 'n':7, 'o':8, 'cr':24, 'mn':25, 'fe':26, 'co':27, 'ni':28, 'cu':29}
+
+
+def setting(name,default):
+	try:
+		return type(default)(os.environ.get('LOWSPIN_STANDIN_' + name,default))
+	except ValueError:
+		return default
+
+
+#############################################
+# MO files                                  #
+#############################################
+
+def formatD(x):
+	# fortran like D20.14 format, e.g. "0.10000000000000D+01" or "-.25612783293457D+03"
+	if x == 0.0:
+		return '0.00000000000000D+00'
+
+	e = math.floor(math.log10(abs(x))) + 1
+	m = round(abs(x) / 10**e,14)
+	if m >= 1.0:
+		m /= 10
+		e += 1
+
+	digits = '{:.14f}'.format(m)
+	if x < 0:
+		digits = '-' + digits[1:]
+
+	return '{}D{}{:02d}'.format(digits,'+' if e >= 0 else '-',abs(e))
+
+
+def readMOFile(path):
+	# returns a list of (eigenvalue,coefficients) tuples
+	mos = []
+	with open(path,'r') as fh:
+		fh.readline()			# skip header
+		for line in fh:
+			if line.startswith('$'):
+				break
+
+			if line.strip() == '' or line.split()[0].startswith('#'):
+				continue
+
+			if 'eigenvalue=' in line:
+				eig = float(line.split('eigenvalue=')[1].split()[0].replace('D','E'))
+				mos.append((eig,[]))
+				continue
+
+			line = line.rstrip('\n')
+			for i in range(0,len(line),20):
+				field = line[i:i+20].strip()
+				if field:
+					mos[-1][1].append(float(field.replace('D','E')))
+
+	return mos
+
+
+def writeMOFile(path,key,mos):
+	nsaos = len(mos[0][1])
+	out = ['{}    scfconv=7   format(4d20.14)\n'.format(key)]
+	for n,(eig,coeffs) in enumerate(mos,1):
+		out.append('{:6d}  a      eigenvalue={}   nsaos={:d}\n'.format(n,formatD(eig),nsaos))
+		for i in range(0,nsaos,4):
+			out.append(''.join(formatD(c) for c in coeffs[i:i+4]) + '\n')
+	out.append('$end\n')
+
+	with open(path,'w') as fh:
+		fh.write(''.join(out))
+
+
+#############################################
+# fake TURBOMOLE job                        #
+#############################################
+
+class fakejob:
+	def __init__(self,path):
+		self.path_ = os.path.abspath(path)
+		self.job_ = jm.tmjob(os.path.join(self.path_,'control'))
+		self.uhf_ = self.job_.isUHF()
+
+		coords = self.job_.readDataGrp('$coord')
+		self.labels_ = [str(i+1) + line.split()[3].lower() for i,line in enumerate(coords[1:])]
+
+		# number of orbitals per spin
+		if self.uhf_:
+			self.nocc_ = {'alpha':self.job_.getNumE('alpha'),'beta':self.job_.getNumE('beta')}
+		else:
+			self.nocc_ = {'closed':self.job_.getNumE('closed') // 2}
+		self.ncore_ = (self.job_.getNumE() - self.job_.getNumVE()) // 2
+
+		self.mo_files_ = {'alpha':'alpha','beta':'beta','closed':'mos'}
+		self.mos_ = {spin:readMOFile(os.path.join(self.path_,self.mo_files_[spin])) for spin in self.nocc_}
+		nsaos = len(list(self.mos_.values())[0][0][1])
+
+		# synthetic jobs know which atom every basis function belongs to ...
+		self.sidecar_ = {}
+		if os.path.isfile(os.path.join(self.path_,SIDECAR)):
+			with open(os.path.join(self.path_,SIDECAR),'r') as fh:
+				self.sidecar_ = json.load(fh)
+			self.owner_ = self.sidecar_['owner']
+		# ... for all other jobs the basis functions are simply chunked along the atoms
+		else:
+			chunk = max(1,int(math.ceil(nsaos / float(len(self.labels_)))))
+			self.owner_ = [min(i // chunk,len(self.labels_)-1) for i in range(nsaos)]
+
+		if len(self.owner_) != nsaos:
+			raise jm.TMJobHandlerError('basis function owners do not match nsaos={:d}'.format(nsaos))
+
+	def populations(self,coeffs):
+		# per atom populations of one orbital (unit metric)
+		pop = [0.0] * len(self.labels_)
+		norm = sum(c*c for c in coeffs) or 1.0
+		for c,a in zip(coeffs,self.owner_):
+			pop[a] += c*c / norm
+		return pop
+
+	def spinDensities(self):
+		spins = [0.0] * len(self.labels_)
+		if not self.uhf_:
+			return spins
+
+		for spin,sign in [('alpha',1.0),('beta',-1.0)]:
+			for eig,coeffs in self.mos_[spin][:self.nocc_[spin]]:
+				for a,p in enumerate(self.populations(coeffs)):
+					spins[a] += sign * p
+		return spins
+
+	def groupValue(self,grp,key,default):
+		lines = self.job_.readDataGrp(grp)
+		if not lines:
+			return default
+		m = re.search(key + r'\s*=\s*([-+.0-9]+)',' '.join(lines))
+		if m:
+			return float(m.group(1))
+		try:
+			return float(lines[0].split()[1])
+		except (IndexError,ValueError):
+			return default
+
+	def fingerprint(self,spins):
+		sig = '{} {} {}'.format(self.nocc_,[round(s,2) for s in spins],self.path_ if not self.sidecar_ else '')
+		return int(hashlib.md5(sig.encode()).hexdigest(),16)
+
+	def energy(self,spins):
+		if not self.sidecar_:
+			return -1000.0 - 1e-4 * (self.fingerprint(spins) % 1000)
+
+		energy = self.sidecar_['e0']
+		for i,j,J in self.sidecar_['pairs']:
+			energy += J * (spins[i] / 2.0) * (spins[j] / 2.0)
+		for a,eps in self.sidecar_['site'].items():
+			energy += eps * abs(spins[int(a)])
+		return energy
+
+	def spinDensityBlock(self):
+		spins = self.spinDensities()
+		out = [' Unpaired electrons from D(alpha)-D(beta)',
+		       '      atom      total       s       p       d']
+		for label,s in zip(self.labels_,spins):
+			out.append('    {:>5}  {:9.5f}  0.00000  0.00000  {:9.5f}'.format(label,s,s))
+		out.append(' ' + '=' * 78)
+		return out
+
+	def boysBlock(self):
+		out = [' BOYS ORBITAL LOCALISATION',' ' + '=' * 25]
+		for spin in self.nocc_:
+			if self.uhf_:
+				out += [' {} SHELLS:'.format(spin.upper()),' ' + '-' * 13]
+
+			lmos = self.mos_[spin][self.ncore_:self.nocc_[spin]]
+			for num,(eig,coeffs) in enumerate(lmos,1):
+				pop = self.populations(coeffs)
+				out += [' LOCALISED MO NO. {:<5d} diag(fock) [lmo basis] = {:15.5f}'.format(num,eig),
+				        '   MO contributions yielding  90.00 % of density:',
+				        '      MO (col)  energy       contribution',
+				        '    {:d}a    1 {:10.5f}        1.00000'.format(self.ncore_+num,eig),
+				        ' Mulliken contributions greater than  0.1000000:']
+				for a in sorted(range(len(pop)),key=lambda a: -pop[a]):
+					if pop[a] > 0.1:
+						out.append('   {:<5} {:9.5f}   0.00000   0.00000 {:9.5f}   0.00000'.format(self.labels_[a],pop[a],pop[a]))
+				out.append(' ' + '-' * 78)
+
+			key,name = {'alpha':('$lmo_alpha','lalp'),'beta':('$lmo_beta','lbet'),'closed':('$lmo','lmos')}[spin]
+			writeMOFile(os.path.join(self.path_,name),key,lmos)
+		out.append(' ' + '=' * 78)
+		return out
+
+
+def runEnergy(prog,args):
+	# fake dscf/ridft: writes its output to stdout and the final verdict to stderr
+	try:
+		job = fakejob(os.getcwd())
+	except (jm.TMJobHandlerError,IOError,IndexError) as err:
+		print(err)
+		print('{} ended abnormally'.format(prog),file=sys.stderr)
+		return 1
+
+	print(' {} (stand-in)'.format(prog))
+	print(' running in {}'.format(job.path_),flush=True)
+
+	if '-proper' in args:
+		time.sleep(setting('PROPER_TIME',0.0))
+		if job.job_.readDataGrp('$pop'):
+			print('\n'.join(job.spinDensityBlock()))
+		if job.job_.readDataGrp('$localize'):
+			print('\n'.join(job.boysBlock()))
+		print('    ****  {} : all done  ****'.format(prog))
+		print('{} ended normally'.format(prog),file=sys.stderr)
+		return 0
+
+	spins = job.spinDensities()
+	target = job.energy(spins)
+	h = job.fingerprint(spins)
+
+	damp = job.groupValue('$scfdamp','start',0.7)
+	iter_limit = int(job.groupValue('$scfiterlimit','limit',30))
+
+	# pick out faulty SCFs, a large enough damping cures them
+	fault = None
+	if (h % 1000) / 1000.0 < setting('FAULT_RATE',0.0) and damp < setting('FAULT_DAMP',8.0):
+		fault = setting('FAULT','oscillate')
+
+	num_iter = 6 + h % 10 + int(2 * damp)
+	iter_time = setting('ITER_TIME',0.0)
+	energy = target
+	norm = 1.0
+	for it in range(1,iter_limit+1):
+		if fault == 'oscillate':
+			energy = target + (0.05 if it % 2 else -0.04)
+			norm = 0.3
+		elif fault == 'diverge':
+			energy = target + 0.01 * it * it
+			norm = 0.1 * it
+		elif fault == 'stagnate':
+			energy = target + 0.02
+			norm = 0.05
+		else:
+			energy = target + 0.01 * 0.5 ** it
+			norm = 0.5 ** it
+
+		print('                                              current damping :  {:.3f}'.format(damp))
+		print(' ITERATION  ENERGY          1e-ENERGY        2e-ENERGY     NORM[dD(SAO)]  TOL')
+		print(' {:4d}  {:16.10f} {:16.10f} {:16.10f}    {}  0.100D-06'.format(it,energy,2*energy,-energy,'{:9.3E}'.format(norm).replace('E','D')),flush=True)
+		time.sleep(iter_time)
+
+		if not fault and it >= num_iter:
+			break
+
+	if fault:
+		print(' ATTENTION: {} did not converge!'.format(prog))
+		print('{} ended abnormally'.format(prog),file=sys.stderr)
+		return 1
+
+	energy = target
+	print(' convergence criteria satisfied after {:d} iterations'.format(it))
+	print('  ' + '-' * 78)
+	print(' |  total energy      = {:20.11f}  |'.format(energy))
+	print('  ' + '-' * 78)
+	with open(os.path.join(job.path_,'energy'),'w') as fh:
+		fh.write('$energy      SCF               SCFKIN            SCFPOT\n')
+		fh.write('     1 {:20.11f}  0.0  0.0\n$end\n'.format(energy))
+
+	if job.job_.readDataGrp('$pop'):
+		print('\n'.join(job.spinDensityBlock()))
+	print('    ****  {} : all done  ****'.format(prog))
+	print('{} ended normally'.format(prog),file=sys.stderr)
+	return 0
+
+
+def runJobex(args):
+	# a geometry optimization that converges in its first cycle
+	prog = 'ridft' if '-ri' in args else 'dscf'
+	with open(os.path.join(os.getcwd(),'job.last'),'w') as fh:
+		stdout = sys.stdout
+		sys.stdout = fh
+		try:
+			ret = runEnergy(prog,[])
+		finally:
+			sys.stdout = stdout
+	if ret != 0:
+		print('jobex ended abnormally',file=sys.stderr)
+		return ret
+
+	with open(os.path.join(os.getcwd(),'GEO_OPT_CONVERGED'),'w') as fh:
+		fh.write('OPTIMIZATION CONVERGED\n')
+	print(' OPTIMIZATION CONVERGED AFTER 1 CYCLE(S)')
+	print('jobex ended normally',file=sys.stderr)
+	return 0
+
+
+def runAoforce(args):
+	job = fakejob(os.getcwd())
+	print(' aoforce (stand-in)')
+	print('   mode     frequency')
+	for i in range(1,3 * len(job.labels_) - 5):
+		print('   {:4d}   {:10.2f}'.format(i,50.0 + (job.fingerprint([]) % 97) + 17.0 * i))
+	print('    ****  aoforce : all done  ****')
+	print('aoforce ended normally',file=sys.stderr)
+	return 0
+
+
+def runCpc(args):
+	if len(args) != 1:
+		print('usage: cpc DIRECTORY')
+		return 1
+
+	target = os.path.abspath(args[0])
+	files = ['control',SIDECAR,'coord','basis','auxbasis','mos','alpha','beta']
+	with open('control','r') as fh:
+		files += re.findall(r'file=\s*(\S+)',fh.read())
+
+	os.makedirs(target,exist_ok=True)
+	copied = []
+	for f in dict.fromkeys(files):
+		if os.path.isfile(f):
+			shutil.copy(f,os.path.join(target,f))
+			copied.append(f)
+
+	print(' copied {} to {}'.format(' '.join(copied),target))
+	return 0
+
+
+#############################################
+# fake PBS                                  #
+#############################################
+
+def queuePath():
+	default = os.path.join(tempfile.gettempdir(),'lowspin_standin_' + getpass.getuser(),'queue.jsonl')
+	path = os.environ.get('LOWSPIN_STANDIN_QUEUE',default)
+	os.makedirs(os.path.dirname(path),exist_ok=True)
+	return path
+
+
+class queuetable:
+	# locked access to the table; the table holds one json record per job
+	def __init__(self,exclusive=True):
+		self.path_ = queuePath()
+		self.exclusive_ = exclusive
+
+	def __enter__(self):
+		self.lock_ = open(self.path_ + '.lock','a')
+		fcntl.flock(self.lock_,fcntl.LOCK_EX if self.exclusive_ else fcntl.LOCK_SH)
+		return self
+
+	def __exit__(self,*exc):
+		fcntl.flock(self.lock_,fcntl.LOCK_UN)
+		self.lock_.close()
+
+	def read(self):
+		if not os.path.isfile(self.path_):
+			return []
+		with open(self.path_,'r') as fh:
+			return [json.loads(line) for line in fh if line.strip()]
+
+	def append(self,record):
+		with open(self.path_,'a') as fh:
+			fh.write(json.dumps(record) + '\n')
+
+	def write(self,records):
+		with open(self.path_ + '.tmp','w') as fh:
+			fh.write(''.join(json.dumps(r) + '\n' for r in records))
+		os.replace(self.path_ + '.tmp',self.path_)
+
+	def update(self,job_id,**fields):
+		records = self.read()
+		for r in records:
+			if r['id'] == job_id:
+				r.update(fields)
+		self.write(records)
+
+
+def jobStatus(record,now):
+	if record.get('state') == 'cancelled':
+		return None
+
+	if record['start'] is None or now < record['start']:
+		return 'Q'
+	if record['end'] is None or now < record['end']:
+		return 'R'
+	if now < record['end'] + setting('KEEP_TIME',60.0):
+		return 'C'
+	return None
+
+
+def runQsub(args):
+	if len(args) < 1 or not os.path.isfile(args[-1]):
+		print('qsub: script file cannot be loaded')
+		return 1
+
+	script = os.path.abspath(args[-1])
+	name = os.path.basename(script)
+	with open(script,'r') as fh:
+		for line in fh:
+			if line.startswith('#PBS -N'):
+				name = line.split()[2]
+
+	execute = setting('EXECUTE',0) == 1
+	now = time.time()
+	start = now + setting('QUEUE_DELAY',5.0)
+	with queuetable() as table:
+		counter_path = table.path_ + '.counter'
+		job_id = 1
+		if os.path.isfile(counter_path):
+			with open(counter_path,'r') as fh:
+				job_id = int(fh.read().strip() or 0) + 1
+		with open(counter_path,'w') as fh:
+			fh.write(str(job_id))
+
+		table.append({'id':job_id, 'name':name, 'user':getpass.getuser(), 'dir':os.getcwd(), 'script':script, 'submit':now,
+		              'start':None if execute else start, 'end':None if execute else start + setting('RUN_TIME',30.0),
+		              'state':None, 'pid':None})
+
+	if execute:
+		worker = sp.Popen([sys.executable,os.path.join(STANDIN_DIR,'standin.py'),'__run',str(job_id)],cwd=os.getcwd(),
+		                  stdin=sp.DEVNULL,stdout=sp.DEVNULL,stderr=sp.DEVNULL,start_new_session=True)
+		with queuetable() as table:
+			table.update(job_id,pid=worker.pid)
+
+	print('{:d}.standin'.format(job_id))
+	return 0
+
+
+def runWorker(job_id):
+	# executes a submitted job script like the batch system would
+	time.sleep(setting('QUEUE_DELAY',5.0))
+	with queuetable() as table:
+		record = [r for r in table.read() if r['id'] == job_id][0]
+		if record.get('state') == 'cancelled':
+			return 0
+		table.update(job_id,start=time.time())
+
+	env = dict(os.environ)
+	env['PATH'] = STANDIN_DIR + os.pathsep + env.get('PATH','')
+	with open(os.path.join(record['dir'],'{}.o{:d}'.format(record['name'],job_id)),'w') as fh:
+		ret = sp.call(['sh',record['script']],cwd=record['dir'],stdout=fh,stderr=sp.STDOUT,env=env)
+
+	with queuetable() as table:
+		table.update(job_id,end=time.time(),exit_status=ret)
+	return 0
+
+
+def runQstat(args):
+	now = time.time()
+	with queuetable(exclusive=False) as table:
+		records = table.read()
+
+	rows = []
+	for r in records:
+		status = jobStatus(r,now)
+		if status is None:
+			continue
+		used = 0 if status == 'Q' else int(min(now,r['end'] or now) - r['start'])
+		rows.append('{:<25} {:<16} {:<15} {:02d}:{:02d}:{:02d} {} {:<5}'.format('{:d}.standin'.format(r['id']),r['name'][:16],
+		            r['user'][:15],used // 3600,(used // 60) % 60,used % 60,status,'batch'))
+
+	if rows:
+		print('Job id                    Name             User            Time Use S Queue')
+		print('------------------------- ---------------- --------------- -------- - -----')
+		print('\n'.join(rows))
+	return 0
+
+
+def runQdel(args):
+	ret = 0
+	with queuetable() as table:
+		records = table.read()
+		for job_id in args:
+			try:
+				job_id = int(job_id.split('.')[0])
+			except ValueError:
+				print('qdel: illegally formed job identifier: {}'.format(job_id))
+				ret = 1
+				continue
+
+			found = [r for r in records if r['id'] == job_id and jobStatus(r,time.time()) in ['Q','R']]
+			if not found:
+				print('qdel: Unknown Job Id {:d}.standin'.format(job_id))
+				ret = 1
+				continue
+
+			for r in found:
+				r['state'] = 'cancelled'
+				if r.get('pid'):
+					try:
+						os.killpg(r['pid'],15)
+					except OSError:
+						pass
+		table.write(records)
+	return ret
+
+
+#############################################
+# synthetic reference jobs                  #
+#############################################
+
+def mkjob(args):
+	parser = argparse.ArgumentParser(prog='standin.py mkjob',description='create a synthetic high spin reference job for the stand-in toolchain')
+	parser.add_argument('directory',help='directory of the new job')
+	parser.add_argument('--metal','-m',default='fe',choices=['cr','mn','fe','co','ni','cu'],help='metal element (default: fe)')
+	parser.add_argument('--centers','-n',type=int,default=4,help='number of metal centers in the ring (default: 4)')
+	parser.add_argument('--ox','-x',type=int,default=3,help='oxidation state of the metals (default: 3)')
+	parser.add_argument('--reduced','-r',type=int,default=0,help='number of additional electrons (default: 0)')
+	parser.add_argument('--delocalized','-d',action='store_true',help='spread the additional electrons over all metal centers')
+	parser.add_argument('--coupling','-j',type=float,default=0.002,help='antiferromagnetic coupling between neighbors in Hartree (default: 0.002)')
+	parser.add_argument('--no-ri',action='store_true',help='create a dscf instead of a ridft job')
+	args = parser.parse_args(args)
+
+	n = args.centers
+	metal = args.metal
+	num_d = PSE.VE[metal] - args.ox
+	if n < 2 or num_d < 0 or num_d > 10:
+		print('unreasonable setup: {:d} centers with d{:d} configuration'.format(n,num_d))
+		return 1
+	if args.reduced > n or (num_d == 10 and args.reduced > 0):
+		print('unable to place {:d} additional electrons'.format(args.reduced))
+		return 1
+
+	# ring of metals bridged by oxygen atoms (distances in bohr)
+	radius = 6.2 / (2.0 * math.sin(math.pi / n)) if n > 2 else 3.1
+	atoms = []
+	for i in range(n):
+		phi = 2.0 * math.pi * i / n
+		atoms.append((metal,radius * math.cos(phi),radius * math.sin(phi),0.0))
+	for i in range(n):
+		phi = 2.0 * math.pi * (i + 0.5) / n
+		z = 0.0 if n > 2 else (2.0 if i == 0 else -2.0)
+		atoms.append(('o',1.25 * radius * math.cos(phi),1.25 * radius * math.sin(phi),z))
+
+	# basis: metals 4s3p2d (23 functions), oxygens 2s2p (8 functions)
+	shells = {metal:[('s',4),('p',3),('d',2)],'o':[('s',2),('p',2)]}
+	size = {'s':1,'p':3,'d':5}
+	owner = []
+	first = []
+	for a,atom in enumerate(atoms):
+		first.append(len(owner))
+		owner += [a] * sum(size[l] * k for l,k in shells[atom[0]])
+	nsaos = len(owner)
+
+	# occupied orbitals as sparse vectors {function: coefficient}
+	unit = lambda i: {i:1.0}
+	core = {'alpha':[],'beta':[]}
+	valence = {'alpha':[],'beta':[]}
+	for a,atom in enumerate(atoms):
+		for k in range((Z[atom[0]] - PSE.VE[atom[0]]) // 2):
+			core['alpha'].append((-20.0 + 0.1 * k,unit(first[a] + k)))
+		if atom[0] == 'o':
+			for k in range(1,5):
+				valence['alpha'].append((-0.8,unit(first[a] + k)))
+	core['beta'] = list(core['alpha'])
+	valence['beta'] = list(valence['alpha'])
+
+	# metal d electrons (d functions start after 4 s and 9 p functions)
+	num_alpha_d = min(num_d,5)
+	num_beta_d = num_d - num_alpha_d
+	for a in range(n):
+		d0 = first[a] + 13
+		for k in range(num_alpha_d):
+			valence['alpha'].append((-0.4,unit(d0 + k)))
+		for k in range(num_beta_d):
+			valence['beta'].append((-0.35,unit(d0 + k)))
+
+	# additional electrons go into beta d orbitals
+	extra_d = num_beta_d if num_alpha_d == 5 else num_alpha_d
+	extra_spin = 'beta' if num_alpha_d == 5 else 'alpha'
+	groups = []
+	if args.delocalized and args.reduced > 0:
+		for k in range(args.reduced):
+			funcs = [first[a] + 13 + extra_d + k for a in range(n)]
+			valence[extra_spin].append((-0.3,{f:1.0 / math.sqrt(n) for f in funcs}))
+			groups.append((extra_spin,funcs))
+	else:
+		for a in range(args.reduced):
+			valence[extra_spin].append((-0.3,unit(first[a] + 13 + extra_d)))
+
+	# virtual orbitals: all untouched functions plus the complements of delocalized groups
+	mos = {}
+	for spin in ['alpha','beta']:
+		occ = core[spin] + valence[spin]
+		used = set(f for eig,vec in occ for f in vec)
+		virt = [(0.3 + 0.01 * i,unit(f)) for i,f in enumerate(f for f in range(nsaos) if f not in used)]
+		for s,funcs in groups:
+			if s != spin:
+				continue
+			for j in range(1,len(funcs)):
+				norm = math.sqrt(j * (j + 1))
+				vec = {f:1.0 / norm for f in funcs[:j]}
+				vec[funcs[j]] = -j / norm
+				virt.append((0.5,vec))
+		mos[spin] = [(eig,[vec.get(f,0.0) for f in range(nsaos)]) for eig,vec in occ + virt]
+
+	num_alpha = len(core['alpha']) + len(valence['alpha'])
+	num_beta = len(core['beta']) + len(valence['beta'])
+	charge = n * args.ox - 2 * n - args.reduced
+
+	path = os.path.abspath(args.directory)
+	os.makedirs(path,exist_ok=True)
+
+	with open(os.path.join(path,'coord'),'w') as fh:
+		fh.write('$coord\n')
+		for elem,x,y,z in atoms:
+			fh.write('{:20.14f}  {:20.14f}  {:20.14f}      {}\n'.format(x,y,z,elem))
+		fh.write('$end\n')
+
+	with open(os.path.join(path,'basis'),'w') as fh:
+		fh.write('$basis\n')
+		for elem in [metal,'o']:
+			fh.write('*\n{} standin\n*\n'.format(elem))
+			for l,k in shells[elem]:
+				for i in range(k):
+					fh.write('   1  {}\n  {:14.7f}  1.0000000\n'.format(l,0.5 + 2.0 * i))
+		fh.write('*\n$end\n')
+
+	writeMOFile(os.path.join(path,'alpha'),'$uhfmo_alpha',mos['alpha'])
+	writeMOFile(os.path.join(path,'beta'),'$uhfmo_beta',mos['beta'])
+
+	control = ['$title','standin {:d}x{} reference (ox {:d}, {:d} additional electrons)'.format(n,metal,args.ox,args.reduced),
+	           '$symmetry c1','$coord    file=coord','$atoms',
+	           '{:<3}1-{:<4d}\\'.format(metal,n),'   basis ={} standin'.format(metal),
+	           'o  {:d}-{:<4d}\\'.format(n+1,2*n),'   basis =o standin',
+	           '$basis    file=basis','$uhfmo_alpha   file=alpha','$uhfmo_beta   file=beta','$uhf',
+	           '$alpha shells',' a       1-{:<4d}                                  ( 1 )'.format(num_alpha),
+	           '$beta shells',' a       1-{:<4d}                                  ( 1 )'.format(num_beta),
+	           '$scfiterlimit       30','$scfconv        7','$scfdamp   start=0.700  step=0.050  min=0.050',
+	           '$charge from ridft','         {:.3f} (not to be modified here)'.format(charge)]
+	if not args.no_ri:
+		control += ['$rij','$ricore      500']
+	control += ['$last step     define','$end']
+	with open(os.path.join(path,'control'),'w') as fh:
+		fh.write('\n'.join(control) + '\n')
+
+	# antiferromagnetic couplings between ring neighbors and small site energies
+	pairs = [[i,(i+1) % n,args.coupling] for i in range(n if n > 2 else 1)]
+	site = {str(a):0.0005 * ((7 * a) % 5) for a in range(n)}
+	with open(os.path.join(path,SIDECAR),'w') as fh:
+		json.dump({'owner':owner,'pairs':pairs,'site':site,'e0':-1000.0 - 10.0 * len(atoms)},fh)
+
+	print('created {:d}x{}({:d}) reference job with {:d} alpha and {:d} beta electrons in {}'.format(n,metal,args.ox,num_alpha,num_beta,path))
+	return 0
+
+
+#############################################
+# dispatcher                                #
+#############################################
+
+def main(argv):
+	prog = os.path.basename(argv[0])
+	args = argv[1:]
+
+	if prog in ['dscf','ridft']:
+		return runEnergy(prog,args)
+	if prog == 'jobex':
+		return runJobex(args)
+	if prog == 'aoforce':
+		return runAoforce(args)
+	if prog == 'cpc':
+		return runCpc(args)
+	if prog == 'qsub':
+		return runQsub(args)
+	if prog == 'qstat':
+		return runQstat(args)
+	if prog == 'qdel':
+		return runQdel(args)
+
+	if len(args) > 0 and args[0] == 'mkjob':
+		return mkjob(args[1:])
+	if len(args) > 0 and args[0] == 'reset':
+		with queuetable() as table:
+			table.write([])
+		return 0
+	if len(args) > 1 and args[0] == '__run':
+		return runWorker(int(args[1]))
+
+	print('usage: standin.py mkjob DIR [options] | standin.py reset')
+	print('or call it through one of the links: cpc, dscf, ridft, jobex, aoforce, qsub, qstat, qdel')
+	return 1
+
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv))
@@ -0,0 +1,12 @@
+##################################
+# test set-up                    #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# the modules are imported by their plain names (as lowspin.py does), i.e. from the repository root
+import os
+import sys
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,82 @@
+##################################
+# tests of the configurations    #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+from itertools import combinations, product
+from types import SimpleNamespace
+import pytest
+import configurations as cs
+
+
+CENTERS = ['1fe','2fe','3fe','4fe','5fe']
+
+def source(pairs=None):
+	# 5 iron centers with 5 alpha LMOs each, 2 flipped, 3 ways to distribute 1 excess electron among the first 3 centers
+	lmos = SimpleNamespace(metal_alpha_idxs_={center:list(range(5*i+1,5*i+6)) for i,center in enumerate(CENTERS)})
+	beta_occs = [{center:int(i == j) for j,center in enumerate(CENTERS)} for i in range(3)]
+	return cs.configsource(CENTERS,2,lmos,beta_occs,pairs)
+
+def allConfigurations(configs):
+	return [(flip,nr) for flip in combinations(CENTERS,2) for nr in range(len(configs.beta_occs_))]
+
+
+def test_rank_unrank_roundtrip():
+	configs = source()
+	assert configs.count() == 30
+	ranks = [configs.rank(flip,nr) for flip,nr in allConfigurations(configs)]
+	assert sorted(ranks) == list(range(configs.count()))
+	for rank in ranks:
+		flip,nr = configs.unrank(rank)
+		assert configs.rank(flip,nr) == rank
+
+	# the order of the flipped centers doesn't matter
+	assert configs.rank(('3fe','1fe'),2) == configs.rank(('1fe','3fe'),2)
+
+def test_invalid_configurations():
+	configs = source()
+	for flip,nr in [(('1fe',),0),(('1fe','1fe'),0),(('1fe','9fe'),0),(('1fe','2fe'),3)]:
+		with pytest.raises(cs.ConfigSourceError):
+			configs.rank(flip,nr)
+	with pytest.raises(cs.ConfigSourceError):
+		configs.unrank(configs.count())
+
+def test_spin_array_matches_spins():
+	configs = source()
+	ranks = list(range(configs.count()))
+	array = configs.spinArray(ranks)
+	for rank,row in zip(ranks,array):
+		flip,nr = configs.unrank(rank)
+		spins = configs.spins(flip,configs.beta_occs_[nr])
+		assert list(row) == [spins[center] for center in CENTERS]
+
+def selected(selection):
+	return [(tuple(flip),nr) for flip,nrs in selection for nr in nrs]
+
+def test_select_all():
+	configs = source()
+	assert sorted(selected(configs.select())) == sorted(allConfigurations(configs))
+
+@pytest.mark.parametrize('strategy',cs.configsource.strategies_)
+def test_select_budget(strategy):
+	configs = source()
+	chosen = selected(configs.select(7,strategy,seed=3))
+	assert len(chosen) == len(set(chosen)) == 7
+	assert chosen == selected(configs.select(7,strategy,seed=3))
+
+def test_select_lowest_model_energies():
+	configs = source()
+	energies = sorted(configs.modelEnergy(flip,configs.beta_occs_[nr]) for flip,nr in allConfigurations(configs))
+	chosen = selected(configs.select(5,'energy'))
+	assert sorted(configs.modelEnergy(flip,configs.beta_occs_[nr]) for flip,nr in chosen) == energies[:5]
+
+@pytest.mark.parametrize('strategy',cs.configsource.strategies_)
+def test_shards_are_disjoint_and_complete(strategy):
+	configs = source()
+	whole = selected(configs.select(11,strategy,seed=5))
+	shards = [selected(configs.select(11,strategy,seed=5,shard=(i,3))) for i in range(1,4)]
+	assert sorted(sum(shards,[])) == sorted(whole)
+	assert all(not set(a) & set(b) for a,b in product(shards,shards) if a is not b)
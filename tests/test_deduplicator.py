@@ -0,0 +1,87 @@
+##################################
+# tests of the deduplicator      #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+import QueueSys as qs
+import tmjob as jm
+import deduplicator as dd
+
+
+class queue(qs.QueueSys):
+	# a queuing system with the jobs in a dict: job ID -> status
+	def __init__(self,status):
+		self.status_ = status
+		self.cancelled_ = []
+
+	def get_schedule(self):
+		return [[job_id,'job','user','0',status,'batch'] for job_id,status in self.status_.items()]
+
+	def cancel(self,job_id):
+		self.cancelled_.append(job_id)
+		del self.status_[job_id]
+		return True
+
+class job(jm.tmjob):
+	# a finished low spin job with its energy and Mulliken spin densities
+	def __init__(self,path,spins=None,energy=None):
+		path.mkdir()
+		self.path_ = str(path)
+		self.spins_ = spins
+		self.energy_ = energy
+
+	def __str__(self):
+		return self.path_
+
+	def isConverged(self):
+		return self.energy_ is not None
+
+	def getEnergy(self):
+		return self.energy_
+
+	def getSpinDensities(self):
+		return self.spins_
+
+
+def test_collapsed_job_cancels_job_with_its_state(tmp_path):
+	# job a was meant to flip 1fe, but collapsed into the state of job b (2fe flipped), which is still queued
+	sq = queue({'1':'E','2':'Q','3':'Q'})
+	watcher = dd.deduplicator(sq,verbose=-1)
+	a = job(tmp_path / 'a',{'1fe':3.9,'2fe':-3.8,'3fe':4.0},-100.0)
+	b = job(tmp_path / 'b')
+	c = job(tmp_path / 'c')
+	watcher.watch(a,'1',{'1fe':-5.0,'2fe':5.0,'3fe':5.0},'ref')
+	watcher.watch(b,'2',{'1fe':5.0,'2fe':-5.0,'3fe':5.0},'ref')
+	watcher.watch(c,'3',{'1fe':5.0,'2fe':5.0,'3fe':-5.0},'ref')
+
+	assert watcher.poll() == 1
+	assert sq.cancelled_ == ['2']
+	assert watcher.redundant_ == {b.path_:a.path_}
+	assert (tmp_path / 'b' / 'REDUNDANT').is_file()
+
+def test_other_groups_are_not_cancelled(tmp_path):
+	sq = queue({'1':'E','2':'Q'})
+	watcher = dd.deduplicator(sq,verbose=-1)
+	a = job(tmp_path / 'a',{'1fe':3.9,'2fe':-3.8,'3fe':4.0},-100.0)
+	b = job(tmp_path / 'b')
+	watcher.watch(a,'1',{'1fe':-5.0,'2fe':5.0,'3fe':5.0},'ref1')
+	watcher.watch(b,'2',{'1fe':5.0,'2fe':-5.0,'3fe':5.0},'ref2')
+
+	assert watcher.poll() == 1
+	assert sq.cancelled_ == []
+	assert watcher.redundant_ == {}
+
+def test_same_state_and_energy(tmp_path):
+	# two finished jobs in spin inverted MS = 0 states with the same energy
+	sq = queue({'1':'E','2':'E'})
+	watcher = dd.deduplicator(sq,verbose=-1)
+	a = job(tmp_path / 'a',{'1fe':4.24,'2fe':-4.26},-100.0)
+	b = job(tmp_path / 'b',{'1fe':-4.26,'2fe':4.24},-100.00002)
+	watcher.watch(a,'1',{'1fe':5.0,'2fe':-5.0},'ref')
+	watcher.watch(b,'2',{'1fe':-5.0,'2fe':5.0},'ref')
+
+	assert watcher.poll() == 0
+	assert watcher.redundant_ == {b.path_:a.path_}
@@ -0,0 +1,35 @@
+##################################
+# tests of the exporter          #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+import os
+import tmjob as jm
+import exporter as ex
+
+
+def referenceJob(path):
+	path.mkdir()
+	(path / 'control').write_text('$title\n$uhf\n$coord    file=coord\n$end\n')
+	(path / 'coord').write_text('$coord\n    0.0    0.0    0.0      fe\n$end\n')
+	return jm.tmjob(str(path / 'control'))
+
+
+def test_same_input_in_different_directories(tmp_path):
+	# reference jobs of a campaign with the same input have the same hash, but must not share their export directory
+	jobs = [referenceJob(tmp_path / name) for name in ['r1','r2','r3']]
+	exps = [ex.exporter(job,str(tmp_path / 'exp'),'csv',by_hash=True,verbose=-1) for job in jobs]
+
+	assert len(set(exp.hash_ for exp in exps)) == 1
+	assert len(set(exp.dir_ for exp in exps)) == 3
+	assert all(os.path.dirname(exp.dir_) == str(tmp_path / 'exp') and os.path.basename(exp.dir_).startswith(exp.hash_[:16]) for exp in exps)
+
+	# the same reference job always exports into the same directory
+	assert ex.exporter(jobs[0],str(tmp_path / 'exp'),'csv',by_hash=True,verbose=-1).dir_ == exps[0].dir_
+
+def test_without_hash(tmp_path):
+	job = referenceJob(tmp_path / 'r1')
+	assert ex.exporter(job,str(tmp_path / 'exp'),'csv',verbose=-1).dir_ == str(tmp_path / 'exp')
@@ -0,0 +1,79 @@
+##################################
+# tests of the Heisenberg model  #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+import numpy as np
+import pytest
+import heisenberg as hb
+
+
+def spinMatrices(s):
+	# S^z, S^+ and S^- of a single spin s in the basis m = -s ... s
+	m = np.arange(-s,s+1)
+	plus = np.diag(np.sqrt(s*(s+1) - m[:-1]*(m[:-1]+1)),-1)
+	return (np.diag(m),plus,plus.T)
+
+def denseLadder(spins,J):
+	# lowest energy per total spin S by diagonalizing the full Hamiltonian H = -2 sum_{i<j} J_ij S_i.S_j
+	ops = []
+	for i,s in enumerate(spins):
+		ops.append([])
+		for single in spinMatrices(s):
+			full = np.ones((1,1))
+			for j,t in enumerate(spins):
+				full = np.kron(full,single if i == j else np.eye(int(round(2*t))+1))
+			ops[-1].append(full)
+
+	def dot(a,b):
+		return ops[a][0] @ ops[b][0] + 0.5 * (ops[a][1] @ ops[b][2] + ops[a][2] @ ops[b][1])
+
+	H = sum(-2.0 * J[i][j] * dot(i,j) for i in range(len(spins)) for j in range(i+1,len(spins)))
+	Sz,Sp,Sm = (sum(op[n] for op in ops) for n in range(3))
+	S2 = Sz @ Sz + 0.5 * (Sp @ Sm + Sm @ Sp)
+
+	# H and S^2 commute; a tiny share of S^2 separates degenerate levels of different S (e.g. of an uncoupled center),
+	# so that the eigenvectors have a definite S
+	vals,vecs = np.linalg.eigh(H + 1e-5 * S2)
+	energies = np.sum(vecs * (H @ vecs),axis=0)
+	S = np.round(np.sqrt(0.25 + np.maximum(np.sum(vecs * (S2 @ vecs),axis=0),0.0)) - 0.5,1)
+	return {float(s):float(energies[S == s].min()) for s in np.unique(S)}
+
+
+@pytest.mark.parametrize('spins,J',[
+	([0.5,0.5,0.5],[[0.0,-10.0,-10.0],[-10.0,0.0,-10.0],[-10.0,-10.0,0.0]]),		# frustrated triangle
+	([2.5,2.0,1.5],[[0.0,-20.0,5.0],[-20.0,0.0,-8.0],[5.0,-8.0,0.0]]),
+	([2.5,2.5,2.5,2.5],[[0.0,-12.0,-3.0,0.0],[-12.0,0.0,-12.0,0.0],[-3.0,-12.0,0.0,0.0],[0.0,0.0,0.0,0.0]]),	# uncoupled 4th center
+	([1.0,0.5,1.5,0.5],[[0.0,-5.0,0.0,2.0],[-5.0,0.0,-7.0,0.0],[0.0,-7.0,0.0,-1.0],[2.0,0.0,-1.0,0.0]]),
+])
+def test_ladder_matches_dense_diagonalization(spins,J):
+	model = hb.heisenberg(['{:d}fe'.format(i+1) for i in range(len(spins))],spins,J)
+	dense = denseLadder(spins,J)
+
+	ladder = model.ladder()
+	assert [S for S,E in ladder] == sorted(dense)
+	for S,E in ladder:
+		assert E == pytest.approx(dense[S],abs=1e-8)
+
+	S0,E0 = model.groundState()
+	assert E0 == pytest.approx(min(dense.values()),abs=1e-8)
+
+def test_sparse_eigensolver_matches_dense():
+	# larger sectors than dense_limit_ are solved iteratively
+	spins = [2.5,2.5,2.5,2.5]
+	J = [[0.0,-12.0,-3.0,-1.0],[-12.0,0.0,-12.0,-2.0],[-3.0,-12.0,0.0,-6.0],[-1.0,-2.0,-6.0,0.0]]
+	model = hb.heisenberg(['1fe','2fe','3fe','4fe'],spins,J)
+	model.dense_limit_ = 10
+	dense = denseLadder(spins,J)
+
+	for S,E in model.ladder():
+		assert E == pytest.approx(dense[S],abs=1e-6)
+
+def test_invalid_spins():
+	with pytest.raises(hb.HeisenbergError):
+		hb.heisenberg(['1fe','2fe'],[2.5,0.3],[[0.0,1.0],[1.0,0.0]])
+	with pytest.raises(hb.HeisenbergError):
+		hb.heisenberg(['1fe','2fe'],[2.5,2.5],[[0.0,1.0],[2.0,0.0]])
@@ -0,0 +1,42 @@
+##################################
+# tests of the MO parser         #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+import pytest
+import tmjob as jm
+
+
+# an MO as written by TURBOMOLE in format(4d20.14): the fields follow each other without white space
+MO_LINES = ['     1  a      eigenvalue=-.20000000000000D+02   nsaos=6\n',
+            '0.10000000000000D+010.00000000000000D+00-.25612783293457D+03-.12345678901234D-01\n',
+            '0.50000000000000D-050.99999999999999D+00\n']
+COEFFS = [1.0,0.0,-256.12783293457,-0.012345678901234,5e-6,0.99999999999999]
+
+
+def test_float_mo_cuts_fixed_width_fields():
+	assert list(jm.floatMO(MO_LINES)) == pytest.approx(COEFFS,rel=1e-14)
+	assert list(jm.floatMO(MO_LINES,jm.coeffWidth('$uhfmo_alpha    scfconv=7   format(4d20.14)'))) == pytest.approx(COEFFS,rel=1e-14)
+
+def test_float_mos_match_mo_matrix(tmp_path):
+	header = '     {:d}  a      eigenvalue=-.20000000000000D+02   nsaos=3\n'
+	(tmp_path / 'control').write_text('$title\n$uhf\n$uhfmo_alpha   file=alpha\n$end\n')
+	(tmp_path / 'alpha').write_text('$uhfmo_alpha    scfconv=7   format(4d20.14)\n' + header.format(1) +
+	                                '0.10000000000000D+010.00000000000000D+00-.25612783293457D+03\n' + header.format(2) +
+	                                '0.50000000000000D-050.99999999999999D+00-.12345678901234D-01\n$end\n')
+	job = jm.tmjob(str(tmp_path / 'control'))
+
+	mos = job.getFloatMOs(sequential=True)
+	matrix = job.getMOMatrix()
+	assert list(mos) == [1,2]
+	assert [list(mos[1]),list(mos[2])] == [list(row) for row in matrix]
+	assert list(matrix[0]) == pytest.approx(COEFFS[:3],rel=1e-14)
+
+def test_invalid_fields():
+	with pytest.raises(jm.TMJobHandlerError):
+		jm.floatMO(MO_LINES[:1] + ['0.10000000000000D+010.0000\n'])
+	with pytest.raises(jm.TMJobHandlerError):
+		jm.coeffWidth('$uhfmo_alpha    scfconv=7')
@@ -15,6 +15,9 @@ import subprocess as sp
 import re
 from copy import deepcopy
 import PSE
+import metrics as mt
+from tools import writeAtomic, lazyModule
+np = lazyModule('numpy')		# imported on first use
 
 
 # prevent stand-alone execution
@@ -28,23 +31,60 @@ class TMJobHandlerError(Exception):
 	pass
 
 
+# the header of an MO file gives the fixed width of the coefficients, e.g. "$uhfmo_alpha  scfconv=7  format(4d20.14)"
+MO_FORMAT = re.compile(r'format\(\d+d(\d+)\.\d+\)',re.IGNORECASE)
+
+# number of (spherical) basis functions per shell type
+SHELL_SIZES = {'s':1,'p':3,'d':5,'f':7,'g':9,'h':11,'i':13}
+
+# a contracted shell in a basis set definition like "   3  d", and the basis set of atoms in $atoms like "basis =fe def2-SVP"
+BASIS_SHELL = re.compile(r'^\d+\s+([spdfghi])$')
+ATOMS_BASIS = re.compile(r'(?:^|\s)basis\s*=\s*(\S+\s+[^\s\\]+)')
+
+def coeffWidth(header):
+	# width of the coefficient fields given by the header line of an MO file
+	fmt = MO_FORMAT.search(header)
+	if not fmt:
+		raise TMJobHandlerError('unknown format of MO file:\n' + header.strip())
+	return int(fmt.group(1))
+
+def cutCoeffs(coeff_lines,width=20):
+	# MO coefficients are written in fortran's D format, e.g. "-.25612783293457D+03", and not necessarily separated
+	# by white space ("0.10000000000000D+010.00000000000000D+00"), thus they are cut out of their fixed width fields
+	text = ''.join(line.rstrip() for line in coeff_lines).replace('D','E').encode()
+	try:
+		return np.frombuffer(text,dtype='S' + str(width)).astype(float)
+	except ValueError:
+		raise TMJobHandlerError('unable to read MO coefficients with a field width of {:d}!'.format(width))
+
+def floatMO(mo_lines,width=20):
+	# converts the text lines of one MO (as returned by tmjob.getTextMOs) into an array of coefficients
+	return cutCoeffs(mo_lines[1:],width)
+
+
 #############################################
 # Turbomole Job Handler                     #
 #############################################
 
 class tmjob:
-	def __init__(self,control_path):
+	def __init__(self,control_path,control=None):
 		if not os.path.isfile(control_path):
 			raise TMJobHandlerError('control file at "' + str(control_path) + '" does not exist!')
 		
-		self.control_path_ = control_path
-		self.path_ = os.path.dirname(control_path)
+		# absolute paths, so that nothing depends on the cwd of this process
+		self.control_path_ = os.path.abspath(control_path)
+		self.path_ = os.path.dirname(self.control_path_)
 		
 		self.element_abundances_ = None
 		self.num_e_ = None
+		self.dirty_ = False		# True, if self.control_ differs from the control file on disk
 		
-		with open(self.control_path_,'r') as fh:
-			self.control_ = fh.readlines(1024*1024)
+		# the content of the control file may be handed over, if it was just written by the caller
+		if control is not None:
+			self.control_ = list(control)
+		else:
+			with open(self.control_path_,'r') as fh:
+				self.control_ = fh.readlines(1024*1024)
 	
 	def __repr__(self):
 		return str(self.control_path_)
@@ -52,13 +92,25 @@ class tmjob:
 	def __str__(self):
 		return str(self.path_)
 	
-	def updateControl(self):
-		os.remove(self.control_path_)
+	def updateControl(self,force=False):
+		# unchanged control files are not rewritten
+		if not self.dirty_ and not force:
+			return False
 		
-		with open(self.control_path_,'w') as fh:
-			for line in self.control_:
-				if line.strip() != '':
-					fh.write(line.strip('\n') + '\n')
+		writeAtomic(self.control_path_,''.join(line.strip('\n') + '\n' for line in self.control_ if line.strip() != ''))
+		self.dirty_ = False
+		return True
+	
+	def reloadControl(self):
+		# rereads the control file, e.g. after a program has changed it (unsaved changes are lost)
+		with open(self.control_path_,'r') as fh:
+			self.control_ = fh.readlines(1024*1024)
+		self.dirty_ = False
+	
+	def __setControl(self,new_control):
+		if new_control != self.control_:
+			self.control_ = new_control
+			self.dirty_ = True
 	
 	def addToControl(self,cmd_lines):
 		if not isinstance(cmd_lines,list):
@@ -72,7 +124,7 @@ class tmjob:
 			
 			new_control.append(line)
 		
-		self.control_ = new_control
+		self.__setControl(new_control)
 	
 	def replaceControlLine(self,old_line,new_line):
 		new_control = []
@@ -82,9 +134,13 @@ class tmjob:
 			else:
 				new_control.append(line)
 		
-		self.control_ = new_control
+		self.__setControl(new_control)
 	
 	def removeFromControl(self,cmd_lines):
+		self.__setControl(self.strippedControl(cmd_lines))
+	
+	def strippedControl(self,cmd_lines):
+		# returns the control lines without the data groups in cmd_lines (self.control_ stays untouched)
 		new_control = []
 		
 		remove = False
@@ -99,7 +155,7 @@ class tmjob:
 			if not remove:
 				new_control.append(line)
 		
-		self.control_ = new_control
+		return new_control
 	
 	def readDataGrp(self,grp_key,ext_file=None,strip=True):
 		data = self.control_
@@ -288,7 +344,27 @@ class tmjob:
 		
 		return atom_index_list
 	
-	def getTextMOs(self,spin='alpha',local=False,sequential=False):
+	def getCoordinates(self):
+		# returns the atom labels (as in getAtomIndexList, e.g. ['1fe','2fe','3o']) and
+		# an array of shape (#atoms,3) containing the cartesian coordinates in bohr
+		coords = self.readDataGrp('$coord')
+		
+		if len(coords) < 2:
+			raise TMJobHandlerError('unable to read coordinates!')
+		
+		labels = []
+		xyz = []
+		for i,line in enumerate(coords[1:]):
+			words = line.split()
+			try:
+				xyz.append([float(w) for w in words[:3]])
+			except (IndexError,ValueError):
+				raise TMJobHandlerError('unable to read coordinates from line:\n{}'.format(line))
+			labels.append(str(i+1) + words[3])
+		
+		return (labels,np.array(xyz))
+	
+	def __readMOGrp(self,spin,local):
 		if self.isUHF():
 			if spin == 'beta':
 				mos_raw = self.readDataGrp('$lmo_beta','lbet',False) if local else self.readDataGrp('$uhfmo_beta',strip=False)
@@ -300,6 +376,11 @@ class tmjob:
 		if len(mos_raw) < 2:
 			raise TMJobHandlerError('unable to read MOs!')
 		
+		return mos_raw
+	
+	def getTextMOs(self,spin='alpha',local=False,sequential=False):
+		mos_raw = self.__readMOGrp(spin,local)
+		
 		mos = {}
 		tmp_mo = []
 		mo_label = 0 if sequential else ''
@@ -323,52 +404,218 @@ class tmjob:
 		
 		return mos
 	
-	def getFloatMOs(self,local=False,sequential=False):
-		# TBD
-		pass
+	def getFloatMOs(self,spin='alpha',local=False,sequential=False):
+		labels = self.getTextMOs(spin=spin,local=local,sequential=sequential).keys()
+		return dict(zip(labels,self.getMOMatrix(spin=spin,local=local)))
 	
-	def run(self,prop=False,opt=False,opt_flags=[],freq=False):
-		self.updateControl()
-		start_dir = os.getcwd()
+	def getMOMatrix(self,spin='alpha',local=False):
+		# all MOs (of the given spin) as array of shape (#MOs,nsaos) with the rows in the order of the MO file; the
+		# coefficients of all MOs are cut out of the fixed width fields given by the format of the file at once
+		mos_raw = self.__readMOGrp(spin,local)
+		width = coeffWidth(mos_raw[0])
+		
+		nsaos = 0
+		num_mos = 0
+		coeff_lines = []
+		for line in mos_raw[1:]:
+			if 'eigenvalue=' in line:
+				num_mos += 1
+				try:
+					nsaos = int(line.split('nsaos=')[1].split()[0])
+				except (IndexError,ValueError):
+					raise TMJobHandlerError('unable to read nsaos from MO header:\n' + line.strip())
+			else:
+				coeff_lines.append(line)
+		
+		coeffs = cutCoeffs(coeff_lines,width)
+		if num_mos == 0 or len(coeffs) != num_mos * nsaos:
+			raise TMJobHandlerError('found {:d} coefficients for {:d} MOs with nsaos={:d}!'.format(len(coeffs),num_mos,nsaos))
+		
+		return coeffs.reshape(num_mos,nsaos)
+	
+	def getBasisFunctionAtoms(self):
+		# atom labels (as in getAtomIndexList) of all basis functions in the order of the MO coefficients, e.g.
+		# ['1fe','1fe',...,'5o',...]; the basis set of each atom is taken from $atoms and its (spherical) functions are
+		# counted in $basis; the functions follow the order of the atoms in the coord file, which is the order of the
+		# MO coefficients for C1 symmetry only (otherwise they are symmetry adapted)
+		if not self.isC1():
+			raise TMJobHandlerError('basis functions can be assigned to atoms in C1 symmetry only!')
+		
+		# number of basis functions of each basis set, e.g. {'fe def2-svp':24}; the name of a basis set is enclosed by
+		# lines with '*' and followed by its contracted shells
+		basis = self.readDataGrp('$basis')
+		num_functions = {}
+		name = None
+		for prev,line,succ in zip(basis[1:],basis[2:],basis[3:]):
+			if prev == '*' and succ == '*' and line != '*':
+				name = ' '.join(line.split()).lower()
+				num_functions[name] = 0
+			elif name:
+				shell = BASIS_SHELL.match(' '.join(line.split()).lower())
+				if shell:
+					num_functions[name] += SHELL_SIZES[shell.group(1)]
+		
+		# basis set of each atom, e.g. "fe 1-4 \\ basis =fe def2-SVP" (the atom list may be followed by further keys)
+		basis_of = {}
+		atom_nums = []
+		for line in self.readDataGrp('$atoms')[1:]:
+			words = line.split()
+			if len(words) > 1 and words[1][0].isdigit():
+				# the atom list consists of ranges separated by ',', e.g. "1-4,7"
+				atom_nums = []
+				spans = ''.join(w for w in words[1:] if w[0].isdigit() or w[0] == ',')
+				for span in spans.split(','):
+					numbers = span.split('-')
+					try:
+						atom_nums += list(range(int(numbers[0]),int(numbers[-1])+1))
+					except ValueError:
+						raise TMJobHandlerError('unable to read atom list from $atoms:\n' + line)
+			
+			match = ATOMS_BASIS.search(line)
+			if match:
+				for num in atom_nums:
+					basis_of[num] = ' '.join(match.group(1).split()).lower()
+		
+		atoms = []
+		labels,xyz = self.getCoordinates()
+		for num,label in enumerate(labels,1):
+			try:
+				atoms += [label] * num_functions[basis_of[num]]
+			except KeyError:
+				raise TMJobHandlerError('no basis set found for atom ' + label + '!')
+		
+		return atoms
+	
+	def getNumBasisFunctions(self):
+		# nsaos as given in the header of the first MO (None if there are no MOs); only the lines up to that header are
+		# read, since the MO files of large systems are huge
+		grp_key = '$uhfmo_alpha' if self.isUHF() else '$scfmo'
+		mo_file = self.getDataGrpFile(grp_key)
+		if mo_file and os.path.isfile(mo_file):
+			with open(mo_file,'r') as fh:
+				return self.__readNumBasisFunctions(fh)
+		
+		return self.__readNumBasisFunctions(self.readDataGrp(grp_key,strip=False))
+	
+	def __readNumBasisFunctions(self,lines):
+		for line in lines:
+			# "     1  a      eigenvalue=-.25612783293457D+03   nsaos=434"
+			if 'nsaos=' in line:
+				try:
+					return int(line.split('nsaos=')[1].split()[0])
+				except (IndexError,ValueError):
+					raise TMJobHandlerError('unable to read nsaos from MO header:\n' + line.strip())
 		
-		# change to job directory
-		if not start_dir == self.path_:
-			os.chdir(self.path_)
+		return None
+	
+	def isConverged(self):
+		# check whether the last SCF of this job converged
+		energy_out = self.getOutputFile('energy')
+		if not energy_out:
+			return False
 		
-		# run single point in any case
-		energy_in = 'ridft > ridft.out' if self.isRI() else 'dscf > dscf.out'
+		with open(energy_out,'r') as fh:
+			out = fh.read()
 		
-		# if desired calculate properties only
-		if prop:
-			energy_in = 'ridft -proper > ridft.out' if self.isRI() else 'dscf -proper > dscf.out'
+		return 'convergence criteria satisfied' in out and not 'did not converge' in out
+	
+	def getCommands(self,prop=False,opt=False,opt_flags=[],freq=False,energy=True):
+		# shell commands (to be run in the job directory) of the single point (or property run), the optimization and the
+		# frequency calculation, e.g. ['ridft > ridft.out','jobex -ri > jobex.out','aoforce > aoforce.out']
+		commands = []
+		if energy:
+			prog = 'ridft' if self.isRI() else 'dscf'
+			commands.append(prog + (' -proper' if prop else '') + ' > ' + prog + '.out')
+		
+		if opt:
+			jobex_flags = list(opt_flags)
+			if self.isRI() and not '-ri' in jobex_flags:
+				jobex_flags += ['-ri']
+			commands.append(' '.join(['jobex'] + jobex_flags) + ' > jobex.out')
+		
+		if freq:
+			commands.append('aoforce > aoforce.out')
+		
+		return commands
 	
+	def run(self,prop=False,opt=False,opt_flags=[],freq=False):
+		self.updateControl()
+		
+		# all programs are run in the job directory (without changing the cwd of this process):
+		# the single point (or only the properties) in any case, the optimization and the frequencies if requested
 		try:
-			# run dscf/ridft in any case
-			energy_out = sp.check_output(energy_in,shell=True,stderr=sp.STDOUT,universal_newlines=True)
-			if 'abnormally' in str(energy_out):
-				raise TMJobHandlerError('error while executing single point calculation in "' + str(self.path_) + '"!')
-			
-			# run optimization if requested
-			if opt:
-				jobex_flags = opt_flags
-				if self.isRI() and not '-ri' in jobex_flags:
-					jobex_flags += ['-ri']
-				jobex_in = 'jobex ' + ' '.join(jobex_flags) + ' > jobex.out'
-				jobex_out = sp.check_output(jobex_in,shell=True,stderr=sp.STDOUT,universal_newlines=True)
-				if 'abnormally' in str(jobex_out):
-					raise TMJobHandlerError('error while executing jobex in "' + str(self.path_) + '"!')
-			
-			# run frequency calculation if requested
-			if freq:
-				force_out = sp.check_output('aoforce > aoforce.out',shell=True,stderr=sp.STDOUT,universal_newlines=True)
-				if 'abnormally' in str(force_out):
-					raise TMJobHandlerError('error while executing aoforce in "' + str(self.path_) + '"!')
+			for command in self.getCommands(prop,opt,opt_flags,freq):
+				prog = command.split()[0]
+				mt.inc('subprocesses_spawned',command=prog)
+				out = sp.check_output(command,shell=True,cwd=self.path_,stderr=sp.STDOUT,universal_newlines=True)
+				if 'abnormally' in str(out):
+					stage = 'single point calculation' if prog in ['ridft','dscf'] else prog
+					raise TMJobHandlerError('error while executing ' + stage + ' in "' + str(self.path_) + '"!')
 		except sp.CalledProcessError as tmerr:
 			raise TMJobHandlerError("error while running TURBOMOLE:\nreturn code was {}\ncommand was {}".format(tmerr.returncode,tmerr.cmd))
 		
-		os.chdir(start_dir)
 		return True
 	
+	def getEnergy(self):
+		# total energy of the last SCF run (None if there is none)
+		energy_out = self.getOutputFile('energy')
+		if not energy_out:
+			return None
+		
+		energy = None
+		with open(energy_out,'r') as fh:
+			for line in fh:
+				# "  |  total energy      =    -2545.73960567463  |"
+				if 'total energy' in line and '=' in line:
+					try:
+						energy = float(line.split('=')[1].split()[0])
+					except (IndexError,ValueError):
+						raise TMJobHandlerError('unable to read total energy from "' + str(energy_out) + '"!')
+		
+		return energy
+	
+	def getSpinDensities(self):
+		# Mulliken spin densities per atom from the output of a job containing $pop, e.g. {'1fe':4.02,'2o':0.11}
+		energy_out = self.getOutputFile('energy')
+		if not energy_out:
+			return {}
+		
+		spins = {}
+		with open(energy_out,'r') as fh:
+			reading_pop = False
+			for line in fh:
+				if 'Unpaired electrons from D(alpha)-D(beta)' in line:
+					reading_pop = True
+					spins = {}		# only the last analysis counts
+					continue
+				
+				if reading_pop:
+					if '==========' in line:
+						reading_pop = False
+						continue
+					
+					# atoms are labeled like "1fe" or "1 fe"
+					words = line.split()
+					try:
+						if re.match('^[0-9]+[a-z]+$',words[0].lower()):
+							spins[words[0].lower()] = float(words[1])
+						elif words[0].isdigit() and words[1].isalpha():
+							spins[words[0] + words[1].lower()] = float(words[2])
+					except (IndexError,ValueError):
+						continue
+		
+		return spins
+	
+	def getDataGrpFile(self,grp_key,default=None):
+		# absolute path of the file a data group is kept in (e.g. "$uhfmo_alpha   file=alpha"), otherwise of the default
+		# file (if given) or None
+		for line in self.control_:
+			words = line.split()
+			if len(words) > 1 and words[0] == grp_key and words[1].startswith('file='):
+				return os.path.join(self.path_,words[1].split('=',1)[1])
+		
+		return os.path.join(self.path_,default) if default else None
+	
 	def getOutputFile(self,jobtype):
 		if jobtype == 'energy':
 			for f in ['dscf.out','ridft.out','job.last']:
@@ -391,4 +638,4 @@ class tmjob:
 	def remove(self):
 		shutil.rmtree(self.path_)
 		return True
-	
+
@@ -2,7 +2,11 @@
 
 import math
 import os
-import subprocess as sp
+import tempfile
+import shutil
+import importlib
+import threading
+from functools import lru_cache
 
 
 if __name__ == '__main__':
@@ -86,18 +90,135 @@ def getCombinations(digs,places):
 	
 	return P
 
+
+def unrankCombination(rank,digs,places):
+	# returns the combination at position rank in the lexicographic order used by getCombinations
+	# (and itertools.combinations) without walking through all combinations before it
+	if rank < 0 or rank >= binomial(digs,places):
+		raise Exception('given rank is out of definition range.')
+	
+	C = []
+	c = 0
+	for i in range(places):
+		# skip all combinations starting with a smaller number at this place
+		while True:
+			B = binomial(digs - c - 1,places - i - 1)
+			if rank < B:
+				break
+			rank -= B
+			c += 1
+		C.append(c)
+		c += 1
+	
+	return C
+
+def rankCombination(C,digs):
+	# returns the position of the (ascending) combination C in the lexicographic order used by getCombinations,
+	# i.e. the inverse of unrankCombination
+	places = len(C)
+	if places > digs or any(c < 0 or c >= digs for c in C) or any(C[i] >= C[i+1] for i in range(places-1)):
+		raise Exception('given combination is out of definition range.')
+	
+	# count the combinations after C (combinatorial number system of the complementary combination)
+	return binomial(digs,places) - 1 - sum(binomial(digs - 1 - c,places - i) for i,c in enumerate(C))
+
+# process umask, needed to give newly created files the usual permissions
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+def writeAtomic(path,content):
+	# write the whole content to a temporary file next to path and move it in place afterwards,
+	# so that path holds either the old or the new content at any time; content is a string or an iterable of
+	# strings, which are written one after the other (e.g. a generator of lines)
+	fd,tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),prefix='.' + os.path.basename(path) + '.')
+	try:
+		with os.fdopen(fd,'w') as fh:
+			if isinstance(content,str):
+				fh.write(content)
+			else:
+				fh.writelines(content)
+		
+		try:
+			mode = os.stat(path).st_mode & 0o777
+		except FileNotFoundError:
+			mode = 0o666 & ~UMASK
+		os.chmod(tmp_path,mode)
+		
+		os.replace(tmp_path,path)
+	except:
+		if os.path.isfile(tmp_path):
+			os.remove(tmp_path)
+		raise
+
+def _readFiles(paths):
+	for path in paths:
+		try:
+			with open(path,'rb') as fh:
+				while fh.read(1 << 24):
+					pass
+		except OSError:
+			pass
+
+def readAhead(paths):
+	# asks the kernel to read the given files into the page cache in the background, e.g. large MO files on networked
+	# storage, which are needed a bit later; without posix_fadvise, a daemon thread reads them instead
+	paths = [path for path in paths if path and os.path.isfile(path)]
+	if not hasattr(os,'posix_fadvise'):
+		if paths:
+			threading.Thread(target=_readFiles,args=(paths,),daemon=True).start()
+		return
+	
+	for path in paths:
+		fd = os.open(path,os.O_RDONLY)
+		try:
+			os.posix_fadvise(fd,0,0,os.POSIX_FADV_WILLNEED)
+		finally:
+			os.close(fd)
+
+# directory holding the stand-in TURBOMOLE and PBS executables
+STANDIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),'standin')
+
+def useStandIn():
+	# put the stand-in executables in front of the search path, so that they are used
+	# instead of TURBOMOLE and PBS by this process and all of its children
+	if not os.environ.get('PATH','').startswith(STANDIN_DIR + os.pathsep):
+		os.environ['PATH'] = STANDIN_DIR + os.pathsep + os.environ.get('PATH','')
+	os.environ['LOWSPIN_STANDIN'] = '1'
+
+# stands in for a module, which is imported not before one of its attributes is needed, e.g. np = lazyModule('numpy');
+# this keeps the start-up fast for runs that never need the module
+class lazyModule:
+	def __init__(self,name):
+		self.name_ = name
+		self.module_ = None
+	
+	def __getattr__(self,attr):
+		if self.module_ is None:
+			self.module_ = importlib.import_module(self.name_)
+		return getattr(self.module_,attr)
+
+@lru_cache(maxsize=None)
+def _which(name,path):
+	return shutil.which(name,path=path)
+
+def findExecutable(name):
+	# full path of the executable name in the search path (or None); the search is done only once per search path
+	return _which(name,os.environ.get('PATH'))
+
 def TMavailable():
 	# check, if turbomole environment is set up
-	try:
-		cpc_path = sp.check_output('which cpc',shell=True,stderr=sp.STDOUT,universal_newlines=True)
-	except sp.CalledProcessError as callerror:
-		if callerror.returncode == 127:
-			print('Unexpacted failure while checking the TURBOMOLE script cpc. Is the command "which" installed on your OS?')
-		return False
-	except FileNotFoundError:
+	cpc_path = findExecutable('cpc')
+	if not cpc_path:
 		return False
 	
-	if 'TURBOMOLE' in str(cpc_path):
+	if os.path.dirname(cpc_path) == STANDIN_DIR:
+		return True
+	
+	turbodir = os.environ.get('TURBODIR')
+	if turbodir and os.path.realpath(cpc_path).startswith(os.path.realpath(turbodir) + os.sep):
+		return True
+	
+	if 'TURBOMOLE' in cpc_path:
 		return True
 	
 	return False
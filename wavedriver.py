@@ -0,0 +1,181 @@
+#! /usr/bin/python3
+
+##################################
+# wavedriver class definition    #
+#                                #
+# by Fabian                      #
+# 19.10.26                       #
+##################################
+
+
+# load some helpful modules
+import time
+from itertools import combinations, groupby
+import QueueSys as qs
+import configurations as cs
+import spinflipper as sf
+from tools import lazyModule
+np = lazyModule('numpy')		# imported on first use
+
+
+# prevent stand-alone execution
+if __name__ == "__main__":
+	print("This class definition is not meant to be run on its own!")
+	exit()
+
+
+# specialized exception
+class WaveDriverError(Exception):
+	pass
+
+
+# submits the low spin configurations in waves until the lowest num_lowest states are pinned down: after each wave,
+# an Ising model E = E0 + sum_ij J_ij s_i s_j + sum_i h_i |s_i| (s_i: unpaired electrons at center i, see
+# configsource.spins) is fitted to the energies harvested so far; it predicts the energies of the configurations not yet
+# submitted together with their uncertainty (prediction interval of the least squares fit); the next wave consists of
+# the configurations with the lowest optimistic energy (prediction less confidence times uncertainty), those whose
+# optimistic energy is not below the num_lowest-th lowest harvested energy are withdrawn, since they can't be among
+# the lowest states; as long as the model can't be fitted, the configurations are drawn at random
+class wavedriver:
+	def __init__(self,spinflipper,configs,queuesys,pairs=None,num_lowest=1,wave_size=None,confidence=2.0,seed=None,verbose=0):
+		if not isinstance(spinflipper,sf.spinflipper):
+			raise WaveDriverError('given spin flipper is not an instance of spinflipper!')
+		if not isinstance(configs,cs.configsource):
+			raise WaveDriverError('given configurations are not an instance of configsource!')
+		if not isinstance(queuesys,qs.QueueSys):
+			raise WaveDriverError('given argument is not an instance of QueueSys!')
+		if num_lowest < 1:
+			raise WaveDriverError('at least the lowest state has to be searched for!')
+		
+		self.spinflipper_ = spinflipper
+		self.configs_ = configs
+		self.queue_ = queuesys
+		self.num_lowest_ = num_lowest
+		self.confidence_ = confidence		# width of the prediction interval in units of its standard deviation
+		self.rng_ = np.random.default_rng(seed)
+		self.vrbs_lvl_ = verbose
+		
+		# index pairs of the coupled centers of the model (default: all pairs)
+		centers = configs.centers_
+		self.pairs_ = [(centers.index(a),centers.index(b)) for a,b in pairs] if pairs else list(combinations(range(len(centers)),2))
+		self.wave_size_ = wave_size if wave_size else len(self.pairs_) + len(centers) + 3
+		if self.wave_size_ < 1:
+			raise WaveDriverError('a wave has to consist of at least one job!')
+		
+		self.ranks_ = None		# ranks of all candidate configurations (see configsource.rank)
+		self.features_ = None		# their rows of the model, shape (#candidates,#parameters)
+		self.released_ = []		# released configurations: {'index', 'rank', 'flip', 'nr', 'job', 'id', 'energy'}
+		self.waves_ = []		# per wave: number of released, harvested and still open configurations
+	
+	def __features(self,ranks):
+		spins = self.configs_.spinArray(ranks)
+		pairs = np.array(self.pairs_,dtype=int).reshape(-1,2)
+		return np.hstack((np.ones((len(ranks),1)),spins[:,pairs[:,0]] * spins[:,pairs[:,1]],np.abs(spins)))
+	
+	def __fit(self,observed,energies):
+		# least squares fit of the model to the energies of the observed candidates (indices); returns the predicted
+		# energies of all candidates and their uncertainties (standard deviation of a new observation, infinite for
+		# candidates which are not determined by the fit or if the fit has no degree of freedom left)
+		X = self.features_[observed]
+		U,sv,Vt = np.linalg.svd(X,full_matrices=False)
+		rank = int(np.sum(sv > sv[0] * 1e-10)) if len(sv) else 0
+		if rank == 0:
+			return (np.zeros(len(self.ranks_)),np.full(len(self.ranks_),np.inf))
+		
+		U,sv,Vt = U[:,:rank],sv[:rank],Vt[:rank]
+		coef = Vt.T @ ((U.T @ energies) / sv)
+		dof = len(observed) - rank
+		sigma = np.sqrt(np.sum((energies - X @ coef)**2) / dof) if dof > 0 else np.inf
+		
+		proj = self.features_ @ Vt.T
+		determined = np.linalg.norm(self.features_ - proj @ Vt,axis=1) <= 1e-8 * np.linalg.norm(self.features_,axis=1)
+		leverage = np.sum((proj / sv)**2,axis=1)
+		uncertainty = np.where(determined,sigma * np.sqrt(1.0 + leverage),np.inf)
+		return (self.features_ @ coef,uncertainty)
+	
+	def __select(self):
+		# indices of the candidates of the next wave (lowest optimistic energies first, ties in random order)
+		released = np.zeros(len(self.ranks_),dtype=bool)
+		released[[entry['index'] for entry in self.released_]] = True
+		observed = np.array([entry['index'] for entry in self.released_ if entry['energy'] is not None],dtype=int)
+		energies = np.array([entry['energy'] for entry in self.released_ if entry['energy'] is not None])
+		
+		if len(observed) > 0:
+			predicted,uncertainty = self.__fit(observed,energies)
+			optimistic = predicted - self.confidence_ * uncertainty
+		else:
+			optimistic = np.full(len(self.ranks_),-np.inf)
+		
+		# only configurations which may undercut the num_lowest-th lowest energy found so far stay open
+		threshold = np.sort(energies)[self.num_lowest_-1] if len(energies) >= self.num_lowest_ else np.inf
+		candidates = np.nonzero(~released & (optimistic < threshold))[0]
+		order = np.lexsort((self.rng_.random(len(candidates)),optimistic[candidates]))
+		return (candidates[order[:self.wave_size_]],len(candidates))
+	
+	def __release(self,indices):
+		# creates and submits the jobs of the given candidates (grouped by flip sets, see spinflipper.flip)
+		num_occ = len(self.spinflipper_.beta_occupations_)
+		indices = sorted(indices,key=lambda i:self.ranks_[i])
+		wave = []
+		for flip_rank,group in groupby(indices,key=lambda i:self.ranks_[i] // num_occ):
+			group = list(group)
+			flip = self.configs_.unrank(int(self.ranks_[group[0]]))[0]
+			nrs = [int(self.ranks_[i] % num_occ) for i in group]
+			for i,nr,job in zip(group,nrs,self.spinflipper_.flip(list(flip),nrs)):
+				wave.append({'index':int(i), 'rank':int(self.ranks_[i]), 'flip':flip, 'nr':nr, 'job':job,
+				             'id':self.queue_.schedule(job.path_), 'energy':None})
+		
+		self.released_ += wave
+		return wave
+	
+	def __harvest(self,wave,interval):
+		# waits until all jobs of the wave have left the queue and reads the energies of the converged ones
+		waiting = list(wave)
+		while waiting:
+			active = [line[0] for line in self.queue_.get_schedule() if line[4] in 'QRH']
+			waiting = [entry for entry in waiting if entry['id'] in active]
+			if waiting:
+				time.sleep(interval)
+		
+		for entry in wave:
+			if entry['job'].isConverged():
+				entry['energy'] = entry['job'].getEnergy()
+		
+		return len([entry for entry in wave if entry['energy'] is not None])
+	
+	def run(self,selection,interval=60.0):
+		# selection gives the candidate configurations grouped by flip sets (see configsource.select); returns the
+		# released configurations (see released_)
+		self.ranks_ = np.array([self.configs_.rank(flip,nr) for flip,nrs in selection for nr in nrs],dtype=np.int64)
+		if len(self.ranks_) == 0:
+			raise WaveDriverError('there are no configurations to be submitted!')
+		self.features_ = self.__features(self.ranks_)
+		
+		if self.vrbs_lvl_ >= 0:
+			print(" Submitting {:d} configuration(s) in waves of {:d} until the lowest {:d} state(s) are pinned down ...".format(
+			      len(self.ranks_),self.wave_size_,self.num_lowest_),flush=True)
+		
+		while True:
+			indices,num_open = self.__select()
+			if len(indices) == 0:
+				break
+			
+			wave = self.__release(indices)
+			if self.vrbs_lvl_ >= 0:
+				print("  wave {:d}: {:d} of {:d} open configuration(s) released".format(len(self.waves_)+1,len(wave),num_open),flush=True)
+			
+			harvested = self.__harvest(wave,interval)
+			self.waves_.append((len(wave),harvested,num_open))
+			if self.vrbs_lvl_ >= 0:
+				print("  wave {:d}: {:d} of {:d} job(s) converged".format(len(self.waves_),harvested,len(wave)),flush=True)
+		
+		return self.released_
+	
+	def lowest(self):
+		# the lowest num_lowest harvested configurations (released_ entries) in the order of their energies
+		finished = [entry for entry in self.released_ if entry['energy'] is not None]
+		return sorted(finished,key=lambda entry:entry['energy'])[:self.num_lowest_]
+	
+	def withdrawn(self):
+		# number of configurations which were never submitted
+		return len(self.ranks_) - len(self.released_)